@@ -6,9 +6,36 @@ class Settings(BaseSettings):
     # Groq API
     groq_api_key: str = os.getenv("GROQ_API_KEY", "")
     groq_model: str = "mixtral-8x7b-32768"
+    groq_base_url: str = os.getenv("GROQ_BASE_URL", "")
+    groq_timeout_seconds: float = 60.0
+    groq_connect_timeout_seconds: float = 5.0
+    groq_max_retries: int = 3
+    groq_retry_base_delay: float = 0.5
+    groq_retry_max_delay: float = 8.0
+    groq_max_concurrency: int = 4
+    groq_max_connections: int = 10
+    groq_requests_per_minute: float = 30
+    
+    # Generación batch (cola de trabajos)
+    generation_batch_workers: int = 2
+    generation_batch_max_specs: int = 500
+    generation_batch_max_attempts: int = 5
+    generation_batch_retained_jobs: int = 100
+    # Cola en la tabla generation_items: un item en running sin latido en
+    # generation_batch_lease_seconds (su proceso murió) vuelve a la cola
+    generation_batch_poll_seconds: float = 1.0
+    generation_batch_lease_seconds: float = 30.0
+    
+    # Caché de código generado (LRU + TTL, disco opcional)
+    codegen_cache_max_entries: int = 512
+    codegen_cache_ttl_seconds: float = 86400
+    codegen_cache_dir: str = os.getenv("CODEGEN_CACHE_DIR", "")
     
     # Database
     database_url: str = os.getenv("DATABASE_URL", "sqlite:///./database.db")
+    database_pool_size: int = 5
+    database_max_overflow: int = 10
+    database_busy_timeout_ms: int = 5000
     
     # Server
     server_port: int = int(os.getenv("SERVER_PORT", 8000))
@@ -25,6 +52,47 @@ class Settings(BaseSettings):
     backtest_initial_capital: float = 10000.0
     backtest_commission: float = 0.0001
     
+    # Caché local de precios (OHLCV)
+    price_cache_dir: str = os.getenv("PRICE_CACHE_DIR", "./data/prices")
+    price_cache_refresh_seconds: int = 300
+    
+    # Pool de ejecución de backtests (descarga + simulación)
+    backtest_max_concurrency: int = 8
+    backtest_max_queue: int = 64
+    backtest_stream_chunk_bars: int = 5000
+    
+    # Backtest por tramos (out-of-core): se usa en modo "auto" a partir de
+    # backtest_chunked_min_bars barras; la curva y los trades devueltos se acotan
+    backtest_chunk_bars: int = 100000
+    backtest_chunked_min_bars: int = 1000000
+    backtest_chunked_max_points: int = 10000
+    backtest_chunked_max_trades: int = 1000
+    
+    # Monte Carlo sobre trades: celdas (simulaciones x trades) por lote
+    monte_carlo_max_simulations: int = 100000
+    monte_carlo_batch_cells: int = 2000000
+    
+    # Trabajos de backtest en segundo plano (cola en la tabla backtest_jobs);
+    # backtest_job_max_per_user = 0 no limita los trabajos simultáneos por usuario.
+    # Un trabajo en running sin latido en backtest_job_lease_seconds (su proceso
+    # murió) vuelve a la cola; la prioridad se acota a ±backtest_job_max_priority
+    backtest_job_workers: int = 2
+    backtest_job_max_per_user: int = 0
+    backtest_job_poll_seconds: float = 1.0
+    backtest_job_lease_seconds: float = 30.0
+    backtest_job_max_priority: int = 10
+    
+    # Caché de indicadores (LRU por tamaño; directorio opcional memory-mapped)
+    indicator_cache_max_mb: int = 256
+    indicator_cache_dir: str = os.getenv("INDICATOR_CACHE_DIR", "")
+    
+    # Barridos de parámetros (pool de procesos)
+    sweep_max_workers: int = os.cpu_count() or 2
+    sweep_max_variants: int = 5000
+    
+    # Walk-forward (una tarea del pool de procesos por ventana)
+    walk_forward_max_windows: int = 100
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -0,0 +1,66 @@
+"""
+Capa de persistencia
+Engine SQLAlchemy async con pool de conexiones y sesiones por operación
+"""
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase
+
+from app.config import settings
+
+
+class Base(DeclarativeBase):
+    """Base declarativa de las tablas ORM"""
+
+
+def _async_url(url: str) -> str:
+    """
+    Convierte la URL síncrona de config (sqlite:///...) al driver async.
+    """
+    if url.startswith("sqlite:///"):
+        return url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+
+DATABASE_URL = _async_url(settings.database_url)
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+_engine_options = {"pool_pre_ping": True}
+if not DATABASE_URL.endswith(":memory:"):
+    _engine_options.update(
+        pool_size=settings.database_pool_size,
+        max_overflow=settings.database_max_overflow
+    )
+
+engine = create_async_engine(DATABASE_URL, **_engine_options)
+
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+if IS_SQLITE:
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL permite lectores concurrentes entre workers de uvicorn
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute(f"PRAGMA busy_timeout={settings.database_busy_timeout_ms}")
+        cursor.close()
+
+
+async def init_db() -> None:
+    """
+    Crea las tablas e índices que no existan (se llama en el startup).
+    """
+    from app import models  # noqa: F401  (registra las tablas en Base.metadata)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def close_db() -> None:
+    await engine.dispose()
@@ -19,6 +19,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Health check
@@ -39,6 +40,35 @@ async def root():
         "openapi": "/openapi.json"
     }
 
+# Startup: crear tablas de la base de datos
+@app.on_event("startup")
+async def startup_database():
+    from .database import init_db
+    from .services.results_repository import ensure_aggregates
+    from .services.backtest_jobs import get_backtest_jobs
+    from .services.generation_jobs import get_generation_jobs
+    await init_db()
+    await ensure_aggregates()
+    await get_backtest_jobs().start()
+    # Reanuda los batch de generación que quedaron pendientes
+    await get_generation_jobs().start()
+
+# Shutdown: liberar pools de ejecución y conexiones
+@app.on_event("shutdown")
+async def shutdown_executors():
+    from .database import close_db
+    from .services.backtest_jobs import shutdown_backtest_jobs
+    from .services.executor import get_backtest_executor
+    from .services.generation_jobs import shutdown_generation_jobs
+    from .services.groq_service import close_groq_client
+    from .services.sweep import shutdown_process_pool
+    await shutdown_backtest_jobs()
+    get_backtest_executor().shutdown()
+    shutdown_process_pool()
+    await shutdown_generation_jobs()
+    await close_groq_client()
+    await close_db()
+
 # Import routes
 from .routes import bots, generate, backtest, results
 
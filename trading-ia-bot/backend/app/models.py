@@ -0,0 +1,192 @@
+"""
+Tablas ORM
+Las columnas pesadas (código, curva de equity, trades) van en tablas aparte
+para que los listados no las carguen
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import JSON, Boolean, DateTime, Float, ForeignKey, Index, Integer, LargeBinary, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# BOTS
+# ═════════════════════════════════════════════════════════════════════════════
+
+class Bot(Base):
+    """Metadatos de un bot (sin código)"""
+    __tablename__ = "bots"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(100))
+    indicators: Mapped[List[str]] = mapped_column(JSON)
+    symbol: Mapped[str] = mapped_column(String(20), index=True)
+    timeframe: Mapped[str] = mapped_column(String(10), index=True)
+    strategy_type: Mapped[str] = mapped_column(String(50))
+    description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+class BotCode(Base):
+    """Código MQL5 de un bot"""
+    __tablename__ = "bot_code"
+
+    bot_id: Mapped[int] = mapped_column(ForeignKey("bots.id", ondelete="CASCADE"), primary_key=True)
+    code: Mapped[str] = mapped_column(Text)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# RESULTADOS
+# ═════════════════════════════════════════════════════════════════════════════
+
+# Métricas con ranking (nombre corto del índice) y columnas de agrupación
+RANKED_METRICS = {
+    "total_return_pct": "return",
+    "sharpe_ratio": "sharpe",
+    "max_drawdown_pct": "drawdown",
+    "win_rate_pct": "win_rate",
+    "profit_factor": "profit_factor"
+}
+RESULT_SCOPES = {"symbol": "symbol", "timeframe": "timeframe", "strategy_type": "strategy"}
+
+
+class Result(Base):
+    """Métricas de un resultado de backtest (sin curva ni trades)"""
+    __tablename__ = "results"
+    __table_args__ = (
+        # Índices (métrica, id) para paginar por cursor ordenando por métrica
+        *(Index(f"ix_results_{short}_id", metric, "id") for metric, short in RANKED_METRICS.items()),
+        Index("ix_results_created_id", "created_at", "id"),
+        # Filtros combinados más usados por el dashboard
+        Index("ix_results_symbol_timeframe_id", "symbol", "timeframe", "id"),
+        Index("ix_results_bot_id_id", "bot_id", "id"),
+        # (grupo, métrica, id): mejor/peor resultado por grupo en /stats/summary
+        # y /list filtrado por symbol o timeframe ordenando por métrica
+        *(
+            Index(f"ix_results_{scope_short}_{short}_id", scope, metric, "id")
+            for scope, scope_short in RESULT_SCOPES.items()
+            for metric, short in RANKED_METRICS.items()
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bot_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    bot_name: Mapped[str] = mapped_column(String(100))
+    symbol: Mapped[str] = mapped_column(String(20))
+    timeframe: Mapped[str] = mapped_column(String(10))
+    strategy_type: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
+    period_years: Mapped[int] = mapped_column(Integer)
+    initial_capital: Mapped[float] = mapped_column(Float)
+    final_capital: Mapped[float] = mapped_column(Float)
+    total_return_pct: Mapped[float] = mapped_column(Float)
+    sharpe_ratio: Mapped[float] = mapped_column(Float)
+    max_drawdown_pct: Mapped[float] = mapped_column(Float)
+    win_rate_pct: Mapped[float] = mapped_column(Float)
+    # NULL: ganancias sin ninguna pérdida (profit factor infinito)
+    profit_factor: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    total_trades: Mapped[int] = mapped_column(Integer)
+    description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+
+
+class ResultBlob(Base):
+    """Curva de equity (float64 binario) y trades (JSON) de un resultado"""
+    __tablename__ = "result_blobs"
+
+    result_id: Mapped[int] = mapped_column(ForeignKey("results.id", ondelete="CASCADE"), primary_key=True)
+    equity_curve: Mapped[bytes] = mapped_column(LargeBinary)
+    trades: Mapped[list] = mapped_column(JSON)
+
+
+class ResultAggregate(Base):
+    """
+    Agregados acumulados de results, mantenidos en cada save/delete.
+    scope = "all" (key "") | "symbol" | "timeframe" | "strategy_type"
+    """
+    __tablename__ = "result_aggregates"
+
+    scope: Mapped[str] = mapped_column(String(20), primary_key=True)
+    key: Mapped[str] = mapped_column(String(50), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+    sum_return: Mapped[float] = mapped_column(Float, default=0.0)
+    sum_sharpe: Mapped[float] = mapped_column(Float, default=0.0)
+    sum_drawdown: Mapped[float] = mapped_column(Float, default=0.0)
+    sum_win_rate: Mapped[float] = mapped_column(Float, default=0.0)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# TRABAJOS DE BACKTEST
+# ═════════════════════════════════════════════════════════════════════════════
+
+class BacktestJob(Base):
+    """
+    Backtest encolado: la propia tabla es la cola (sin broker externo).
+    status = queued | running | completed | failed | cancelled
+    """
+    __tablename__ = "backtest_jobs"
+    __table_args__ = (
+        # Siguiente trabajo: mayor prioridad primero y, a igualdad, el más antiguo
+        Index("ix_backtest_jobs_queue", "status", "priority", "created_at"),
+        Index("ix_backtest_jobs_user_status", "user", "status"),
+    )
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    user: Mapped[str] = mapped_column(String(100))
+    priority: Mapped[int] = mapped_column(Integer, default=0)
+    status: Mapped[str] = mapped_column(String(20))
+    request: Mapped[dict] = mapped_column(JSON)
+    progress_pct: Mapped[float] = mapped_column(Float, default=0.0)
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, default=False)
+    result_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # Lease del worker que lo ejecuta: el latido se renueva con el progreso
+    claimed_by: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# TRABAJOS DE GENERACIÓN BATCH
+# ═════════════════════════════════════════════════════════════════════════════
+
+class GenerationJob(Base):
+    """Trabajo de generación batch; cada especificación es un GenerationItem"""
+    __tablename__ = "generation_jobs"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    force_refresh: Mapped[bool] = mapped_column(Boolean, default=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+
+class GenerationItem(Base):
+    """
+    Especificación de un trabajo batch: la propia tabla es la cola.
+    status = pending | running | completed | failed
+    """
+    __tablename__ = "generation_items"
+    __table_args__ = (
+        # Siguiente item: el del trabajo más antiguo y, dentro de él, en orden
+        Index("ix_generation_items_queue", "status", "created_at", "position"),
+    )
+
+    job_id: Mapped[str] = mapped_column(ForeignKey("generation_jobs.id", ondelete="CASCADE"), primary_key=True)
+    position: Mapped[int] = mapped_column(Integer, primary_key=True)
+    spec: Mapped[dict] = mapped_column(JSON)
+    status: Mapped[str] = mapped_column(String(20))
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    bot_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    cached: Mapped[Optional[bool]] = mapped_column(Boolean, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # created_at del trabajo (orden de la cola sin join)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+    # Lease del worker que lo genera: el latido se renueva mientras tanto
+    claimed_by: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
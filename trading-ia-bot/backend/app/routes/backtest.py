@@ -3,10 +3,25 @@ Routes para ejecutar backtests
 Endpoints para simular estrategias en datos históricos
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List
-from app.services.backtest_engine import run_backtest_async
+from typing import Any, Dict, Optional, List
+from app.config import settings
+from app.services import jobs_repository, results_repository
+from app.services.backtest_engine import BACKTEST_MODES, BacktestEngine, run_backtest_async
+from app.services.backtest_jobs import get_backtest_jobs
+from app.services.calendars import ReturnGrid, market_calendar
+from app.services.curve_encoding import format_curve, validate_curve_options
+from app.services.executor import ExecutorBusyError, get_backtest_executor
+from app.services.indicator_cache import get_indicator_cache
+from app.services.portfolio import run_portfolio_backtest
+from app.services.indicators import describe_indicators
+from app.services.streaming import SSE_HEADERS, SSE_MEDIA_TYPE, sse_event
+from app.services.strategy_rules import validate_strategy
+from app.services.sweep import expand_grid, rank_results, rule_series, run_sweep
+from app.services.timeframes import resolve_timeframe
+from app.services.walk_forward import run_walk_forward, stitch_walk_forward, walk_forward_windows, window_summary
 
 router = APIRouter(prefix="/api/backtest", tags=["backtest"])
 
@@ -15,6 +30,12 @@ router = APIRouter(prefix="/api/backtest", tags=["backtest"])
 # MODELOS PYDANTIC
 # ═════════════════════════════════════════════════════════════════════════════
 
+class StrategyRules(BaseModel):
+    """Reglas de entrada/salida sobre indicadores (ej: "RSI(14) crosses_above 30")"""
+    entry: str
+    exit: Optional[str] = None
+
+
 class BacktestRequest(BaseModel):
     """Request para ejecutar backtest"""
     symbol: str
@@ -23,6 +44,9 @@ class BacktestRequest(BaseModel):
     initial_capital: float = 10000.0
     commission: float = 0.0001
     strategy_signals: Optional[List[dict]] = None
+    strategy: Optional[StrategyRules] = None
+    mode: str = "auto"
+    seed: Optional[int] = None
 
 
 class BacktestResponse(BaseModel):
@@ -31,35 +55,116 @@ class BacktestResponse(BaseModel):
     symbol: str
     timeframe: str
     period_years: int
+    bars: Optional[int] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    effective_period_years: Optional[float] = None
+    period_truncated: bool = False
     initial_capital: float
     final_capital: float
     total_return_pct: float
     sharpe_ratio: float
     max_drawdown_pct: float
     win_rate_pct: float
-    profit_factor: float
+    profit_factor: Optional[float]
+    sortino_ratio: float = 0
+    calmar_ratio: float = 0
+    exposure_pct: float = 0
+    avg_trade_duration_bars: float = 0
     total_trades: int
     equity_curve: List[float]
+    equity_curve_b64: Optional[str] = None
+    equity_curve_index: Optional[List[int]] = None
+    equity_curve_encoding: str = "json"
+    equity_curve_points: Optional[int] = None
+    equity_curve_step: int = 1
     trades: List[dict]
+    trades_truncated: bool = False
+    mode: str = "memory"
     message: str
 
 
+class BacktestJobRequest(BacktestRequest):
+    """Request para encolar un backtest como trabajo en segundo plano"""
+    user: str = "anonymous"
+    priority: int = 0
+    bot_id: Optional[int] = None
+    bot_name: Optional[str] = None
+    description: Optional[str] = None
+
+
+class PortfolioRequest(BaseModel):
+    """Request para backtest de portafolio multi-símbolo"""
+    symbols: List[str]
+    weights: Optional[List[float]] = None
+    timeframe: str
+    period_years: int = 5
+    initial_capital: float = 10000.0
+    commission: float = 0.0001
+    position_size: float = 0.95
+    trades_count: int = 50
+    seed: Optional[int] = None
+
+
+class SweepRequest(BaseModel):
+    """Request para barrido de parámetros (grid search)"""
+    symbol: str
+    timeframe: str
+    period_years: int = 5
+    parameters: Dict[str, List[float]] = {}
+    strategy_params: Dict[str, List[Any]] = {}
+    strategy: Optional[StrategyRules] = None
+    rank_by: str = "sharpe_ratio"
+    top: Optional[int] = 50
+    stream: bool = False
+
+
+class WalkForwardRequest(BaseModel):
+    """Request para análisis walk-forward"""
+    symbol: str
+    timeframe: str
+    period_years: int = 5
+    in_sample_bars: int
+    out_of_sample_bars: int
+    anchored: bool = False
+    initial_capital: float = 10000.0
+    parameters: Dict[str, List[float]] = {}
+    strategy_params: Dict[str, List[Any]] = {}
+    strategy: Optional[StrategyRules] = None
+    rank_by: str = "sharpe_ratio"
+    stream: bool = False
+
+
 # ═════════════════════════════════════════════════════════════════════════════
 # ENDPOINTS
 # ═════════════════════════════════════════════════════════════════════════════
 
 @router.post("/run", response_model=BacktestResponse)
-async def run_backtest(request: BacktestRequest):
+async def run_backtest(
+    request: BacktestRequest,
+    max_points: Optional[int] = Query(None, description="Puntos máximos de equity_curve"),
+    downsample: str = Query("lttb", description="Decimación: lttb | minmax"),
+    encoding: str = Query("json", description="Codificación de la curva: json | float32-base64")
+):
     """
     Ejecuta un backtest de una estrategia en datos históricos
     
     Args:
         symbol: Símbolo de trading (EURUSD, XAUUSD, SPY, etc.)
-        timeframe: Timeframe (M1, M5, H1, D1, W1)
+        timeframe: Timeframe (M1, M5, H1, H4, D1, W1, MN1 o personalizado: M3, H6, D2...)
         period_years: Años de históricos a descargar (default: 5)
         initial_capital: Capital inicial (default: $10,000)
         commission: Comisión por operación (default: 0.01%)
         strategy_signals: Señales personalizadas (opcional)
+        strategy: Reglas entry/exit sobre indicadores (opcional, prioridad sobre señales)
+        mode: auto | memory | chunked. En chunked la serie se recorre por tramos
+              con memoria acotada; equity_curve llega decimada cada
+              equity_curve_step barras y trades solo con los últimos
+              (trades_truncated). auto usa chunked en series muy largas.
+        seed: Semilla de las señales demo, para repetir el mismo backtest (opcional)
+        max_points: Reduce equity_curve a como mucho N puntos (query)
+        downsample: Método de reducción, lttb o minmax (query)
+        encoding: json o float32-base64 en equity_curve_b64 (query)
     
     Returns:
         {
@@ -76,25 +181,20 @@ async def run_backtest(request: BacktestRequest):
         }
     
     Example:
-        POST /api/backtest/run
+        POST /api/backtest/run?max_points=2000&encoding=float32-base64
         {
             "symbol": "EURUSD",
             "timeframe": "H1",
             "period_years": 5,
             "initial_capital": 10000,
-            "commission": 0.0001
+            "commission": 0.0001,
+            "strategy": {"entry": "RSI(14) crosses_above 30 and close > EMA(200)", "exit": "RSI(14) > 70"}
         }
     """
     try:
         # Validar inputs
-        if not request.symbol or not request.timeframe:
-            raise ValueError("Symbol y timeframe son requeridos")
-        
-        if request.initial_capital <= 0:
-            raise ValueError("Initial capital debe ser mayor a 0")
-        
-        if request.period_years < 1 or request.period_years > 20:
-            raise ValueError("Period years debe estar entre 1 y 20")
+        strategy = _validate_backtest_request(request)
+        validate_curve_options(max_points, downsample, encoding)
         
         # Ejecutar backtest
         result = await run_backtest_async(
@@ -102,15 +202,32 @@ async def run_backtest(request: BacktestRequest):
             timeframe=request.timeframe,
             period_years=request.period_years,
             initial_capital=request.initial_capital,
-            commission=request.commission
+            commission=request.commission,
+            strategy_signals=request.strategy_signals,
+            strategy=strategy,
+            mode=request.mode,
+            seed=request.seed
         )
         
+        # Periodo efectivo: el proveedor limita el histórico intradía
+        message = "Backtest ejecutado exitosamente"
+        if result.get("period_truncated"):
+            message += (
+                f" (histórico disponible desde {result['start_date'][:10]}: "
+                f"{result['effective_period_years']} de {request.period_years} años)"
+            )
+        
         # Retornar resultado
         return {
             "status": result.get("status", "success"),
             "symbol": result.get("symbol", request.symbol),
             "timeframe": result.get("timeframe", request.timeframe),
             "period_years": request.period_years,
+            "bars": result.get("bars"),
+            "start_date": result.get("start_date"),
+            "end_date": result.get("end_date"),
+            "effective_period_years": result.get("effective_period_years"),
+            "period_truncated": result.get("period_truncated", False),
             "initial_capital": request.initial_capital,
             "final_capital": result.get("final_capital", 0),
             "total_return_pct": result.get("total_return_pct", 0),
@@ -118,18 +235,609 @@ async def run_backtest(request: BacktestRequest):
             "max_drawdown_pct": result.get("max_drawdown_pct", 0),
             "win_rate_pct": result.get("win_rate_pct", 0),
             "profit_factor": result.get("profit_factor", 0),
+            "sortino_ratio": result.get("sortino_ratio", 0),
+            "calmar_ratio": result.get("calmar_ratio", 0),
+            "exposure_pct": result.get("exposure_pct", 0),
+            "avg_trade_duration_bars": result.get("avg_trade_duration_bars", 0),
             "total_trades": result.get("total_trades", 0),
-            "equity_curve": result.get("equity_curve", []),
+            **format_curve(result.get("equity_curve", []), max_points, downsample, encoding),
+            "equity_curve_step": result.get("equity_curve_step", 1),
             "trades": result.get("trades", []),
-            "message": "Backtest ejecutado exitosamente"
+            "trades_truncated": result.get("trades_truncated", False),
+            "mode": result.get("mode", "memory"),
+            "message": message
         }
     
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en backtest: {str(e)}")
 
 
+def _validate_backtest_request(request: BacktestRequest) -> Optional[Dict]:
+    """
+    Valida un BacktestRequest y retorna sus reglas como dict (o None).
+    """
+    if not request.symbol or not request.timeframe:
+        raise ValueError("Symbol y timeframe son requeridos")
+    
+    resolve_timeframe(request.timeframe)
+    
+    if request.initial_capital <= 0:
+        raise ValueError("Initial capital debe ser mayor a 0")
+    
+    if request.period_years < 1 or request.period_years > 20:
+        raise ValueError("Period years debe estar entre 1 y 20")
+    
+    if request.mode not in BACKTEST_MODES:
+        raise ValueError(f"Modo no soportado: {request.mode}. Opciones: {', '.join(BACKTEST_MODES)}")
+    
+    strategy = request.strategy.model_dump() if request.strategy else None
+    if strategy:
+        validate_strategy(strategy)
+    return strategy
+
+
+@router.post("/stream")
+async def stream_backtest(request: BacktestRequest):
+    """
+    Ejecuta un backtest y emite los resultados por Server-Sent Events
+    
+    Eventos (en orden):
+        start    → {"bars": 43800, "start_date": ..., "end_date": ...}
+        equity   → {"offset": 0, "values": [...]}          (un tramo de la curva)
+        trades   → {"trades": [...]}                       (trades cerrados en el tramo)
+        progress → {"processed": 5000, "total": 43800, "pct": 11.42, "metrics": {...}}  (métricas en vivo)
+        result   → métricas finales (sin equity_curve ni trades)
+        error    → {"status": "error", "message": ...}
+    
+    Example:
+        POST /api/backtest/stream
+        {
+            "symbol": "EURUSD",
+            "timeframe": "M5",
+            "period_years": 1
+        }
+    """
+    if not request.symbol or not request.timeframe:
+        raise HTTPException(status_code=400, detail="Symbol y timeframe son requeridos")
+    
+    try:
+        resolve_timeframe(request.timeframe)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if request.initial_capital <= 0:
+        raise HTTPException(status_code=400, detail="Initial capital debe ser mayor a 0")
+    
+    if request.period_years < 1 or request.period_years > 20:
+        raise HTTPException(status_code=400, detail="Period years debe estar entre 1 y 20")
+    
+    strategy = request.strategy.model_dump() if request.strategy else None
+    if strategy:
+        try:
+            validate_strategy(strategy)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    engine = BacktestEngine(request.initial_capital, request.commission, seed=request.seed)
+    
+    async def event_stream():
+        try:
+            async for update in engine.stream_backtest(
+                symbol=request.symbol,
+                timeframe=request.timeframe,
+                years=request.period_years,
+                strategy_signals=request.strategy_signals,
+                strategy=strategy,
+                chunk_bars=settings.backtest_stream_chunk_bars
+            ):
+                event = update.pop("event")
+                yield sse_event(event, update)
+        except Exception as e:
+            yield sse_event("error", {"status": "error", "message": str(e)})
+    
+    return StreamingResponse(event_stream(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+
+@router.post("/portfolio")
+async def run_portfolio(request: PortfolioRequest):
+    """
+    Ejecuta un backtest de portafolio sobre varios símbolos
+    
+    Los datos se cargan en lote (una sola descarga para lo que falte en
+    caché), se alinean en un índice común y la equity combinada se simula
+    de forma vectorizada.
+    
+    Args:
+        symbols: Lista de símbolos
+        weights: Pesos por símbolo (default: equiponderado)
+        timeframe: Timeframe
+        period_years: Años de históricos
+        initial_capital: Capital inicial total
+        commission: Comisión por operación
+        position_size: Fracción del capital de cada subcuenta por operación
+    
+    Returns:
+        {
+            "status": "success",
+            "total_return_pct": 12.4,
+            "sharpe_ratio": 1.1,
+            "equity_curve": [...],
+            "attribution": [{"symbol": "EURUSD", "contribution_pct": 4.2, ...}]
+        }
+    
+    Example:
+        POST /api/backtest/portfolio
+        {
+            "symbols": ["EURUSD", "XAUUSD", "SPY"],
+            "weights": [0.5, 0.25, 0.25],
+            "timeframe": "D1",
+            "period_years": 5
+        }
+    """
+    try:
+        if not request.timeframe:
+            raise ValueError("Timeframe es requerido")
+        resolve_timeframe(request.timeframe)
+        
+        if request.initial_capital <= 0:
+            raise ValueError("Initial capital debe ser mayor a 0")
+        
+        if request.period_years < 1 or request.period_years > 20:
+            raise ValueError("Period years debe estar entre 1 y 20")
+        
+        result = await run_portfolio_backtest(
+            symbols=request.symbols,
+            weights=request.weights,
+            timeframe=request.timeframe,
+            period_years=request.period_years,
+            initial_capital=request.initial_capital,
+            commission=request.commission,
+            position_size=request.position_size,
+            trades_count=request.trades_count,
+            seed=request.seed
+        )
+        
+        return {
+            **result,
+            "message": "Backtest de portafolio ejecutado exitosamente"
+        }
+    
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en backtest de portafolio: {str(e)}")
+
+
+@router.post("/sweep")
+async def run_parameter_sweep(request: SweepRequest):
+    """
+    Ejecuta un barrido de parámetros sobre un mismo histórico
+    
+    Los precios se descargan una sola vez y las variantes se reparten en un
+    pool de procesos que comparte los datos por memoria compartida.
+    
+    Args:
+        symbol: Símbolo de trading
+        timeframe: Timeframe
+        period_years: Años de históricos
+        parameters: Rangos de cuenta (initial_capital, commission, position_size)
+        strategy_params: Rangos de parámetros de estrategia
+        strategy: Plantilla de reglas con marcadores {parámetro} que toman los
+                  valores de strategy_params (cada indicador se calcula una vez)
+        rank_by: Métrica para ordenar (default: sharpe_ratio)
+        top: Número de variantes a retornar en el ranking
+        stream: Si es true, responde con Server-Sent Events de progreso
+    
+    Returns:
+        {
+            "status": "success",
+            "total_variants": 24,
+            "ranking": [{"rank": 1, "commission": 0.0001, "sharpe_ratio": 1.9, ...}]
+        }
+    
+    Example:
+        POST /api/backtest/sweep
+        {
+            "symbol": "EURUSD",
+            "timeframe": "H1",
+            "parameters": {"commission": [0.0001, 0.0005], "position_size": [0.5, 0.95]},
+            "strategy_params": {"trades_count": [20, 50], "seed": [1, 2, 3]},
+            "rank_by": "sharpe_ratio"
+        }
+    
+    Example (umbrales de una estrategia de reglas):
+        {
+            "symbol": "EURUSD",
+            "timeframe": "H1",
+            "strategy": {"entry": "RSI(14) crosses_above {oversold}", "exit": "RSI(14) > {overbought}"},
+            "strategy_params": {"oversold": [20, 25, 30], "overbought": [65, 70, 75, 80]}
+        }
+    """
+    try:
+        if not request.symbol or not request.timeframe:
+            raise ValueError("Symbol y timeframe son requeridos")
+        resolve_timeframe(request.timeframe)
+        
+        if request.period_years < 1 or request.period_years > 20:
+            raise ValueError("Period years debe estar entre 1 y 20")
+        
+        variants = expand_grid(request.parameters, request.strategy_params)
+        if len(variants) > settings.sweep_max_variants:
+            raise ValueError(f"El barrido no puede exceder {settings.sweep_max_variants} variantes")
+        
+        # Validar rank_by antes de lanzar el barrido
+        rank_results([], request.rank_by)
+        
+        # Cargar precios una sola vez
+        engine = BacktestEngine()
+        df = await engine.download_price_data(request.symbol, request.timeframe, request.period_years)
+        close = df['Close'].to_numpy()
+        grid = ReturnGrid(request.timeframe, market_calendar(request.symbol))
+        grid_positions = grid.positions(df.index)
+        
+        # Indicadores de la plantilla: una vez por barrido, desde la caché compartida
+        rules = request.strategy.model_dump() if request.strategy else None
+        series = None
+        if rules:
+            executor = get_backtest_executor()
+            indicator_fn = await executor.run(engine.indicator_source, request.symbol, request.timeframe, df)
+            series = await executor.run(rule_series, df, rules, variants, indicator_fn)
+    
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en barrido: {str(e)}")
+    
+    summary = {
+        "symbol": request.symbol,
+        "timeframe": request.timeframe,
+        "period_years": request.period_years,
+        "bars": len(close),
+        "total_variants": len(variants),
+        "rank_by": request.rank_by
+    }
+    
+    if request.stream:
+        async def event_stream():
+            rows = []
+            try:
+                async for update in run_sweep(close, variants, series, rules, grid_positions, grid.periods_per_year):
+                    rows.extend(update["rows"])
+                    yield sse_event("progress", {
+                        "completed": update["completed"],
+                        "total": update["total"]
+                    })
+                yield sse_event("result", {
+                    "status": "success",
+                    **summary,
+                    "ranking": rank_results(rows, request.rank_by, request.top)
+                })
+            except Exception as e:
+                yield sse_event("error", {"status": "error", "message": str(e)})
+        
+        return StreamingResponse(event_stream(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+    
+    try:
+        rows = []
+        async for update in run_sweep(close, variants, series, rules, grid_positions, grid.periods_per_year):
+            rows.extend(update["rows"])
+        
+        return {
+            "status": "success",
+            **summary,
+            "ranking": rank_results(rows, request.rank_by, request.top),
+            "message": "Barrido ejecutado exitosamente"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en barrido: {str(e)}")
+
+
+@router.post("/walk-forward")
+async def walk_forward(
+    request: WalkForwardRequest,
+    max_points: Optional[int] = Query(None, description="Puntos máximos de equity_curve"),
+    downsample: str = Query("lttb", description="Decimación: lttb | minmax"),
+    encoding: str = Query("json", description="Codificación de la curva: json | float32-base64")
+):
+    """
+    Análisis walk-forward: optimiza el grid en cada tramo in-sample y evalúa
+    la mejor variante en el tramo out-of-sample siguiente
+    
+    Las ventanas se ejecutan en paralelo en el pool de procesos sobre los
+    mismos precios e indicadores en memoria compartida. La equity de los
+    tramos out-of-sample se encadena en una sola curva (cada tramo cierra
+    la posición en su última barra).
+    
+    Args:
+        symbol: Símbolo de trading
+        timeframe: Timeframe
+        period_years: Años de históricos
+        in_sample_bars: Barras de optimización de cada ventana
+        out_of_sample_bars: Barras de evaluación de cada ventana
+        anchored: Si es true el in-sample empieza siempre al inicio y crece
+        initial_capital: Capital inicial de la curva encadenada
+        parameters: Rangos de cuenta (commission, position_size)
+        strategy_params: Rangos de parámetros de estrategia
+        strategy: Plantilla de reglas con marcadores {parámetro}
+        rank_by: Métrica que elige la mejor variante in-sample (default: sharpe_ratio)
+        stream: Si es true, responde con Server-Sent Events por ventana terminada
+        max_points: Reduce equity_curve a como mucho N puntos (query)
+        downsample: Método de reducción, lttb o minmax (query)
+        encoding: json o float32-base64 en equity_curve_b64 (query)
+    
+    Returns:
+        {
+            "status": "success",
+            "windows": [{"out_of_sample_start": ..., "parameters": {...}, "in_sample": {...},
+                         "out_of_sample": {...}, "efficiency": 0.8}, ...],
+            "total_return_pct": 12.4,      (métricas de la curva out-of-sample encadenada)
+            "equity_curve": [...],
+            "trades": [...]
+        }
+    
+    Example:
+        POST /api/backtest/walk-forward
+        {
+            "symbol": "EURUSD",
+            "timeframe": "H1",
+            "period_years": 5,
+            "in_sample_bars": 6000,
+            "out_of_sample_bars": 1500,
+            "strategy": {"entry": "RSI(14) crosses_above {oversold}", "exit": "RSI(14) > {overbought}"},
+            "strategy_params": {"oversold": [20, 25, 30], "overbought": [65, 70, 75]}
+        }
+    """
+    try:
+        if not request.symbol or not request.timeframe:
+            raise ValueError("Symbol y timeframe son requeridos")
+        resolve_timeframe(request.timeframe)
+        validate_curve_options(max_points, downsample, encoding)
+        
+        if request.period_years < 1 or request.period_years > 20:
+            raise ValueError("Period years debe estar entre 1 y 20")
+        
+        if request.initial_capital <= 0:
+            raise ValueError("Initial capital debe ser mayor a 0")
+        
+        if "initial_capital" in request.parameters:
+            raise ValueError("initial_capital no se optimiza en walk-forward: use el campo initial_capital")
+        
+        variants = expand_grid(request.parameters, request.strategy_params)
+        if len(variants) > settings.sweep_max_variants:
+            raise ValueError(f"El walk-forward no puede exceder {settings.sweep_max_variants} variantes")
+        for variant in variants:
+            variant["initial_capital"] = request.initial_capital
+        
+        # Validar rank_by antes de lanzar las ventanas
+        rank_results([], request.rank_by)
+        
+        # Cargar precios e indicadores una sola vez para todas las ventanas
+        engine = BacktestEngine()
+        df = await engine.download_price_data(request.symbol, request.timeframe, request.period_years)
+        windows = walk_forward_windows(len(df), request.in_sample_bars, request.out_of_sample_bars, request.anchored)
+        close = df['Close'].to_numpy()
+        grid = ReturnGrid(request.timeframe, market_calendar(request.symbol))
+        
+        rules = request.strategy.model_dump() if request.strategy else None
+        series = None
+        if rules:
+            executor = get_backtest_executor()
+            indicator_fn = await executor.run(engine.indicator_source, request.symbol, request.timeframe, df)
+            series = await executor.run(rule_series, df, rules, variants, indicator_fn)
+    
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en walk-forward: {str(e)}")
+    
+    summary = {
+        "symbol": request.symbol,
+        "timeframe": request.timeframe,
+        "period_years": request.period_years,
+        "initial_capital": request.initial_capital,
+        "bars": len(close),
+        "total_windows": len(windows),
+        "total_variants": len(variants),
+        "rank_by": request.rank_by
+    }
+    
+    def stitched(results):
+        result = stitch_walk_forward(results, df.index, request.initial_capital, grid)
+        result.update(format_curve(result["equity_curve"], max_points, downsample, encoding))
+        return result
+    
+    if request.stream:
+        async def event_stream():
+            results = []
+            try:
+                async for update in run_walk_forward(
+                    close, df.index, windows, variants, grid, request.rank_by, series, rules
+                ):
+                    results.append(update["window"])
+                    yield sse_event("progress", {
+                        "completed": update["completed"],
+                        "total": update["total"],
+                        "window": window_summary(update["window"], df.index)
+                    })
+                yield sse_event("result", {"status": "success", **summary, **stitched(results)})
+            except Exception as e:
+                yield sse_event("error", {"status": "error", "message": str(e)})
+        
+        return StreamingResponse(event_stream(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+    
+    try:
+        results = [
+            update["window"]
+            async for update in run_walk_forward(
+                close, df.index, windows, variants, grid, request.rank_by, series, rules
+            )
+        ]
+        
+        return {
+            "status": "success",
+            **summary,
+            **stitched(results),
+            "message": "Walk-forward ejecutado exitosamente"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en walk-forward: {str(e)}")
+
+
+@router.post("/jobs", status_code=202)
+async def create_backtest_job(request: BacktestJobRequest):
+    """
+    Encola un backtest y retorna inmediatamente un job_id
+    
+    Los trabajos se guardan en la base de datos, así que sobreviven a una
+    recarga del navegador o a un reinicio del servidor. Un pool de workers
+    los ejecuta por prioridad (mayor primero) y, a igual prioridad, dando
+    turno al usuario con menos trabajos en ejecución. Al terminar, el
+    resultado se guarda en /api/results (result_id).
+    
+    Args:
+        ...: Los mismos campos que /run
+        user: Usuario que encola el trabajo (reparto justo entre usuarios)
+        priority: Prioridad (default: 0, mayor se ejecuta antes; se acota a
+                  ±backtest_job_max_priority)
+        bot_id, bot_name, description: Datos del resultado guardado (opcionales)
+    
+    Returns:
+        {
+            "job_id": "3f2a...",
+            "status": "queued",
+            "priority": 0,
+            ...
+        }
+    
+    Example:
+        POST /api/backtest/jobs
+        {
+            "symbol": "EURUSD",
+            "timeframe": "M5",
+            "period_years": 10,
+            "strategy": {"entry": "RSI(14) crosses_above 30", "exit": "RSI(14) > 70"},
+            "user": "ana",
+            "priority": 5
+        }
+    """
+    try:
+        _validate_backtest_request(request)
+        if not request.user:
+            raise ValueError("user es requerido")
+        
+        # Prioridad acotada: un cliente no puede adelantarse a toda la cola
+        limit = settings.backtest_job_max_priority
+        return await get_backtest_jobs().submit(
+            request.user,
+            min(max(request.priority, -limit), limit),
+            request.model_dump(exclude={"user", "priority"})
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error encolando backtest: {str(e)}")
+
+
+@router.get("/jobs")
+async def list_backtest_jobs(
+    user: Optional[str] = None,
+    status: Optional[str] = Query(None, description="queued | running | completed | failed | cancelled"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = 0
+):
+    """
+    Lista los trabajos de backtest (más recientes primero)
+    
+    Example:
+        GET /api/backtest/jobs?user=ana&status=running
+    """
+    try:
+        return await jobs_repository.list_jobs(user, status, limit, offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo trabajos: {str(e)}")
+
+
+@router.get("/jobs/{job_id}")
+async def get_backtest_job(job_id: str):
+    """
+    Estado de un trabajo: status, progress_pct, result_id cuando termina
+    o error si falló
+    
+    Example:
+        GET /api/backtest/jobs/3f2a...
+    """
+    job = await jobs_repository.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo {job_id} no encontrado")
+    return job
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_backtest_job_result(
+    job_id: str,
+    max_points: Optional[int] = Query(None, description="Puntos máximos de equity_curve"),
+    downsample: str = Query("lttb", description="Decimación: lttb | minmax"),
+    encoding: str = Query("json", description="Codificación de la curva: json | float32-base64")
+):
+    """
+    Resultado guardado de un trabajo terminado (el mismo que /api/results/{result_id})
+    
+    Example:
+        GET /api/backtest/jobs/3f2a.../result?max_points=1000
+    """
+    try:
+        validate_curve_options(max_points, downsample, encoding)
+        
+        job = await jobs_repository.get_job(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Trabajo {job_id} no encontrado")
+        if job["status"] != "completed":
+            raise HTTPException(status_code=409, detail=f"El trabajo {job_id} está {job['status']}")
+        
+        result_data = await results_repository.get_result(job["result_id"])
+        if result_data is None:
+            raise HTTPException(status_code=404, detail=f"Resultado {job['result_id']} no encontrado")
+        
+        result_data.update(format_curve(result_data["equity_curve"], max_points, downsample, encoding))
+        return {"job_id": job_id, **result_data}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo resultado: {str(e)}")
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_backtest_job(job_id: str):
+    """
+    Cancela un trabajo. Si está en cola se cancela al momento; si está en
+    ejecución el motor se detiene en su siguiente punto de control (cada
+    tramo en modo por tramos) y el trabajo pasa a cancelled.
+    
+    Example:
+        POST /api/backtest/jobs/3f2a.../cancel
+    """
+    job = await get_backtest_jobs().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo {job_id} no encontrado")
+    if job["status"] in ("completed", "failed"):
+        raise HTTPException(status_code=409, detail=f"El trabajo {job_id} ya terminó ({job['status']})")
+    return job
+
+
 @router.get("/demo")
 async def get_demo_backtest():
     """
@@ -187,6 +895,44 @@ async def get_demo_backtest():
     return demo_result
 
 
+@router.get("/indicators")
+async def get_rule_indicators():
+    """
+    Indicadores disponibles en las reglas de estrategia
+    
+    Returns:
+        {
+            "indicators": [{"name": "RSI", "params": {"period": 14}, "outputs": ["value"], ...}],
+            "operators": [...]
+        }
+    """
+    return {
+        "status": "success",
+        "indicators": describe_indicators(),
+        "price_series": ["open", "high", "low", "close", "volume"],
+        "operators": ["and", "or", "not", "<", "<=", ">", ">=", "==", "!=",
+                      "crosses_above", "crosses_below", "+", "-", "*", "/", "[n]"]
+    }
+
+
+@router.get("/metrics")
+async def get_executor_metrics():
+    """
+    Métricas del pool de ejecución de backtests y de la caché de indicadores
+    
+    Returns:
+        {
+            "executor": {"max_concurrency": 8, "queue_depth": 0, "running": 2, "avg_wait_ms": 1.25, ...},
+            "indicator_cache": {"entries": 12, "bytes": 9600000, "hits": 40, "extensions": 3, ...}
+        }
+    """
+    return {
+        "status": "success",
+        "executor": get_backtest_executor().metrics(),
+        "indicator_cache": get_indicator_cache().stats()
+    }
+
+
 @router.get("/health")
 async def health_check():
     """
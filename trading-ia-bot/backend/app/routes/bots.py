@@ -3,10 +3,12 @@ Routes para CRUD de bots
 Gestión de bots guardados
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime
+from typing import List, Optional, Union
+from app.services import bots_repository
+from app.services.projection import parse_fields, project, validate_view
 
 router = APIRouter(prefix="/api/bots", tags=["bots"])
 
@@ -34,39 +36,48 @@ class BotUpdate(BaseModel):
     strategy_type: Optional[str] = None
 
 
-class BotResponse(BaseModel):
-    """Respuesta con datos de un bot"""
+class BotSummary(BaseModel):
+    """Datos de un bot sin el código (view=summary)"""
     id: int
     name: str
     indicators: List[str]
     symbol: str
     timeframe: str
     strategy_type: str
-    code: str
     description: Optional[str]
     created_at: str
     updated_at: str
     status: str
 
 
-# ═════════════════════════════════════════════════════════════════════════════
-# SIMULACIÓN DE BASE DE DATOS (En memoria)
-# ═════════════════════════════════════════════════════════════════════════════
+class BotResponse(BotSummary):
+    """Respuesta con datos de un bot"""
+    code: str
 
-# Simular almacenamiento en memoria (en producción sería SQLite/PostgreSQL)
-bots_db = {}
-next_bot_id = 1
+
+class BotCodeResponse(BaseModel):
+    """Código MQL5 de un bot"""
+    id: int
+    code: str
 
 
 # ═════════════════════════════════════════════════════════════════════════════
 # ENDPOINTS
 # ═════════════════════════════════════════════════════════════════════════════
 
-@router.get("/list", response_model=List[BotResponse])
-async def list_bots():
+@router.get("/list", response_model=List[Union[BotResponse, BotSummary]])
+async def list_bots(
+    view: str = Query("full", description="full | summary (sin código)"),
+    fields: Optional[str] = Query(None, description="Campos a devolver, p.ej. id,name,symbol")
+):
     """
     Obtiene lista de todos los bots guardados
     
+    Args:
+        view: full incluye el código MQL5; summary lo omite
+        fields: Proyección explícita (tiene prioridad sobre view). El código
+                solo se lee de la base de datos si se pide "code"
+    
     Returns:
         [
             {
@@ -84,25 +95,20 @@ async def list_bots():
     
     Example:
         GET /api/bots/list
+        GET /api/bots/list?view=summary
+        GET /api/bots/list?fields=id,name,symbol,timeframe
     """
     try:
-        bots_list = []
-        for bot_id, bot_data in bots_db.items():
-            bots_list.append({
-                "id": bot_id,
-                "name": bot_data["name"],
-                "indicators": bot_data["indicators"],
-                "symbol": bot_data["symbol"],
-                "timeframe": bot_data["timeframe"],
-                "strategy_type": bot_data["strategy_type"],
-                "code": bot_data["code"],
-                "description": bot_data.get("description"),
-                "created_at": bot_data["created_at"],
-                "updated_at": bot_data.get("updated_at", bot_data["created_at"]),
-                "status": "active"
-            })
+        validate_view(view)
+        selected = parse_fields(fields, BotResponse.model_fields)
         
-        return bots_list
+        if selected is not None:
+            bots = await bots_repository.list_bots(include_code="code" in selected)
+            return JSONResponse(project(bots, selected))
+        
+        return await bots_repository.list_bots(include_code=view == "full")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo bots: {str(e)}")
 
@@ -140,8 +146,6 @@ async def create_bot(bot: BotCreate):
             "description": "Bot de tendencia con RSI"
         }
     """
-    global next_bot_id
-    
     try:
         # Validar
         if not bot.name or not bot.code:
@@ -151,36 +155,7 @@ async def create_bot(bot: BotCreate):
             raise ValueError("Nombre no puede exceder 100 caracteres")
         
         # Crear
-        bot_id = next_bot_id
-        now = datetime.now().isoformat()
-        
-        bots_db[bot_id] = {
-            "name": bot.name,
-            "indicators": bot.indicators,
-            "symbol": bot.symbol,
-            "timeframe": bot.timeframe,
-            "strategy_type": bot.strategy_type,
-            "code": bot.code,
-            "description": bot.description,
-            "created_at": now,
-            "updated_at": now
-        }
-        
-        next_bot_id += 1
-        
-        return {
-            "id": bot_id,
-            "name": bot.name,
-            "indicators": bot.indicators,
-            "symbol": bot.symbol,
-            "timeframe": bot.timeframe,
-            "strategy_type": bot.strategy_type,
-            "code": bot.code,
-            "description": bot.description,
-            "created_at": now,
-            "updated_at": now,
-            "status": "active"
-        }
+        return await bots_repository.create_bot(bot.model_dump())
     
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -207,30 +182,38 @@ async def get_bot(bot_id: int):
         GET /api/bots/1
     """
     try:
-        if bot_id not in bots_db:
+        bot_data = await bots_repository.get_bot(bot_id)
+        if bot_data is None:
             raise HTTPException(status_code=404, detail=f"Bot {bot_id} no encontrado")
         
-        bot_data = bots_db[bot_id]
-        
-        return {
-            "id": bot_id,
-            "name": bot_data["name"],
-            "indicators": bot_data["indicators"],
-            "symbol": bot_data["symbol"],
-            "timeframe": bot_data["timeframe"],
-            "strategy_type": bot_data["strategy_type"],
-            "code": bot_data["code"],
-            "description": bot_data.get("description"),
-            "created_at": bot_data["created_at"],
-            "updated_at": bot_data.get("updated_at"),
-            "status": "active"
-        }
+        return bot_data
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo bot: {str(e)}")
 
 
+@router.get("/{bot_id}/code", response_model=BotCodeResponse)
+async def get_bot_code(bot_id: int):
+    """
+    Obtiene solo el código MQL5 de un bot (para cargarlo bajo demanda
+    desde un listado con view=summary)
+    
+    Example:
+        GET /api/bots/1/code
+    """
+    try:
+        code = await bots_repository.get_bot_code(bot_id)
+        if code is None:
+            raise HTTPException(status_code=404, detail=f"Bot {bot_id} no encontrado")
+        
+        return {"id": bot_id, "code": code}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo código: {str(e)}")
+
+
 @router.put("/{bot_id}", response_model=BotResponse)
 async def update_bot(bot_id: int, bot_update: BotUpdate):
     """
@@ -252,36 +235,12 @@ async def update_bot(bot_id: int, bot_update: BotUpdate):
         }
     """
     try:
-        if bot_id not in bots_db:
-            raise HTTPException(status_code=404, detail=f"Bot {bot_id} no encontrado")
-        
-        bot_data = bots_db[bot_id]
-        
         # Actualizar campos
-        if bot_update.name:
-            bot_data["name"] = bot_update.name
-        if bot_update.description:
-            bot_data["description"] = bot_update.description
-        if bot_update.indicators:
-            bot_data["indicators"] = bot_update.indicators
-        if bot_update.strategy_type:
-            bot_data["strategy_type"] = bot_update.strategy_type
-        
-        bot_data["updated_at"] = datetime.now().isoformat()
+        bot_data = await bots_repository.update_bot(bot_id, bot_update.model_dump())
+        if bot_data is None:
+            raise HTTPException(status_code=404, detail=f"Bot {bot_id} no encontrado")
         
-        return {
-            "id": bot_id,
-            "name": bot_data["name"],
-            "indicators": bot_data["indicators"],
-            "symbol": bot_data["symbol"],
-            "timeframe": bot_data["timeframe"],
-            "strategy_type": bot_data["strategy_type"],
-            "code": bot_data["code"],
-            "description": bot_data.get("description"),
-            "created_at": bot_data["created_at"],
-            "updated_at": bot_data["updated_at"],
-            "status": "active"
-        }
+        return bot_data
     except HTTPException:
         raise
     except Exception as e:
@@ -306,11 +265,9 @@ async def delete_bot(bot_id: int):
         DELETE /api/bots/1
     """
     try:
-        if bot_id not in bots_db:
+        if not await bots_repository.delete_bot(bot_id):
             raise HTTPException(status_code=404, detail=f"Bot {bot_id} no encontrado")
         
-        del bots_db[bot_id]
-        
         return {
             "status": "deleted",
             "message": f"Bot {bot_id} eliminado exitosamente"
@@ -336,5 +293,5 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "bots",
-        "bots_count": len(bots_db)
+        "bots_count": await bots_repository.count_bots()
     }
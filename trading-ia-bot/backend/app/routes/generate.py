@@ -4,9 +4,22 @@ Endpoints para interactuar con Groq API
 """
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List
-from app.services.groq_service import generate_mql5_code, refine_mql5_code
+from typing import List, Optional
+from app.config import settings
+from app.services.codegen_cache import get_codegen_cache, normalize_request, request_key
+from app.services.generation_jobs import JobNotFoundError, get_generation_jobs
+from app.services.groq_service import (
+    generate_mql5_code,
+    refine_mql5_code,
+    refine_mql5_code_patch,
+    stream_mql5_code,
+    stream_refined_code
+)
+from app.services.mql5_patch import PatchError
+from app.services.streaming import SSE_HEADERS, SSE_MEDIA_TYPE, sse_event
+from app.services.timeframes import describe_timeframes
 
 router = APIRouter(prefix="/api/generate", tags=["generate"])
 
@@ -21,12 +34,30 @@ class GenerateRequest(BaseModel):
     symbol: str
     timeframe: str
     strategy_type: str
+    force_refresh: bool = False
+
+
+class BatchSpec(BaseModel):
+    """Especificación de un bot dentro de un batch"""
+    indicators: List[str]
+    symbol: str
+    timeframe: str
+    strategy_type: str
+    name: Optional[str] = None
+    description: Optional[str] = None
+
+
+class BatchRequest(BaseModel):
+    """Request para generar varios bots en segundo plano"""
+    specs: List[BatchSpec]
+    force_refresh: bool = False
 
 
 class RefineRequest(BaseModel):
     """Request para refinar código con errores"""
     code: str
     error_message: str
+    mode: str = "auto"
 
 
 # ═════════════════════════════════════════════════════════════════════════════
@@ -43,12 +74,17 @@ async def generate_bot(request: GenerateRequest):
         symbol: Símbolo de trading (EURUSD, XAUUSD, etc.)
         timeframe: Timeframe (M1, M5, H1, D1, etc.)
         strategy_type: Tipo de estrategia (Tendencia, Reversión, etc.)
+        force_refresh: Ignorar la caché y volver a llamar al LLM (default: False)
+    
+    Peticiones equivalentes (mismos indicadores en cualquier orden, mismo
+    símbolo/timeframe/estrategia) se sirven desde la caché de código.
     
     Returns:
         {
             "status": "success",
             "code": "//+--...",
-            "message": "Bot generado exitosamente"
+            "message": "Bot generado exitosamente",
+            "cached": false
         }
     
     Example:
@@ -67,12 +103,19 @@ async def generate_bot(request: GenerateRequest):
         if not request.symbol or not request.timeframe:
             raise ValueError("Symbol y timeframe son requeridos")
         
-        # Generar código
-        code = await generate_mql5_code(
-            indicators=request.indicators,
-            symbol=request.symbol,
-            timeframe=request.timeframe,
-            strategy_type=request.strategy_type
+        # Generar código (o recuperarlo de la caché)
+        key = _cache_key(request)
+        code, cached = await get_codegen_cache().get_or_generate(
+            key,
+            lambda: generate_mql5_code(
+                indicators=request.indicators,
+                symbol=request.symbol,
+                timeframe=request.timeframe,
+                strategy_type=request.strategy_type
+            ),
+            force_refresh=request.force_refresh,
+            # Los errores de Groq vuelven como texto: no cachearlos
+            cacheable=lambda code: not code.startswith("ERROR_GROQ")
         )
         
         return {
@@ -82,7 +125,8 @@ async def generate_bot(request: GenerateRequest):
             "indicators": request.indicators,
             "symbol": request.symbol,
             "timeframe": request.timeframe,
-            "strategy_type": request.strategy_type
+            "strategy_type": request.strategy_type,
+            "cached": cached
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando bot: {str(e)}")
@@ -96,39 +140,257 @@ async def refine_bot(request: RefineRequest):
     Args:
         code: Código MQL5 con errores
         error_message: Mensaje de error del compilador
+        mode: auto (parche por regiones, reescritura completa si falla),
+              patch (solo parche, 422 si no se puede) o full (reescritura completa)
+    
+    En modo parche solo se envían al modelo las funciones que señalan los
+    errores (por número de línea o identificador citado) y el resultado se
+    aplica y valida localmente.
     
     Returns:
         {
             "status": "success",
             "code": "//+--...",
-            "message": "Código refinado"
+            "message": "Código refinado",
+            "mode": "patch",
+            "regions": [[40, 62]],
+            "fallback_reason": null
         }
     
     Example:
         POST /api/generate/refine
         {
             "code": "//+--\n...",
-            "error_message": "undefined symbol 'Ask'"
+            "error_message": "EA.mq5(45,12) : error 256: 'Ask' - undeclared identifier"
         }
     """
     try:
         if not request.code or not request.error_message:
             raise ValueError("Code y error_message son requeridos")
+        if request.mode not in ("auto", "patch", "full"):
+            raise ValueError("mode debe ser auto, patch o full")
         
-        refined_code = await refine_mql5_code(
-            code=request.code,
-            error_message=request.error_message
-        )
+        if request.mode == "full":
+            refined = {
+                "code": await refine_mql5_code(code=request.code, error_message=request.error_message),
+                "mode": "full",
+                "regions": [],
+                "fallback_reason": None
+            }
+        else:
+            refined = await refine_mql5_code_patch(
+                code=request.code,
+                error_message=request.error_message,
+                allow_fallback=request.mode == "auto"
+            )
         
         return {
             "status": "success",
-            "code": refined_code,
-            "message": "Código refinado exitosamente"
+            "message": "Código refinado exitosamente",
+            **refined
         }
+    except PatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error refinando código: {str(e)}")
 
 
+@router.post("/bot/stream")
+async def generate_bot_stream(request: GenerateRequest):
+    """
+    Genera un Expert Advisor MQL5 emitiendo el código por Server-Sent Events
+    según lo produce el modelo (las vallas ``` se quitan sobre la marcha)
+    
+    Eventos (en orden):
+        start → {"cached": false}
+        chunk → {"text": "..."}              (fragmentos de código, concatenar)
+        done  → {"code": "...", "cached": false}
+        error → {"status": "error", "message": ...}
+    
+    Si la petición está en la caché, o ya se está generando (por /bot, /bot/stream
+    o un batch), se emite el código completo en un solo chunk.
+    
+    Example:
+        POST /api/generate/bot/stream
+        {
+            "indicators": ["ADX", "RSI"],
+            "symbol": "EURUSD",
+            "timeframe": "H1",
+            "strategy_type": "Tendencia"
+        }
+    """
+    if not request.indicators:
+        raise HTTPException(status_code=400, detail="Debe seleccionar al menos un indicador")
+    if not request.symbol or not request.timeframe:
+        raise HTTPException(status_code=400, detail="Symbol y timeframe son requeridos")
+    
+    cache = get_codegen_cache()
+    key = _cache_key(request)
+    
+    async def event_stream():
+        # Se une a la generación en vuelo con la misma clave, si la hay
+        cached, chunks = cache.stream(
+            key,
+            lambda: stream_mql5_code(
+                indicators=request.indicators,
+                symbol=request.symbol,
+                timeframe=request.timeframe,
+                strategy_type=request.strategy_type
+            ),
+            force_refresh=request.force_refresh
+        )
+        yield sse_event("start", {"cached": cached})
+        
+        try:
+            parts = []
+            async for text in chunks:
+                parts.append(text)
+                yield sse_event("chunk", {"text": text})
+            
+            yield sse_event("done", {"code": "".join(parts).strip(), "cached": cached})
+        except Exception as e:
+            yield sse_event("error", {"status": "error", "message": str(e)})
+    
+    return StreamingResponse(event_stream(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+
+@router.post("/refine/stream")
+async def refine_bot_stream(request: RefineRequest):
+    """
+    Refina código MQL5 emitiendo el resultado por Server-Sent Events
+    
+    Eventos: start, chunk {"text"}, done {"code"}, error (igual que /bot/stream)
+    
+    Example:
+        POST /api/generate/refine/stream
+        {
+            "code": "//+--\n...",
+            "error_message": "undefined symbol 'Ask'"
+        }
+    """
+    if not request.code or not request.error_message:
+        raise HTTPException(status_code=400, detail="Code y error_message son requeridos")
+    
+    async def event_stream():
+        yield sse_event("start", {})
+        try:
+            parts = []
+            async for text in stream_refined_code(code=request.code, error_message=request.error_message):
+                parts.append(text)
+                yield sse_event("chunk", {"text": text})
+            
+            yield sse_event("done", {"code": "".join(parts).strip()})
+        except Exception as e:
+            yield sse_event("error", {"status": "error", "message": str(e)})
+    
+    return StreamingResponse(event_stream(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+
+@router.post("/batch")
+async def create_batch(request: BatchRequest):
+    """
+    Encola la generación de varios bots y retorna inmediatamente un job_id
+    
+    Un pool de workers procesa las especificaciones respetando la cuota de
+    Groq (GROQ_REQUESTS_PER_MINUTE); ante un 429 todos pausan y el item se
+    reintenta. Cada bot generado se guarda directamente en /api/bots.
+    
+    Returns:
+        {
+            "job_id": "3f2a...",
+            "status": "queued",
+            "total": 24,
+            ...
+        }
+    
+    Example:
+        POST /api/generate/batch
+        {
+            "specs": [
+                {"indicators": ["RSI"], "symbol": "EURUSD", "timeframe": "H1", "strategy_type": "Reversión"},
+                {"indicators": ["ADX", "EMA"], "symbol": "XAUUSD", "timeframe": "H4", "strategy_type": "Tendencia"}
+            ]
+        }
+    """
+    try:
+        if not request.specs:
+            raise ValueError("Debe incluir al menos una especificación")
+        if len(request.specs) > settings.generation_batch_max_specs:
+            raise ValueError(f"Máximo {settings.generation_batch_max_specs} especificaciones por batch")
+        for index, spec in enumerate(request.specs):
+            if not spec.indicators:
+                raise ValueError(f"specs[{index}]: debe seleccionar al menos un indicador")
+            if not spec.symbol or not spec.timeframe:
+                raise ValueError(f"specs[{index}]: symbol y timeframe son requeridos")
+        
+        return await get_generation_jobs().submit([spec.model_dump() for spec in request.specs], request.force_refresh)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creando batch: {str(e)}")
+
+
+@router.get("/batch")
+async def list_batches():
+    """
+    Lista los trabajos batch guardados (más recientes primero, sin items)
+    """
+    return await get_generation_jobs().list_jobs()
+
+
+@router.get("/batch/{job_id}")
+async def get_batch(job_id: str):
+    """
+    Estado de un trabajo batch con el resultado de cada especificación
+    
+    Returns:
+        {
+            "job_id": "3f2a...",
+            "status": "running",
+            "total": 24,
+            "completed": 10,
+            "failed": 1,
+            "pending": 13,
+            "items": [{"index": 0, "status": "completed", "bot_id": 42, "cached": false, ...}, ...]
+        }
+    """
+    try:
+        return await get_generation_jobs().get(job_id)
+    except JobNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Batch {job_id} no encontrado")
+
+
+@router.get("/batch/{job_id}/stream")
+async def stream_batch(job_id: str):
+    """
+    Sigue un trabajo batch por Server-Sent Events
+    
+    Eventos:
+        item → estado final de una especificación (se reemiten los ya terminados)
+        done → resumen del trabajo
+    """
+    jobs = get_generation_jobs()
+    try:
+        await jobs.get(job_id, include_items=False)
+    except JobNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Batch {job_id} no encontrado")
+    
+    async def event_stream():
+        async for update in jobs.follow(job_id):
+            event = update.pop("event")
+            yield sse_event(event, update)
+    
+    return StreamingResponse(event_stream(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+
+def _cache_key(request: GenerateRequest) -> str:
+    return request_key(normalize_request(
+        request.indicators, request.symbol, request.timeframe, request.strategy_type, settings.groq_model
+    ))
+
+
 @router.get("/indicators")
 async def get_indicators():
     """
@@ -252,9 +514,14 @@ async def get_timeframes():
     """
     Retorna lista de timeframes disponibles
     
+    Los que el proveedor no sirve directamente (H4, W1, MN1) se derivan
+    localmente de la serie base; también se aceptan timeframes
+    personalizados (M3, H6, D2...).
+    
     Returns:
         {
-            "timeframes": ["M1", "M5", "H1", ...]
+            "timeframes": ["M1", "M5", "H1", ...],
+            "details": [{"timeframe": "H4", "source_interval": "1h", "resampled": true, "max_history_days": 729}, ...]
         }
     """
     timeframes = [
@@ -272,10 +539,29 @@ async def get_timeframes():
     return {
         "status": "success",
         "timeframes": timeframes,
+        "details": describe_timeframes(timeframes),
         "count": len(timeframes)
     }
 
 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Estadísticas de la caché de código generado
+    
+    Returns:
+        {
+            "entries": 12,
+            "hits": 40,
+            "misses": 12,
+            "coalesced": 3,
+            "hit_rate": 0.7692,
+            ...
+        }
+    """
+    return get_codegen_cache().stats()
+
+
 @router.get("/health")
 async def health_check():
     """
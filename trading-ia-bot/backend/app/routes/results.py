@@ -3,10 +3,15 @@ Routes para gestión de resultados de backtest
 Almacenamiento y recuperación de resultados
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime
+from typing import List, Optional, Union
+from app.services import results_repository
+from app.services.executor import ExecutorBusyError, get_backtest_executor
+from app.services.monte_carlo import run_monte_carlo
+from app.services.projection import parse_fields, project, validate_view
+from app.services.curve_encoding import downsample as downsample_curve, format_curve, validate_curve_options
 
 router = APIRouter(prefix="/api/results", tags=["results"])
 
@@ -21,6 +26,7 @@ class ResultCreate(BaseModel):
     bot_name: str
     symbol: str
     timeframe: str
+    strategy_type: Optional[str] = None
     period_years: int
     initial_capital: float
     final_capital: float
@@ -28,20 +34,21 @@ class ResultCreate(BaseModel):
     sharpe_ratio: float
     max_drawdown_pct: float
     win_rate_pct: float
-    profit_factor: float
+    profit_factor: Optional[float]
     total_trades: int
     equity_curve: List[float]
     trades: List[dict]
     description: Optional[str] = None
 
 
-class ResultResponse(BaseModel):
-    """Respuesta con datos de un resultado"""
+class ResultSummary(BaseModel):
+    """Métricas de un resultado sin curva ni trades (view=summary)"""
     id: int
     bot_id: Optional[int]
     bot_name: str
     symbol: str
     timeframe: str
+    strategy_type: Optional[str] = None
     period_years: int
     initial_capital: float
     final_capital: float
@@ -49,40 +56,85 @@ class ResultResponse(BaseModel):
     sharpe_ratio: float
     max_drawdown_pct: float
     win_rate_pct: float
-    profit_factor: float
+    profit_factor: Optional[float]
     total_trades: int
-    equity_curve: List[float]
-    trades: List[dict]
     description: Optional[str]
     created_at: str
     status: str
 
 
-# ═════════════════════════════════════════════════════════════════════════════
-# SIMULACIÓN DE BASE DE DATOS (En memoria)
-# ═════════════════════════════════════════════════════════════════════════════
+class EquityCurveResponse(BaseModel):
+    """Curva de equity de un resultado"""
+    equity_curve: List[float]
+    equity_curve_b64: Optional[str] = None
+    equity_curve_index: Optional[List[int]] = None
+    equity_curve_encoding: str = "json"
+    equity_curve_points: Optional[int] = None
+
+
+class ResultResponse(EquityCurveResponse, ResultSummary):
+    """Respuesta con datos de un resultado"""
+    trades: List[dict]
+
+
+class ResultEquityResponse(EquityCurveResponse):
+    """Respuesta de /{result_id}/equity"""
+    id: int
+
 
-results_db = {}
-next_result_id = 1
+class ResultTradesResponse(BaseModel):
+    """Respuesta de /{result_id}/trades"""
+    id: int
+    trades: List[dict]
+
+
+class MonteCarloRequest(BaseModel):
+    """Request para el análisis Monte Carlo de los trades de un resultado"""
+    simulations: int = 10000
+    method: str = "bootstrap"
+    confidence: float = 0.95
+    seed: Optional[int] = None
 
 
 # ═════════════════════════════════════════════════════════════════════════════
 # ENDPOINTS
 # ═════════════════════════════════════════════════════════════════════════════
 
-@router.get("/list", response_model=List[ResultResponse])
+@router.get("/list", response_model=List[Union[ResultResponse, ResultSummary]])
 async def list_results(
-    limit: int = 50,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
     offset: int = 0,
-    symbol: Optional[str] = None
+    symbol: Optional[str] = None,
+    timeframe: Optional[str] = None,
+    bot_id: Optional[int] = None,
+    sort_by: str = Query("id", description="id | created_at | total_return_pct | sharpe_ratio | ..."),
+    order: str = Query("asc", description="asc | desc"),
+    cursor: Optional[str] = Query(None, description="Cursor de X-Next-Cursor de la página anterior"),
+    view: str = Query("full", description="full | summary (sin curva ni trades)"),
+    fields: Optional[str] = Query(None, description="Campos a devolver, p.ej. id,symbol,sharpe_ratio"),
+    max_points: Optional[int] = Query(None, description="Puntos máximos de equity_curve"),
+    downsample: str = Query("lttb", description="Decimación: lttb | minmax"),
+    encoding: str = Query("json", description="Codificación de la curva: json | float32-base64")
 ):
     """
     Obtiene lista de resultados de backtests
     
     Args:
         limit: Número máximo de resultados (default: 50)
-        offset: Desplazamiento para paginación (default: 0)
+        offset: Desplazamiento para paginación (default: 0, se ignora con cursor)
         symbol: Filtrar por símbolo (opcional)
+        timeframe: Filtrar por timeframe (opcional)
+        bot_id: Filtrar por bot (opcional)
+        sort_by: Métrica de orden (default: id)
+        order: asc o desc
+        cursor: Continúa tras la última fila de la página anterior
+        view: full incluye equity_curve y trades; summary solo métricas
+        fields: Proyección explícita (tiene prioridad sobre view). Curva y
+                trades solo se leen de la base de datos si se piden
+        max_points: Reduce cada equity_curve a como mucho N puntos
+        downsample: Método de reducción, lttb o minmax
+        encoding: json o float32-base64 en equity_curve_b64
     
     Returns:
         [
@@ -94,48 +146,62 @@ async def list_results(
                 ...
             }
         ]
+        Header X-Next-Cursor con el cursor de la página siguiente (si hay más)
     
     Example:
         GET /api/results/list?limit=10&offset=0
         GET /api/results/list?symbol=EURUSD
+        GET /api/results/list?sort_by=sharpe_ratio&order=desc&limit=20
+        GET /api/results/list?sort_by=sharpe_ratio&order=desc&cursor=WzEuOCw0Ml0
+        GET /api/results/list?max_points=200&encoding=float32-base64
+        GET /api/results/list?view=summary&sort_by=sharpe_ratio&order=desc
+        GET /api/results/list?fields=id,symbol,total_return_pct,sharpe_ratio
     """
     try:
-        results_list = []
+        validate_curve_options(max_points, downsample, encoding)
+        validate_view(view)
+        selected = parse_fields(fields, ResultResponse.model_fields)
+        
+        if selected is not None:
+            with_curve = any(field in EquityCurveResponse.model_fields for field in selected)
+            include_blobs = with_curve or "trades" in selected
+        else:
+            with_curve = include_blobs = view == "full"
+        
+        results_list, next_cursor = await results_repository.list_results(
+            limit=limit,
+            offset=offset,
+            symbol=symbol,
+            timeframe=timeframe,
+            bot_id=bot_id,
+            sort_by=sort_by,
+            order=order,
+            cursor=cursor,
+            include_blobs=include_blobs
+        )
         
-        for result_id, result_data in list(results_db.items())[offset:offset+limit]:
-            # Filtrar por símbolo si se proporciona
-            if symbol and result_data["symbol"] != symbol:
-                continue
-            
-            results_list.append({
-                "id": result_id,
-                "bot_id": result_data.get("bot_id"),
-                "bot_name": result_data["bot_name"],
-                "symbol": result_data["symbol"],
-                "timeframe": result_data["timeframe"],
-                "period_years": result_data["period_years"],
-                "initial_capital": result_data["initial_capital"],
-                "final_capital": result_data["final_capital"],
-                "total_return_pct": result_data["total_return_pct"],
-                "sharpe_ratio": result_data["sharpe_ratio"],
-                "max_drawdown_pct": result_data["max_drawdown_pct"],
-                "win_rate_pct": result_data["win_rate_pct"],
-                "profit_factor": result_data["profit_factor"],
-                "total_trades": result_data["total_trades"],
-                "equity_curve": result_data["equity_curve"],
-                "trades": result_data["trades"],
-                "description": result_data.get("description"),
-                "created_at": result_data["created_at"],
-                "status": "completed"
-            })
+        if with_curve:
+            for result_data in results_list:
+                result_data.update(format_curve(result_data["equity_curve"], max_points, downsample, encoding))
         
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        if selected is not None:
+            return JSONResponse(project(results_list, selected), headers=headers)
+        
+        response.headers.update(headers)
         return results_list
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo resultados: {str(e)}")
 
 
 @router.post("/save", response_model=ResultResponse)
-async def save_result(result: ResultCreate):
+async def save_result(
+    result: ResultCreate,
+    max_points: Optional[int] = Query(None, description="Reducir la curva antes de guardarla"),
+    downsample: str = Query("lttb", description="Decimación: lttb | minmax")
+):
     """
     Guarda un resultado de backtest
     
@@ -145,6 +211,8 @@ async def save_result(result: ResultCreate):
         total_return_pct: Retorno total
         sharpe_ratio: Ratio de Sharpe
         ... otras métricas
+        max_points: Reduce equity_curve a N puntos antes de guardar (query)
+        downsample: Método de reducción, lttb o minmax (query)
     
     Returns:
         {
@@ -163,8 +231,6 @@ async def save_result(result: ResultCreate):
             ...
         }
     """
-    global next_result_id
-    
     try:
         # Validar
         if not result.bot_name:
@@ -173,53 +239,14 @@ async def save_result(result: ResultCreate):
         if result.total_return_pct is None:
             raise ValueError("Total return es requerido")
         
-        # Guardar
-        result_id = next_result_id
-        now = datetime.now().isoformat()
+        validate_curve_options(max_points, downsample, "json")
+        equity_curve = downsample_curve(result.equity_curve, max_points, downsample)[1].tolist()
         
-        results_db[result_id] = {
-            "bot_id": result.bot_id,
-            "bot_name": result.bot_name,
-            "symbol": result.symbol,
-            "timeframe": result.timeframe,
-            "period_years": result.period_years,
-            "initial_capital": result.initial_capital,
-            "final_capital": result.final_capital,
-            "total_return_pct": result.total_return_pct,
-            "sharpe_ratio": result.sharpe_ratio,
-            "max_drawdown_pct": result.max_drawdown_pct,
-            "win_rate_pct": result.win_rate_pct,
-            "profit_factor": result.profit_factor,
-            "total_trades": result.total_trades,
-            "equity_curve": result.equity_curve,
-            "trades": result.trades,
-            "description": result.description,
-            "created_at": now
-        }
-        
-        next_result_id += 1
-        
-        return {
-            "id": result_id,
-            "bot_id": result.bot_id,
-            "bot_name": result.bot_name,
-            "symbol": result.symbol,
-            "timeframe": result.timeframe,
-            "period_years": result.period_years,
-            "initial_capital": result.initial_capital,
-            "final_capital": result.final_capital,
-            "total_return_pct": result.total_return_pct,
-            "sharpe_ratio": result.sharpe_ratio,
-            "max_drawdown_pct": result.max_drawdown_pct,
-            "win_rate_pct": result.win_rate_pct,
-            "profit_factor": result.profit_factor,
-            "total_trades": result.total_trades,
-            "equity_curve": result.equity_curve,
-            "trades": result.trades,
-            "description": result.description,
-            "created_at": now,
-            "status": "completed"
-        }
+        # Guardar
+        return await results_repository.save_result({
+            **result.model_dump(),
+            "equity_curve": equity_curve
+        })
     
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -228,12 +255,20 @@ async def save_result(result: ResultCreate):
 
 
 @router.get("/{result_id}", response_model=ResultResponse)
-async def get_result(result_id: int):
+async def get_result(
+    result_id: int,
+    max_points: Optional[int] = Query(None, description="Puntos máximos de equity_curve"),
+    downsample: str = Query("lttb", description="Decimación: lttb | minmax"),
+    encoding: str = Query("json", description="Codificación de la curva: json | float32-base64")
+):
     """
     Obtiene un resultado específico por ID
     
     Args:
         result_id: ID del resultado
+        max_points: Reduce equity_curve a como mucho N puntos
+        downsample: Método de reducción, lttb o minmax
+        encoding: json o float32-base64 en equity_curve_b64
     
     Returns:
         {
@@ -245,36 +280,21 @@ async def get_result(result_id: int):
     
     Example:
         GET /api/results/1
+        GET /api/results/1?max_points=1000&downsample=minmax
     """
     try:
-        if result_id not in results_db:
-            raise HTTPException(status_code=404, detail=f"Resultado {result_id} no encontrado")
+        validate_curve_options(max_points, downsample, encoding)
         
-        result_data = results_db[result_id]
+        result_data = await results_repository.get_result(result_id)
+        if result_data is None:
+            raise HTTPException(status_code=404, detail=f"Resultado {result_id} no encontrado")
         
-        return {
-            "id": result_id,
-            "bot_id": result_data.get("bot_id"),
-            "bot_name": result_data["bot_name"],
-            "symbol": result_data["symbol"],
-            "timeframe": result_data["timeframe"],
-            "period_years": result_data["period_years"],
-            "initial_capital": result_data["initial_capital"],
-            "final_capital": result_data["final_capital"],
-            "total_return_pct": result_data["total_return_pct"],
-            "sharpe_ratio": result_data["sharpe_ratio"],
-            "max_drawdown_pct": result_data["max_drawdown_pct"],
-            "win_rate_pct": result_data["win_rate_pct"],
-            "profit_factor": result_data["profit_factor"],
-            "total_trades": result_data["total_trades"],
-            "equity_curve": result_data["equity_curve"],
-            "trades": result_data["trades"],
-            "description": result_data.get("description"),
-            "created_at": result_data["created_at"],
-            "status": "completed"
-        }
+        result_data.update(format_curve(result_data["equity_curve"], max_points, downsample, encoding))
+        return result_data
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo resultado: {str(e)}")
 
@@ -297,11 +317,9 @@ async def delete_result(result_id: int):
         DELETE /api/results/1
     """
     try:
-        if result_id not in results_db:
+        if not await results_repository.delete_result(result_id):
             raise HTTPException(status_code=404, detail=f"Resultado {result_id} no encontrado")
         
-        del results_db[result_id]
-        
         return {
             "status": "deleted",
             "message": f"Resultado {result_id} eliminado exitosamente"
@@ -313,52 +331,167 @@ async def delete_result(result_id: int):
 
 
 @router.get("/stats/summary")
-async def get_summary_stats():
+async def get_summary_stats(
+    metric: str = Query(
+        "total_return_pct",
+        description="Métrica para mejor/peor resultado: total_return_pct | sharpe_ratio | max_drawdown_pct | win_rate_pct | profit_factor"
+    ),
+    group_by: Optional[str] = Query(None, description="symbol | timeframe | strategy_type")
+):
     """
     Obtiene estadísticas generales de todos los resultados
     
+    Los totales y promedios salen de agregados que save/delete mantienen al
+    escribir, y el mejor/peor resultado de un índice por métrica, así que el
+    coste no crece con el número de resultados.
+    
+    Args:
+        metric: Métrica para elegir best_result/worst_result (default: total_return_pct)
+        group_by: Añade "groups" con el mismo desglose por symbol, timeframe o strategy_type
+    
     Returns:
         {
             "total_results": 10,
             "avg_return": 15.50,
             "avg_sharpe": 1.45,
-            "best_result": {...}
+            "avg_drawdown": -8.20,
+            "avg_win_rate": 54.10,
+            "best_result": {...},
+            "worst_result": {...},
+            "groups": {"EURUSD": {...}, ...}   (solo con group_by)
         }
+    
+    Example:
+        GET /api/results/stats/summary
+        GET /api/results/stats/summary?group_by=symbol&metric=sharpe_ratio
     """
     try:
-        if not results_db:
-            return {
-                "total_results": 0,
-                "avg_return": 0,
-                "avg_sharpe": 0,
-                "best_result": None
-            }
+        stats = await results_repository.summary_stats(metric, group_by)
         
-        total_return = sum(r["total_return_pct"] for r in results_db.values())
-        avg_return = total_return / len(results_db)
+        return _round_stats(stats)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo estadísticas: {str(e)}")
+
+
+def _round_stats(stats: dict) -> dict:
+    rounded = {
+        key: round(value, 2) if key.startswith("avg_") else value
+        for key, value in stats.items()
+    }
+    if "groups" in stats:
+        rounded["groups"] = {key: _round_stats(group) for key, group in stats["groups"].items()}
+    return rounded
+
+
+@router.get("/{result_id}/equity", response_model=ResultEquityResponse)
+async def get_result_equity(
+    result_id: int,
+    max_points: Optional[int] = Query(None, description="Puntos máximos de equity_curve"),
+    downsample: str = Query("lttb", description="Decimación: lttb | minmax"),
+    encoding: str = Query("json", description="Codificación de la curva: json | float32-base64")
+):
+    """
+    Obtiene solo la curva de equity de un resultado (para cargarla bajo
+    demanda desde un listado con view=summary)
+    
+    Example:
+        GET /api/results/1/equity?max_points=500
+    """
+    try:
+        validate_curve_options(max_points, downsample, encoding)
         
-        total_sharpe = sum(r["sharpe_ratio"] for r in results_db.values())
-        avg_sharpe = total_sharpe / len(results_db)
+        equity_curve = await results_repository.get_result_curve(result_id)
+        if equity_curve is None:
+            raise HTTPException(status_code=404, detail=f"Resultado {result_id} no encontrado")
         
-        best_result_id = max(
-            results_db.keys(),
-            key=lambda k: results_db[k]["total_return_pct"]
-        )
-        best_result = results_db[best_result_id]
+        return {"id": result_id, **format_curve(equity_curve, max_points, downsample, encoding)}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo curva: {str(e)}")
+
+
+@router.get("/{result_id}/trades", response_model=ResultTradesResponse)
+async def get_result_trades(result_id: int):
+    """
+    Obtiene solo la lista de trades de un resultado
+    
+    Example:
+        GET /api/results/1/trades
+    """
+    try:
+        trades = await results_repository.get_result_trades(result_id)
+        if trades is None:
+            raise HTTPException(status_code=404, detail=f"Resultado {result_id} no encontrado")
         
+        return {"id": result_id, "trades": trades}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo trades: {str(e)}")
+
+
+@router.post("/{result_id}/monte-carlo")
+async def monte_carlo(result_id: int, request: MonteCarloRequest):
+    """
+    Análisis de robustez Monte Carlo sobre los trades de un resultado
+    
+    Remuestrea los trades (bootstrap con reemplazo o permutación del orden)
+    y devuelve la distribución de retorno, drawdown máximo y profit factor.
+    
+    Args:
+        result_id: ID del resultado
+        simulations: Número de simulaciones (default: 10000)
+        method: bootstrap | permutation (solo reordena: varía el drawdown)
+        confidence: Nivel del intervalo de confianza (default: 0.95)
+        seed: Semilla para resultados reproducibles (opcional)
+    
+    Returns:
+        {
+            "method": "bootstrap",
+            "simulations": 10000,
+            "original": {"total_return_pct": 25.5, "max_drawdown_pct": -8.2, ...},
+            "probability_of_loss_pct": 12.4,
+            "no_loss_simulations": 3,
+            "total_return_pct": {"mean": ..., "median": ..., "ci_low": ..., "ci_high": ..., ...},
+            "max_drawdown_pct": {...},
+            "profit_factor": {...}   (solo simulaciones con alguna pérdida)
+        }
+    
+    Example:
+        POST /api/results/1/monte-carlo
+        {"simulations": 20000, "method": "permutation", "seed": 42}
+    """
+    try:
+        stored = await results_repository.get_result_trades_and_capital(result_id)
+        if stored is None:
+            raise HTTPException(status_code=404, detail=f"Resultado {result_id} no encontrado")
+        
+        trades, initial_capital = stored
         return {
-            "total_results": len(results_db),
-            "avg_return": round(avg_return, 2),
-            "avg_sharpe": round(avg_sharpe, 2),
-            "best_result": {
-                "id": best_result_id,
-                "bot_name": best_result["bot_name"],
-                "symbol": best_result["symbol"],
-                "total_return_pct": best_result["total_return_pct"]
-            }
+            "id": result_id,
+            **await get_backtest_executor().run(
+                run_monte_carlo,
+                trades,
+                initial_capital,
+                request.simulations,
+                request.method,
+                request.confidence,
+                request.seed
+            )
         }
+    except HTTPException:
+        raise
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo estadísticas: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error en Monte Carlo: {str(e)}")
 
 
 @router.get("/health/check", tags=["health"])
@@ -376,5 +509,5 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "results",
-        "results_count": len(results_db)
+        "results_count": await results_repository.count_results()
     }
@@ -1,9 +1,55 @@
 import asyncio
+import threading
 from datetime import datetime, timedelta
 import numpy as np
 import pandas as pd
-import yfinance as yf
-from typing import Dict, List, Tuple
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from app.config import settings
+from app.services.calendars import ReturnGrid, market_calendar
+from app.services.chunked_backtest import ArrayPositions, ChunkPositions, chunk_positions, walk_chunks
+from app.services.executor import ExecutorBusyError, get_backtest_executor
+from app.services.indicator_cache import get_indicator_cache
+from app.services.metrics import MetricsAccumulator, compute_metrics
+from app.services.price_store import PriceStore, get_price_store
+from app.services.simulation import signals_to_positions, simulate, trades_to_records
+from app.services.strategy_rules import IndicatorFn, strategy_positions
+from app.services.timeframes import BarWindow, get_bars, get_many_bars, open_window, resolve_timeframe
+
+# Modos de ejecución: todo en memoria, por tramos o según el tamaño
+BACKTEST_MODES = ("auto", "memory", "chunked")
+
+# Holgura antes de dar por recortado el periodo (fines de semana y festivos
+# al inicio de la ventana no cuentan)
+PERIOD_TRUNCATION_SLACK = timedelta(days=7)
+
+
+def effective_period(dates: pd.DatetimeIndex, first: int, last: int, years: int) -> Dict:
+    """
+    Periodo realmente simulado. Puede ser más corto que period_years: el
+    proveedor solo sirve un histórico limitado de las resoluciones intradía
+    (p. ej. ~2 años de 1h, también para H4 derivado) y algunos símbolos no
+    tienen datos tan antiguos.
+    
+    Args:
+        dates: Índice temporal de la serie
+        first: Posición de la primera barra simulada
+        last: Posición de la última barra simulada
+        years: Años pedidos
+    """
+    start, end = dates[first], dates[last]
+    requested_start = datetime.utcnow() - timedelta(days=365 * years)
+    return {
+        "bars": last - first + 1,
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "effective_period_years": round((end - start).days / 365, 2),
+        "period_truncated": bool(start - requested_start > PERIOD_TRUNCATION_SLACK)
+    }
+
+
+class BacktestCancelledError(Exception):
+    """Se pidió cancelar el backtest (se detiene en el siguiente punto de control)."""
 
 
 class BacktestEngine:
@@ -12,16 +58,36 @@ class BacktestEngine:
     Calcula métricas financieras: Sharpe Ratio, Drawdown, Win Rate, etc.
     """
     
-    def __init__(self, initial_capital: float = 10000.0, commission: float = 0.0001):
+    def __init__(
+        self,
+        initial_capital: float = 10000.0,
+        commission: float = 0.0001,
+        position_size: float = 0.95,
+        price_store: Optional[PriceStore] = None,
+        seed: Optional[int] = None,
+        cancel_event: Optional[threading.Event] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ):
         """
         Inicializa el motor de backtest.
         
         Args:
             initial_capital: Capital inicial en USD (default: $10,000)
             commission: Comisión por operación en porcentaje (default: 0.01%)
+            position_size: Fracción del capital por operación (default: 95%)
+            price_store: Almacén de precios (default: caché local compartida)
+            seed: Semilla de las señales demo (None = aleatorias)
+            cancel_event: Evento que detiene run_backtest() en el siguiente
+                          punto de control (cada tramo en modo por tramos)
+            on_progress: Callback (barras procesadas, total) desde el pool
         """
         self.initial_capital = initial_capital
         self.commission = commission
+        self.position_size = position_size
+        self.price_store = price_store or get_price_store()
+        self.seed = seed
+        self.cancel_event = cancel_event
+        self.on_progress = on_progress
     
     
     async def download_price_data(
@@ -31,31 +97,26 @@ class BacktestEngine:
         years: int = 5
     ) -> pd.DataFrame:
         """
-        Descarga datos históricos de yfinance.
+        Obtiene datos históricos desde la caché local, descargando de
+        yfinance solo las barras que faltan.
         
         Args:
             symbol: Símbolo del activo (EURUSD, XAUUSD, SPY, etc.)
-            timeframe: Temporalidad (D1, H1, H4, M15, etc.)
+            timeframe: Temporalidad (D1, H1, H4, M15, MN1 o personalizada como H6)
             years: Años de datos históricos a descargar
             
         Returns:
             DataFrame con OHLCV data
         """
         try:
-            # Calcular fecha inicial
-            end_date = datetime.now()
+            # Calcular fecha inicial (UTC, igual que la caché)
+            end_date = datetime.utcnow()
             start_date = end_date - timedelta(days=365 * years)
             
-            # Descargar datos
-            # yfinance automáticamente convierte el intervalo
-            interval = self._timeframe_to_yfinance_interval(timeframe)
-            
-            df = yf.download(
-                symbol,
-                start=start_date,
-                end=end_date,
-                interval=interval,
-                progress=False
+            # Leer de la caché (descarga solo la cola que falta de la serie
+            # base y deriva el timeframe si el proveedor no lo sirve)
+            df = await get_backtest_executor().run(
+                get_bars, self.price_store, symbol, timeframe, start_date, end_date
             )
             
             if df.empty:
@@ -68,12 +129,56 @@ class BacktestEngine:
             raise
 
 
+    async def open_price_window(self, symbol: str, timeframe: str = "H1", years: int = 5) -> BarWindow:
+        """
+        Igual que download_price_data() pero sin cargar la serie: retorna
+        la ventana memory-mapped para recorrerla por tramos.
+        """
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=365 * years)
+        
+        window = await get_backtest_executor().run(
+            open_window, self.price_store, symbol, timeframe, start_date, end_date
+        )
+        if not len(window):
+            raise ValueError(f"No hay datos disponibles para {symbol}")
+        return window
+
+
+    async def download_portfolio_data(
+        self,
+        symbols: List[str],
+        timeframe: str = "H1",
+        years: int = 5
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Obtiene datos históricos de varios símbolos, descargando lo que falte
+        en una sola llamada multi-símbolo.
+        
+        Args:
+            symbols: Lista de símbolos
+            timeframe: Temporalidad
+            years: Años de datos históricos
+            
+        Returns:
+            {symbol: DataFrame OHLCV}
+        """
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=365 * years)
+        
+        return await get_backtest_executor().run(
+            get_many_bars, self.price_store, symbols, timeframe, start_date, end_date
+        )
+
+
     async def run_backtest(
         self,
         symbol: str,
         timeframe: str,
         years: int = 5,
-        strategy_signals: List[Dict] = None  # [{'date': timestamp, 'type': 'BUY'|'SELL', 'price': float}]
+        strategy_signals: List[Dict] = None,  # [{'date': timestamp, 'type': 'BUY'|'SELL', 'price': float}]
+        strategy: Optional[Dict[str, str]] = None,  # {'entry': 'RSI(14) < 30', 'exit': 'RSI(14) > 70'}
+        mode: str = "auto"
     ) -> Dict:
         """
         Ejecuta una simulación de backtest usando señales de estrategia.
@@ -83,79 +188,175 @@ class BacktestEngine:
             timeframe: Temporalidad
             years: Años de datos
             strategy_signals: Lista de señales de trading (puede ser None para prueba)
+            strategy: Reglas de entrada/salida sobre indicadores (tienen prioridad
+                      sobre strategy_signals)
+            mode: "memory" (serie completa en memoria), "chunked" (por tramos,
+                  memoria acotada) o "auto" (por tramos a partir de
+                  backtest_chunked_min_bars barras)
             
         Returns:
             Diccionario con resultados del backtest
         """
         try:
             # 1. Descargar datos
+            if mode != "memory":
+                window = await self.open_price_window(symbol, timeframe, years)
+                if mode == "chunked" or len(window) >= settings.backtest_chunked_min_bars:
+                    return await get_backtest_executor().run(
+                        self._simulate_chunked, window, symbol, timeframe, years, strategy_signals, strategy
+                    )
+            
             df = await self.download_price_data(symbol, timeframe, years)
+            self._checkpoint()
             
-            # 2. Generar señales si no se proporcionan (modo demo)
-            if strategy_signals is None:
-                strategy_signals = self._generate_demo_signals(df)
+            # 2-4. Simular fuera del event loop
+            return await get_backtest_executor().run(
+                self._simulate, df, symbol, timeframe, years, strategy_signals, strategy
+            )
+            
+        except (ExecutorBusyError, BacktestCancelledError):
+            raise
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
+
+
+    async def stream_backtest(
+        self,
+        symbol: str,
+        timeframe: str,
+        years: int = 5,
+        strategy_signals: Optional[List[Dict]] = None,
+        strategy: Optional[Dict[str, str]] = None,
+        chunk_bars: int = 5000
+    ) -> AsyncIterator[Dict]:
+        """
+        Ejecuta el backtest por tramos y emite resultados incrementales.
+        
+        Cada tramo se simula en el pool solo cuando el consumidor pidió el
+        anterior, así que un cliente lento frena la simulación (backpressure)
+        en lugar de acumular datos en memoria del servidor.
+        
+        Yields:
+            {"event": "start" | "equity" | "trades" | "progress" | "result", ...}
+        """
+        window = await self.open_price_window(symbol, timeframe, years)
+        total = len(window)
+        
+        yield {
+            "event": "start",
+            "symbol": symbol,
+            "timeframe": timeframe,
+            "period_years": years,
+            **effective_period(window.dates, window.start, window.stop - 1, years)
+        }
+        
+        executor = get_backtest_executor()
+        source = await executor.run(self._chunk_source, window, strategy_signals, strategy, symbol, timeframe)
+        chunks = walk_chunks(
+            window,
+            source,
+            chunk_bars,
+            initial_capital=self.initial_capital,
+            commission=self.commission,
+            position_size=self.position_size
+        )
+        grid = ReturnGrid(timeframe, market_calendar(symbol))
+        metrics = MetricsAccumulator(self.initial_capital, grid.periods_per_year)
+        
+        while True:
+            chunk = await executor.run(next, chunks, None)
+            if chunk is None:
+                break
+            start, stop, sim = chunk
+            metrics.update_simulation(sim, grid.levels(window.index[start:stop], sim.equity))
             
-            # 3. Simular operaciones
-            trades = []
-            equity_curve = [self.initial_capital]
-            current_cash = self.initial_capital
-            position = None
+            yield {"event": "equity", "offset": start - window.start, "values": sim.equity.tolist()}
+            if len(sim.trades['profit']):
+                yield {"event": "trades", "trades": trades_to_records(sim.trades, window.dates)}
+            processed = stop - window.start
+            yield {
+                "event": "progress",
+                "processed": processed,
+                "total": total,
+                "pct": round(processed / total * 100, 2),
+                "metrics": metrics.result()
+            }
+        metrics.update_levels(grid.finish())
+        
+        yield {
+            "event": "result",
+            "status": "success",
+            "symbol": symbol,
+            "timeframe": timeframe,
+            "period_years": years,
+            "initial_capital": self.initial_capital,
+            "final_capital": metrics.last_equity if metrics.bars else self.initial_capital,
+            "total_trades": metrics.trades,
+            **metrics.result()
+        }
+
+
+    def _simulate(
+        self,
+        df: pd.DataFrame,
+        symbol: str,
+        timeframe: str,
+        years: int,
+        strategy_signals: Optional[List[Dict]],
+        strategy: Optional[Dict[str, str]] = None
+    ) -> Dict:
+        """
+        Simulación síncrona (CPU) sobre los datos ya descargados.
+        Se ejecuta en el pool de backtests.
+        """
+        try:
+            # 2. Posiciones por barra (reglas, señales o demo)
+            self._checkpoint(0, len(df))
+            close = df['Close'].to_numpy(dtype=np.float64)
+            positions, fill_prices = self._positions(df, close, strategy_signals, strategy, symbol, timeframe)
+            self._checkpoint()
             
-            for idx, signal in enumerate(strategy_signals):
-                if signal['type'] == 'BUY' and position is None:
-                    # Abrir posición LONG
-                    entry_price = signal['price']
-                    position = {
-                        'entry_price': entry_price,
-                        'entry_date': signal['date'],
-                        'type': 'LONG',
-                        'size': current_cash * 0.95 / entry_price  # 95% del capital
-                    }
-                    
-                elif signal['type'] == 'SELL' and position is not None:
-                    # Cerrar posición
-                    exit_price = signal['price']
-                    profit = (exit_price - position['entry_price']) * position['size']
-                    commission_cost = position['size'] * exit_price * self.commission * 2  # Entrada + Salida
-                    net_profit = profit - commission_cost
-                    
-                    trades.append({
-                        'entry_date': position['entry_date'],
-                        'exit_date': signal['date'],
-                        'entry_price': position['entry_price'],
-                        'exit_price': exit_price,
-                        'size': position['size'],
-                        'profit': net_profit,
-                        'return_pct': (net_profit / (position['entry_price'] * position['size'])) * 100 if net_profit else 0
-                    })
-                    
-                    current_cash += net_profit
-                    position = None
-                
-                # Actualizar equity curve
-                if position is not None:
-                    # Marcar a mercado si hay posición abierta
-                    unrealized_pnl = (signal['price'] - position['entry_price']) * position['size']
-                    equity_curve.append(current_cash + unrealized_pnl)
-                else:
-                    equity_curve.append(current_cash)
+            # 3. Simular operaciones (vectorizado sobre todas las barras)
+            sim = simulate(
+                close,
+                positions,
+                fill_prices,
+                initial_capital=self.initial_capital,
+                commission=self.commission,
+                position_size=self.position_size
+            )
             
-            # 4. Calcular métricas
-            metrics = self._calculate_metrics(trades, equity_curve)
+            # 4. Calcular métricas (retornos sobre la rejilla del timeframe y
+            #    anualizados según el calendario del mercado)
+            grid = ReturnGrid(timeframe, market_calendar(symbol))
+            metrics = compute_metrics(
+                sim.trades,
+                sim.equity,
+                self.initial_capital,
+                sim.exposure_bars,
+                grid.positions(df.index),
+                grid.periods_per_year
+            )
             
             return {
                 "status": "success",
                 "symbol": symbol,
                 "timeframe": timeframe,
                 "period_years": years,
+                **effective_period(df.index, 0, len(df) - 1, years),
                 "initial_capital": self.initial_capital,
-                "final_capital": equity_curve[-1] if equity_curve else self.initial_capital,
-                "total_trades": len(trades),
-                "trades": trades,
-                "equity_curve": equity_curve,
+                "final_capital": float(sim.equity[-1]) if len(sim.equity) else self.initial_capital,
+                "total_trades": len(sim.trades['profit']),
+                "trades": trades_to_records(sim.trades, df.index),
+                "equity_curve": sim.equity.tolist(),
                 **metrics  # Metrices de rentabilidad
             }
             
+        except BacktestCancelledError:
+            raise
         except Exception as e:
             return {
                 "status": "error",
@@ -163,64 +364,151 @@ class BacktestEngine:
             }
 
 
-    def _calculate_metrics(self, trades: List[Dict], equity_curve: List[float]) -> Dict:
+    def _simulate_chunked(
+        self,
+        window: BarWindow,
+        symbol: str,
+        timeframe: str,
+        years: int,
+        strategy_signals: Optional[List[Dict]],
+        strategy: Optional[Dict[str, str]] = None
+    ) -> Dict:
         """
-        Calcula métricas financieras del backtest.
-        
-        Returns:
-            Dict con: total_return_pct, sharpe_ratio, max_drawdown_pct, win_rate_pct, profit_factor
+        Simulación por tramos sobre la ventana memory-mapped. La curva de
+        equity se devuelve decimada (1 de cada equity_curve_step barras) y
+        solo los últimos trades, para que la respuesta también esté acotada.
         """
-        equity_array = np.array(equity_curve)
-        
-        # 1. Retorno Total %
-        total_return_pct = ((equity_curve[-1] - self.initial_capital) / self.initial_capital * 100) if equity_curve else 0
-        
-        # 2. Sharpe Ratio (retorno anualizado / volatilidad)
-        if len(equity_array) > 1:
-            returns = np.diff(equity_array) / equity_array[:-1]
-            sharpe_ratio = np.mean(returns) / np.std(returns) * np.sqrt(252) if np.std(returns) > 0 else 0
-        else:
-            sharpe_ratio = 0
-        
-        # 3. Máximo Drawdown %
-        running_max = np.maximum.accumulate(equity_array)
-        drawdown = (equity_array - running_max) / running_max * 100
-        max_drawdown_pct = np.min(drawdown) if len(drawdown) > 0 else 0
-        
-        # 4. Win Rate % y Profit Factor
-        if trades:
-            winning_trades = [t for t in trades if t['profit'] > 0]
-            losing_trades = [t for t in trades if t['profit'] < 0]
+        try:
+            total = len(window)
+            step = max(1, -(-total // settings.backtest_chunked_max_points))
+            grid = ReturnGrid(timeframe, market_calendar(symbol))
+            metrics = MetricsAccumulator(self.initial_capital, grid.periods_per_year)
+            equity_curve = []
+            trades = deque(maxlen=settings.backtest_chunked_max_trades)
             
-            win_rate_pct = (len(winning_trades) / len(trades) * 100) if trades else 0
+            source = self._chunk_source(window, strategy_signals, strategy, symbol, timeframe)
+            for start, stop, sim in walk_chunks(
+                window,
+                source,
+                settings.backtest_chunk_bars,
+                initial_capital=self.initial_capital,
+                commission=self.commission,
+                position_size=self.position_size
+            ):
+                self._checkpoint(stop - window.start, total)
+                metrics.update_simulation(sim, grid.levels(window.index[start:stop], sim.equity))
+                # Barras múltiplo de step contadas desde el inicio de la ventana
+                first = (-(start - window.start)) % step
+                equity_curve.extend(sim.equity[first::step].tolist())
+                if len(sim.trades['profit']):
+                    trades.extend(trades_to_records(sim.trades, window.dates))
+            metrics.update_levels(grid.finish())
             
-            total_profit = sum(t['profit'] for t in winning_trades)
-            total_loss = abs(sum(t['profit'] for t in losing_trades))
-            profit_factor = total_profit / total_loss if total_loss > 0 else (total_profit if total_profit > 0 else 0)
-        else:
-            win_rate_pct = 0
-            profit_factor = 0
+            return {
+                "status": "success",
+                "symbol": symbol,
+                "timeframe": timeframe,
+                "period_years": years,
+                "mode": "chunked",
+                **effective_period(window.dates, window.start, window.stop - 1, years),
+                "initial_capital": self.initial_capital,
+                "final_capital": metrics.last_equity if metrics.bars else self.initial_capital,
+                "total_trades": metrics.trades,
+                "trades": list(trades),
+                "trades_truncated": metrics.trades > len(trades),
+                "equity_curve": equity_curve,
+                "equity_curve_step": step,
+                **metrics.result()
+            }
+            
+        except BacktestCancelledError:
+            raise
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": str(e)
+            }
+
+
+    def _checkpoint(self, processed: int = 0, total: int = 0) -> None:
+        """
+        Punto de control de la cancelación cooperativa (y del progreso).
+        """
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise BacktestCancelledError("Backtest cancelado")
+        if self.on_progress is not None and total:
+            self.on_progress(processed, total)
+
+
+    def _chunk_source(
+        self,
+        window: BarWindow,
+        strategy_signals: Optional[List[Dict]],
+        strategy: Optional[Dict[str, str]],
+        symbol: str,
+        timeframe: str
+    ) -> ChunkPositions:
+        """
+        Posiciones por tramo (modo chunked y streaming). Las reglas con
+        indicadores que dependen de todo el histórico (PSAR) se calculan de una
+        vez sobre la ventana completa, como en el modo en memoria.
+        """
+        try:
+            return chunk_positions(window, strategy_signals, strategy, self.seed)
+        except ValueError:
+            if not strategy:
+                raise
+            df = window.frame(window.start, window.stop)
+            close = df['Close'].to_numpy(dtype=np.float64)
+            return ArrayPositions(*self._positions(df, close, None, strategy, symbol, timeframe))
+
+
+    def _positions(
+        self,
+        df: pd.DataFrame,
+        close: np.ndarray,
+        strategy_signals: Optional[List[Dict]],
+        strategy: Optional[Dict[str, str]],
+        symbol: Optional[str] = None,
+        timeframe: Optional[str] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vector de posición y precios de fill. Las reglas se evalúan sobre
+        todas las barras a la vez y ejecutan al cierre de la barra de la señal.
+        """
+        if strategy:
+            indicator_fn = self.indicator_source(symbol, timeframe, df) if symbol and timeframe else None
+            return strategy_positions(df, strategy, indicator_fn), close.copy()
         
-        return {
-            "total_return_pct": round(total_return_pct, 2),
-            "sharpe_ratio": round(sharpe_ratio, 2),
-            "max_drawdown_pct": round(max_drawdown_pct, 2),
-            "win_rate_pct": round(win_rate_pct, 2),
-            "profit_factor": round(profit_factor, 2)
-        }
+        # Generar señales si no se proporcionan (modo demo)
+        if strategy_signals is None:
+            strategy_signals = self._generate_demo_signals(df)
+        return signals_to_positions(df.index, close, strategy_signals)
+
+
+    def indicator_source(self, symbol: str, timeframe: str, df: pd.DataFrame) -> IndicatorFn:
+        """
+        Indicadores de la caché compartida, calculados sobre todo el histórico
+        almacenado del símbolo y recortados a la ventana df.
+        """
+        interval = resolve_timeframe(timeframe).store_interval
+        base = self.price_store.history(symbol, interval)
+        return get_indicator_cache().indicator_fn((symbol, interval), base, df)
 
 
     def _generate_demo_signals(self, df: pd.DataFrame, trades_count: int = 50) -> List[Dict]:
         """
         Genera señales de trading demo (alternadas BUY/SELL)
-        para demostración cuando no hay estrategia real.
+        para demostración cuando no hay estrategia real. Con la misma
+        semilla elige las mismas barras que el modo por tramos.
         """
         signals = []
         prices = df['Close'].values
         dates = df.index
         
         # Generar trades aleatorios distribuidos
-        trade_indices = np.random.choice(len(df), size=min(trades_count, len(df)), replace=False)
+        rng = np.random.default_rng(self.seed)
+        trade_indices = rng.choice(len(df), size=min(trades_count, len(df)), replace=False)
         trade_indices.sort()
         
         is_buy = True
@@ -235,24 +523,6 @@ class BacktestEngine:
         return signals
 
 
-    def _timeframe_to_yfinance_interval(self, timeframe: str) -> str:
-        """
-        Convierte timeframes MT5 a formato yfinance.
-        """
-        mapping = {
-            'M1': '1m',
-            'M5': '5m',
-            'M15': '15m',
-            'M30': '30m',
-            'H1': '1h',
-            'H4': '4h',
-            'D1': '1d',
-            'W1': '1wk',
-            'MN': '1mo'
-        }
-        return mapping.get(timeframe, '1d')
-
-
 # Funciones auxiliares para uso en rutas
 
 async def run_backtest_async(
@@ -260,13 +530,17 @@ async def run_backtest_async(
     timeframe: str = "H1",
     period_years: int = 5,
     initial_capital: float = 10000.0,
-    commission: float = 0.0001
+    commission: float = 0.0001,
+    strategy_signals: Optional[List[Dict]] = None,
+    strategy: Optional[Dict[str, str]] = None,
+    mode: str = "auto",
+    seed: Optional[int] = None
 ) -> Dict:
     """
     Función helper para ejecutar backtest desde rutas FastAPI.
     """
-    engine = BacktestEngine(initial_capital, commission)
-    result = await engine.run_backtest(symbol, timeframe, period_years)
+    engine = BacktestEngine(initial_capital, commission, seed=seed)
+    result = await engine.run_backtest(symbol, timeframe, period_years, strategy_signals, strategy, mode)
     return result
 
 
@@ -0,0 +1,228 @@
+"""
+Cola de trabajos de backtest
+Los backtests largos se encolan en la tabla backtest_jobs (sin broker
+externo) y un pool de workers async los ejecuta por prioridad y con reparto
+justo entre usuarios, guardando cada resultado en el repositorio de resultados
+"""
+
+import asyncio
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.services import jobs_repository, results_repository
+from app.services.backtest_engine import BacktestCancelledError, BacktestEngine
+from app.services.executor import ExecutorBusyError
+
+
+class BacktestJobManager:
+    """
+    Pool de workers sobre la cola persistente. Cada worker reclama el
+    siguiente trabajo (jobs_repository.claim_next_job), lo ejecuta en el pool
+    de backtests y mientras tanto publica el progreso y atiende la
+    cancelación, que el motor comprueba en sus puntos de control.
+    Cada trabajo reclamado lleva el lease de este gestor (worker_id), que se
+    renueva con el progreso; los de otros procesos solo vuelven a la cola
+    cuando su lease caduca.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_per_user: int = 0,
+        poll_seconds: float = 1.0,
+        lease_seconds: float = 30.0
+    ):
+        self.workers = workers
+        self.max_per_user = max_per_user
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"[-64:]
+
+        self._last_requeue = -float("inf")
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._cancel_events: Dict[str, threading.Event] = {}
+
+    async def start(self) -> None:
+        """
+        Arranca los workers y devuelve a la cola los trabajos que quedaron a
+        medias en una parada anterior (los de lease caducado).
+        """
+        if self._tasks:
+            return
+        await self._requeue_expired()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, user: str, priority: int, request: Dict) -> Dict:
+        job = await jobs_repository.create_job(user, priority, request)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[Dict]:
+        job = await jobs_repository.request_cancel(job_id)
+        event = self._cancel_events.get(job_id)
+        if job is not None and event is not None:
+            event.set()
+        return job
+
+    async def shutdown(self) -> None:
+        # Los backtests en curso paran en su siguiente punto de control y
+        # sus trabajos vuelven a la cola
+        for event in self._cancel_events.values():
+            event.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await jobs_repository.claim_next_job(self.worker_id, self.max_per_user)
+            if job_id is None:
+                await self._requeue_expired()
+                await self._wait()
+                continue
+            await self._run(job_id)
+
+    async def _requeue_expired(self) -> None:
+        # Como mucho una vez por lease: recoge los trabajos de procesos caídos
+        now = time.monotonic()
+        if now - self._last_requeue >= self.lease_seconds:
+            self._last_requeue = now
+            await jobs_repository.requeue_expired_jobs(self.lease_seconds)
+
+    async def _wait(self) -> None:
+        # El sondeo periódico recoge trabajos encolados por otros procesos
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _run(self, job_id: str) -> None:
+        request = await jobs_repository.get_job_request(job_id)
+        cancel_event = threading.Event()
+        self._cancel_events[job_id] = cancel_event
+        progress = {"pct": 0.0}
+
+        def on_progress(processed: int, total: int) -> None:
+            progress["pct"] = processed / total * 100
+
+        engine = BacktestEngine(
+            request["initial_capital"],
+            request["commission"],
+            seed=request.get("seed"),
+            cancel_event=cancel_event,
+            on_progress=on_progress
+        )
+        task = asyncio.ensure_future(engine.run_backtest(
+            request["symbol"],
+            request["timeframe"],
+            request["period_years"],
+            request.get("strategy_signals"),
+            request.get("strategy"),
+            request.get("mode", "auto")
+        ))
+
+        try:
+            # Mientras corre: guardar el progreso (que renueva el lease) y
+            # recoger cancelaciones pedidas desde otros procesos
+            while not task.done():
+                await asyncio.wait({task}, timeout=self.poll_seconds)
+                if task.done():
+                    break
+                leased, cancel_requested = await jobs_repository.update_progress(
+                    job_id, self.worker_id, progress["pct"]
+                )
+                if not leased:
+                    # El lease caducó: el trabajo ya es de la cola (o de otro
+                    # worker), así que se detiene sin escribir nada
+                    cancel_event.set()
+                    await asyncio.gather(task, return_exceptions=True)
+                    return
+                if cancel_requested:
+                    cancel_event.set()
+
+            result = task.result()
+            if result.get("status") == "error":
+                await jobs_repository.finish_job(job_id, self.worker_id, "failed", error=result.get("message"))
+                return
+
+            saved = await results_repository.save_result(result_record(request, result))
+            if not await jobs_repository.finish_job(job_id, self.worker_id, "completed", result_id=saved["id"]):
+                # Lease perdido entre el último latido y el cierre: el
+                # resultado lo guardará quien ejecute el trabajo de nuevo
+                await results_repository.delete_result(saved["id"])
+
+        except BacktestCancelledError:
+            await jobs_repository.finish_job(job_id, self.worker_id, "cancelled")
+        except ExecutorBusyError:
+            # Pool de backtests lleno: vuelve a la cola y se reintenta después
+            await jobs_repository.requeue_job(job_id, self.worker_id)
+            await asyncio.sleep(self.poll_seconds)
+        except asyncio.CancelledError:
+            cancel_event.set()
+            task.cancel()
+            await jobs_repository.requeue_job(job_id, self.worker_id)
+            raise
+        except Exception as e:
+            await jobs_repository.finish_job(job_id, self.worker_id, "failed", error=str(e))
+        finally:
+            self._cancel_events.pop(job_id, None)
+
+
+def result_record(request: Dict, result: Dict) -> Dict:
+    """
+    Resultado del motor en el formato de results_repository.save_result().
+    """
+    strategy = request.get("strategy")
+    if strategy:
+        strategy_type = "rules"
+        description = " / ".join(rule for rule in (strategy.get("entry"), strategy.get("exit")) if rule)
+    else:
+        strategy_type = "signals" if request.get("strategy_signals") is not None else "demo"
+        description = None
+
+    return {
+        "bot_id": request.get("bot_id"),
+        "bot_name": request.get("bot_name") or f"Backtest {request['symbol']} {request['timeframe']}",
+        "symbol": request["symbol"],
+        "timeframe": request["timeframe"],
+        "strategy_type": strategy_type,
+        **{column: result[column] for column in results_repository.METRIC_COLUMNS},
+        "equity_curve": result["equity_curve"],
+        "trades": result["trades"],
+        "description": request.get("description") or description
+    }
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# SINGLETON
+# ═════════════════════════════════════════════════════════════════════════════
+
+_default_manager: Optional[BacktestJobManager] = None
+
+
+def get_backtest_jobs() -> BacktestJobManager:
+    global _default_manager
+    if _default_manager is None:
+        _default_manager = BacktestJobManager(
+            workers=settings.backtest_job_workers,
+            max_per_user=settings.backtest_job_max_per_user,
+            poll_seconds=settings.backtest_job_poll_seconds,
+            lease_seconds=settings.backtest_job_lease_seconds
+        )
+    return _default_manager
+
+
+async def shutdown_backtest_jobs() -> None:
+    if _default_manager is not None:
+        await _default_manager.shutdown()
@@ -0,0 +1,113 @@
+"""
+Repositorio de bots
+Acceso a las tablas bots / bot_code
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, select
+
+from app.database import SessionLocal
+from app.models import Bot, BotCode
+
+
+def _to_dict(bot: Bot, code: Optional[str] = None) -> Dict:
+    data = {
+        "id": bot.id,
+        "name": bot.name,
+        "indicators": bot.indicators,
+        "symbol": bot.symbol,
+        "timeframe": bot.timeframe,
+        "strategy_type": bot.strategy_type,
+        "description": bot.description,
+        "created_at": bot.created_at.isoformat(),
+        "updated_at": bot.updated_at.isoformat(),
+        "status": "active"
+    }
+    if code is not None:
+        data["code"] = code
+    return data
+
+
+async def list_bots(include_code: bool = True) -> List[Dict]:
+    """
+    Retorna todos los bots; sin include_code no toca la tabla bot_code.
+    """
+    async with SessionLocal() as session:
+        if not include_code:
+            bots = await session.scalars(select(Bot).order_by(Bot.id))
+            return [_to_dict(bot) for bot in bots]
+
+        rows = await session.execute(
+            select(Bot, BotCode.code).join(BotCode, BotCode.bot_id == Bot.id).order_by(Bot.id)
+        )
+        return [_to_dict(bot, code) for bot, code in rows]
+
+
+async def get_bot(bot_id: int) -> Optional[Dict]:
+    async with SessionLocal() as session:
+        row = (await session.execute(
+            select(Bot, BotCode.code).join(BotCode, BotCode.bot_id == Bot.id).where(Bot.id == bot_id)
+        )).first()
+        return _to_dict(*row) if row else None
+
+
+async def get_bot_code(bot_id: int) -> Optional[str]:
+    async with SessionLocal() as session:
+        return await session.scalar(select(BotCode.code).where(BotCode.bot_id == bot_id))
+
+
+async def create_bot(data: Dict) -> Dict:
+    """
+    Crea un bot y guarda su código en la tabla aparte.
+    """
+    now = datetime.now()
+    async with SessionLocal() as session:
+        async with session.begin():
+            bot = Bot(
+                name=data["name"],
+                indicators=data["indicators"],
+                symbol=data["symbol"],
+                timeframe=data["timeframe"],
+                strategy_type=data["strategy_type"],
+                description=data.get("description"),
+                created_at=now,
+                updated_at=now
+            )
+            session.add(bot)
+            await session.flush()
+            session.add(BotCode(bot_id=bot.id, code=data["code"]))
+        return _to_dict(bot, data["code"])
+
+
+async def update_bot(bot_id: int, fields: Dict) -> Optional[Dict]:
+    """
+    Actualiza los campos indicados (ignora valores vacíos, como la versión en memoria).
+    """
+    async with SessionLocal() as session:
+        async with session.begin():
+            bot = await session.get(Bot, bot_id)
+            if bot is None:
+                return None
+
+            for key in ("name", "description", "indicators", "strategy_type"):
+                if fields.get(key):
+                    setattr(bot, key, fields[key])
+            bot.updated_at = datetime.now()
+
+            code = await session.scalar(select(BotCode.code).where(BotCode.bot_id == bot_id))
+        return _to_dict(bot, code)
+
+
+async def delete_bot(bot_id: int) -> bool:
+    async with SessionLocal() as session:
+        async with session.begin():
+            await session.execute(delete(BotCode).where(BotCode.bot_id == bot_id))
+            deleted = await session.execute(delete(Bot).where(Bot.id == bot_id))
+        return deleted.rowcount > 0
+
+
+async def count_bots() -> int:
+    async with SessionLocal() as session:
+        return await session.scalar(select(func.count()).select_from(Bot))
@@ -0,0 +1,203 @@
+"""
+Calendarios de mercado y rejilla de retornos
+Define cuándo cotiza cada tipo de activo (FX 24/5, cripto 24/7, acciones en
+sesión) para medir los retornos sobre una rejilla temporal regular del
+timeframe y anualizarlos con el número real de periodos por año
+"""
+
+from dataclasses import dataclass
+from datetime import time
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+from pandas.tseries.offsets import Tick
+
+from app.services.timeframes import PROVIDER_INTERVALS, _ORIGIN, resolve_timeframe
+
+
+@dataclass(frozen=True)
+class MarketCalendar:
+    """Horario de negociación de un tipo de activo"""
+    name: str
+    trading_weekdays: int
+    days_per_year: float
+    # (zona horaria, apertura, cierre) para mercados con sesión; None = 24h
+    session: Optional[Tuple[str, time, time]] = None
+
+
+CALENDARS = {
+    "crypto": MarketCalendar("crypto", 7, 365.25),
+    "fx": MarketCalendar("fx", 5, 260),
+    "equity": MarketCalendar("equity", 5, 252, ("America/New_York", time(9, 30), time(16, 0))),
+}
+
+_CRYPTO_ASSETS = (
+    "BTC", "ETH", "XRP", "ADA", "SOL", "LTC", "DOGE", "BNB", "DOT", "AVAX", "LINK", "MATIC", "TRX", "XLM", "BCH"
+)
+_CURRENCIES = {
+    "USD", "EUR", "GBP", "JPY", "CHF", "AUD", "NZD", "CAD", "SEK", "NOK", "DKK",
+    "SGD", "HKD", "MXN", "ZAR", "TRY", "PLN", "CNH", "CNY"
+}
+# Metales y petróleo cotizan OTC casi 24/5, como las divisas
+_OTC_COMMODITIES = ("XAU", "XAG", "XPT", "XPD", "WTI", "BRENT")
+
+_DAY_NS = 86_400 * 10**9
+_WEEKS_PER_YEAR = 365.25 / 7
+
+
+def market_calendar(symbol: str) -> MarketCalendar:
+    """
+    Calendario de un símbolo: cripto (BTCUSD, ETH-USD), FX y materias primas
+    OTC (EURUSD, XAUUSD, EURUSD=X) o acciones/ETFs (SPY, AAPL).
+    """
+    name = (symbol or "").upper().replace("/", "")
+    if name.endswith("-USD") or any(name.startswith(asset) and len(name) > len(asset) for asset in _CRYPTO_ASSETS):
+        return CALENDARS["crypto"]
+    if (
+        name.endswith(("=X", "=F"))
+        or (len(name) == 6 and name[:3] in _CURRENCIES and name[3:] in _CURRENCIES)
+        or name.startswith(_OTC_COMMODITIES)
+    ):
+        return CALENDARS["fx"]
+    return CALENDARS["equity"]
+
+
+def broadest_calendar(symbols: Iterable[str]) -> MarketCalendar:
+    """
+    Calendario que cubre a todos los símbolos (para la equity de un portafolio).
+    """
+    return max((market_calendar(symbol) for symbol in symbols), key=lambda calendar: calendar.days_per_year)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# REJILLA DE RETORNOS
+# ═════════════════════════════════════════════════════════════════════════════
+
+class ReturnGrid:
+    """
+    Rejilla regular del timeframe sobre la que se miden los retornos.
+
+    En timeframes intradía la rejilla son todas las ventanas del timeframe
+    en las que el mercado está abierto (según el calendario) dentro de los
+    días con datos; cada punto toma la última equity conocida, así que los
+    huecos de datos cuentan como retorno cero en lugar de alargar el retorno
+    siguiente. Desde D1 la rejilla son las propias barras.
+    """
+
+    def __init__(self, timeframe: str, calendar: MarketCalendar):
+        self.calendar = calendar
+        tf = resolve_timeframe(timeframe)
+        offset = to_offset(tf.rule) if tf.rule else None
+        if offset is None:
+            minutes = PROVIDER_INTERVALS[tf.source][0]
+        elif isinstance(offset, Tick):
+            minutes = offset.nanos / 60e9
+        else:
+            minutes = None
+
+        self.intraday = minutes is not None and minutes < 1440
+        self.step = int(minutes * 60 * 10**9) if self.intraday else None
+        self.periods_per_year = self._periods_per_year(minutes, offset)
+
+        # Cola pendiente del recorrido por tramos: la última ventana aún
+        # puede recibir barras del tramo siguiente
+        self._pending: Optional[Tuple[int, float]] = None
+
+    def positions(self, index: np.ndarray) -> np.ndarray:
+        """
+        Posición de la barra cuya equity toma cada punto de la rejilla.
+
+        Args:
+            index: Fechas de las barras (int64 ns o DatetimeIndex), ordenadas
+        """
+        return self._grid(_as_ns(index))[1]
+
+    def levels(self, index: np.ndarray, equity: np.ndarray) -> np.ndarray:
+        """
+        Equity en los puntos de la rejilla ya cerrados, para recorrer la serie
+        por tramos. El último punto queda pendiente hasta el tramo siguiente
+        (o hasta finish()).
+        """
+        index = _as_ns(index)
+        equity = np.asarray(equity, dtype=np.float64)
+        if self._pending is not None:
+            index = np.concatenate(([self._pending[0]], index))
+            equity = np.concatenate(([self._pending[1]], equity))
+
+        points, positions = self._grid(index)
+        if not len(points):
+            return np.empty(0)
+        values = equity[positions]
+        self._pending = (int(points[-1]), float(values[-1]))
+        return values[:-1]
+
+    def finish(self) -> np.ndarray:
+        """
+        Último punto pendiente del recorrido por tramos.
+        """
+        pending, self._pending = self._pending, None
+        return np.array([pending[1]]) if pending else np.empty(0)
+
+    def _grid(self, index: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # (inicio de cada punto de la rejilla, barra cuya equity toma)
+        if not len(index) or not self.intraday:
+            return index, np.arange(len(index))
+        buckets = self._bucket(index)
+        candidates = np.arange(buckets[0], buckets[-1] + self.step, self.step, dtype=np.int64)
+        with_data = np.isin(candidates // _DAY_NS, np.unique(index // _DAY_NS))
+        points = candidates[self._open(candidates) & with_data]
+        return points, np.searchsorted(buckets, points, side="right") - 1
+
+    def _bucket(self, index: np.ndarray) -> np.ndarray:
+        origin = _ORIGIN.value
+        return origin + (index - origin) // self.step * self.step
+
+    def _open(self, buckets: np.ndarray) -> np.ndarray:
+        # Ventanas con el mercado abierto (al menos en parte)
+        calendar = self.calendar
+        if calendar.session is None:
+            if calendar.trading_weekdays >= 7:
+                return np.ones(len(buckets), dtype=bool)
+            # 1970-01-01 fue jueves (lunes = 0)
+            return (buckets // _DAY_NS + 3) % 7 < calendar.trading_weekdays
+
+        zone, opens, closes = calendar.session
+        local = pd.DatetimeIndex(buckets.view("datetime64[ns]")).tz_localize("UTC").tz_convert(zone)
+        minutes = np.asarray(local.hour * 60 + local.minute)
+        step_minutes = self.step / 60e9
+        return (
+            (np.asarray(local.weekday) < calendar.trading_weekdays)
+            & (minutes < closes.hour * 60 + closes.minute)
+            & (minutes + step_minutes > opens.hour * 60 + opens.minute)
+        )
+
+    def _periods_per_year(self, minutes: Optional[float], offset) -> float:
+        days_per_year = self.calendar.days_per_year
+        if self.intraday:
+            if self.calendar.session is None:
+                return days_per_year * 1440 / minutes
+            # Ventanas por sesión (media entre horario de invierno y de verano)
+            slots = [
+                np.count_nonzero(self._open(self._bucket(_day_ns(day)) + np.arange(0, _DAY_NS, self.step)))
+                for day in ("2024-01-17", "2024-07-17")
+            ]
+            return days_per_year * float(np.mean(slots))
+        if minutes is not None:
+            days = minutes / 1440
+            return _WEEKS_PER_YEAR / (days / 7) if days % 7 == 0 else days_per_year / days
+        # Semanas ancladas (W-MON) y meses (nMS)
+        if offset.name.startswith("W"):
+            return _WEEKS_PER_YEAR / offset.n
+        return 12 / offset.n
+
+
+def _as_ns(index) -> np.ndarray:
+    if isinstance(index, pd.DatetimeIndex):
+        return index.as_unit("ns").asi8
+    return np.asarray(index, dtype=np.int64)
+
+
+def _day_ns(day: str) -> np.ndarray:
+    return np.array([pd.Timestamp(day).value], dtype=np.int64)
@@ -0,0 +1,176 @@
+"""
+Backtest por tramos (out-of-core)
+Recorre la serie memory-mapped en tramos de tamaño fijo, arrastra la
+posición entre tramos y acumula las métricas online, de forma que la
+memoria de cada backtest no depende de la longitud del histórico
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services.simulation import SimulationResult, SimulationState, simulate
+from app.services.strategy_rules import rules_to_positions, strategy_lookback, strategy_masks
+from app.services.timeframes import BarWindow
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# POSICIONES POR TRAMO
+# ═════════════════════════════════════════════════════════════════════════════
+
+class ChunkPositions(ABC):
+    """
+    Fuente de posiciones para un tramo [start, stop) (posiciones absolutas
+    de la serie). initial es la posición con la que acabó el tramo anterior.
+    """
+
+    @abstractmethod
+    def positions(self, window: BarWindow, start: int, stop: int, initial: bool) -> Tuple[np.ndarray, np.ndarray]:
+        ...
+
+
+class RulePositions(ChunkPositions):
+    """
+    Reglas entry/exit evaluadas por tramo, con las barras previas que
+    necesitan los indicadores para coincidir con el cálculo completo.
+    """
+
+    def __init__(self, strategy: Dict[str, str]):
+        self.strategy = strategy
+        self.lookback = strategy_lookback(strategy)
+
+    def positions(self, window, start, stop, initial):
+        first = max(0, start - self.lookback)
+        frame = window.frame(first, stop)
+        entry, exit = strategy_masks(frame, self.strategy)
+        warm = start - first
+        positions = rules_to_positions(entry[warm:], exit[warm:], initial)
+        return positions, frame['Close'].to_numpy(dtype=np.float64)[warm:]
+
+
+class SignalPositions(ChunkPositions):
+    """
+    Señales [{'date', 'type', 'price'}] repartidas entre tramos con las
+    mismas reglas que signals_to_positions() sobre la serie completa.
+    """
+
+    def __init__(self, signals: List[Dict]):
+        dates = pd.DatetimeIndex(pd.to_datetime([s["date"] for s in signals]))
+        if dates.tz is not None:
+            dates = dates.tz_convert("UTC").tz_localize(None)
+        self.dates = dates.as_unit("ns").asi8
+        self.types = np.array([1 if s["type"] == "BUY" else -1 for s in signals], dtype=np.int8)
+        self.prices = np.array([s.get("price", np.nan) for s in signals], dtype=np.float64)
+
+    def positions(self, window, start, stop, initial):
+        index = np.asarray(window.index[start:stop])
+        close = np.array(window.columns['Close'][start:stop], dtype=np.float64)
+        codes = np.zeros(len(index), dtype=np.int8)
+
+        # Las señales anteriores al primer tramo van a su primera barra y las
+        # posteriores al último a su última barra
+        selected = np.ones(len(self.dates), dtype=bool)
+        if start > window.start:
+            selected &= self.dates >= index[0]
+        if stop < window.stop:
+            selected &= self.dates < window.index[stop]
+        bars = np.clip(np.searchsorted(index, self.dates[selected], side="right") - 1, 0, len(index) - 1)
+        types, prices = self.types[selected], self.prices[selected]
+
+        # Si varias señales caen en la misma barra gana la última (tipo y precio)
+        last = len(bars) - 1 - np.unique(bars[::-1], return_index=True)[1]
+        bars, types, prices = bars[last], types[last], prices[last]
+        codes[bars] = types
+        has_price = ~np.isnan(prices)
+        close[bars[has_price]] = prices[has_price]
+
+        state = pd.Series(codes, dtype="float64").replace(0, np.nan).ffill().fillna(1 if initial else -1)
+        return state.to_numpy() > 0, close
+
+
+class DemoPositions(ChunkPositions):
+    """
+    Demo: trades_count puntos aleatorios del tramo completo que alternan
+    BUY, SELL, BUY, ... (solo se guardan los puntos, no un vector por barra).
+    """
+
+    def __init__(self, bars: int, trades_count: int = 50, seed: Optional[int] = None):
+        rng = np.random.default_rng(seed)
+        self.points = np.sort(rng.choice(bars, size=min(trades_count, bars), replace=False))
+
+    def positions(self, window, start, stop, initial):
+        first, last = start - window.start, stop - window.start
+        before = np.searchsorted(self.points, first)
+        inside = self.points[before:np.searchsorted(self.points, last)] - first
+        flips = np.zeros(last - first, dtype=np.int64)
+        flips[inside] = 1
+        positions = ((before + np.cumsum(flips)) % 2).astype(bool)
+        return positions, np.array(window.columns['Close'][start:stop], dtype=np.float64)
+
+
+class ArrayPositions(ChunkPositions):
+    """Posiciones ya calculadas sobre todo el tramo (indexadas desde window.start)"""
+
+    def __init__(self, positions: np.ndarray, fill_prices: np.ndarray):
+        self.positions_array = positions
+        self.fill_prices = fill_prices
+
+    def positions(self, window, start, stop, initial):
+        first, last = start - window.start, stop - window.start
+        return self.positions_array[first:last], self.fill_prices[first:last]
+
+
+def chunk_positions(
+    window: BarWindow,
+    strategy_signals: Optional[List[Dict]] = None,
+    strategy: Optional[Dict[str, str]] = None,
+    seed: Optional[int] = None
+) -> ChunkPositions:
+    """
+    Fuente de posiciones por tramo: reglas, señales o demo (misma prioridad
+    que el modo en memoria; seed fija las barras del demo). Lanza ValueError si las reglas usan un
+    indicador que necesita todo el histórico.
+    """
+    if strategy:
+        return RulePositions(strategy)
+    if strategy_signals is None:
+        return DemoPositions(len(window), seed=seed)
+    return SignalPositions(strategy_signals)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# RECORRIDO
+# ═════════════════════════════════════════════════════════════════════════════
+
+def walk_chunks(
+    window: BarWindow,
+    source: ChunkPositions,
+    chunk_bars: int,
+    initial_capital: float = 10000.0,
+    commission: float = 0.0001,
+    position_size: float = 0.95
+) -> Iterator[Tuple[int, int, SimulationResult]]:
+    """
+    Simula el tramo completo de chunk_bars en chunk_bars barras.
+
+    Yields:
+        (inicio, fin, resultado) de cada tramo; los índices de los trades son
+        posiciones absolutas de la serie (válidas en window.dates)
+    """
+    state = SimulationState(cash=initial_capital, bars_processed=window.start)
+    for start in range(window.start, window.stop, chunk_bars):
+        stop = min(start + chunk_bars, window.stop)
+        close = np.array(window.columns['Close'][start:stop], dtype=np.float64)
+        positions, fill_prices = source.positions(window, start, stop, state.in_position)
+        sim = simulate(
+            close,
+            positions,
+            fill_prices,
+            commission=commission,
+            position_size=position_size,
+            state=state
+        )
+        state = sim.state
+        yield start, stop, sim
@@ -0,0 +1,261 @@
+"""
+Caché de código MQL5 generado
+Clave por contenido de la petición normalizada, LRU + TTL en memoria,
+persistencia opcional en disco y coalescing de peticiones idénticas
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+
+# Cambiar si cambia el prompt: invalida todas las entradas anteriores
+PROMPT_VERSION = 3
+
+
+def normalize_request(indicators: List[str], symbol: str, timeframe: str, strategy_type: str, model: str) -> Dict:
+    """
+    Forma canónica de la petición: indicadores sin orden ni duplicados,
+    mayúsculas en símbolo/timeframe y espacios colapsados.
+    """
+    return {
+        "indicators": sorted({indicator.strip().upper() for indicator in indicators if indicator.strip()}),
+        "symbol": symbol.strip().upper(),
+        "timeframe": timeframe.strip().upper(),
+        "strategy_type": " ".join(strategy_type.split()).lower(),
+        "model": model,
+        "prompt_version": PROMPT_VERSION
+    }
+
+
+def request_key(normalized: Dict) -> str:
+    raw = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class CodegenCache:
+    """
+    Caché LRU con TTL para código generado.
+
+    Las peticiones concurrentes con la misma clave comparten una única
+    llamada al LLM (la primera la lanza, el resto espera su resultado).
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 86400, cache_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    async def get_or_generate(
+        self,
+        key: str,
+        producer: Callable[[], Awaitable[str]],
+        force_refresh: bool = False,
+        cacheable: Callable[[str], bool] = lambda code: True
+    ) -> Tuple[str, bool]:
+        """
+        Returns:
+            (código, True si vino de la caché)
+        """
+        if not force_refresh:
+            code = self._get(key)
+            if code is not None:
+                self.hits += 1
+                return code, True
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._produce(key, producer, cacheable))
+            self._inflight[key] = task
+
+        # shield: si el cliente que lanzó la llamada se desconecta, el resto la sigue esperando
+        return await asyncio.shield(task), False
+
+    async def _produce(self, key: str, producer: Callable[[], Awaitable[str]], cacheable: Callable[[str], bool]) -> str:
+        try:
+            code = await producer()
+            if cacheable(code):
+                self._put(key, code)
+            return code
+        finally:
+            self._inflight.pop(key, None)
+
+    def stream(
+        self,
+        key: str,
+        producer: Callable[[], AsyncIterator[str]],
+        force_refresh: bool = False,
+        cacheable: Callable[[str], bool] = lambda code: True
+    ) -> Tuple[bool, AsyncIterator[str]]:
+        """
+        Variante de get_or_generate() que entrega el código por fragmentos.
+
+        La generación se registra como en vuelo igual que en get_or_generate(),
+        así que las peticiones concurrentes (streaming o no) con la misma clave
+        la esperan en lugar de lanzar otra llamada al LLM. Quien se une a una
+        generación en curso recibe el código completo en un solo fragmento.
+
+        Returns:
+            (True si vino de la caché, fragmentos del código)
+        """
+        if not force_refresh:
+            code = self._get(key)
+            if code is not None:
+                self.hits += 1
+                return True, self._single(code)
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return False, self._join(task)
+
+        self.misses += 1
+        queue: asyncio.Queue = asyncio.Queue()
+        task = asyncio.ensure_future(self._produce(key, lambda: self._pump(producer, queue), cacheable))
+        self._inflight[key] = task
+        return False, self._drain(queue, task)
+
+    @staticmethod
+    async def _single(code: str) -> AsyncIterator[str]:
+        yield code
+
+    @staticmethod
+    async def _join(task: asyncio.Task) -> AsyncIterator[str]:
+        yield await asyncio.shield(task)
+
+    @staticmethod
+    async def _pump(producer: Callable[[], AsyncIterator[str]], queue: asyncio.Queue) -> str:
+        # Corre en la tarea en vuelo: si el cliente se desconecta la
+        # generación sigue para quienes la esperan
+        parts = []
+        try:
+            async for text in producer():
+                parts.append(text)
+                queue.put_nowait(text)
+        finally:
+            queue.put_nowait(None)
+        return "".join(parts).strip()
+
+    @staticmethod
+    async def _drain(queue: asyncio.Queue, task: asyncio.Task) -> AsyncIterator[str]:
+        while True:
+            text = await queue.get()
+            if text is None:
+                break
+            yield text
+        # Propaga el error de la generación, si lo hubo
+        await asyncio.shield(task)
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self.cache_dir:
+            self._disk_path(key).unlink(missing_ok=True)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self.cache_dir is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Memoria / disco
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            code, expires_at = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                return code
+            del self._entries[key]
+
+        if self.cache_dir:
+            entry = self._read_disk(key)
+            if entry is not None and entry[1] > now:
+                self.disk_hits += 1
+                self._remember(key, *entry)
+                return entry[0]
+
+        return None
+
+    def _put(self, key: str, code: str) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, code, expires_at)
+        if self.cache_dir:
+            self._write_disk(key, code, expires_at)
+
+    def _remember(self, key: str, code: str, expires_at: float) -> None:
+        self._entries[key] = (code, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[Tuple[str, float]]:
+        try:
+            with open(self._disk_path(key), encoding="utf-8") as f:
+                data = json.load(f)
+            return data["code"], data["expires_at"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, key: str, code: str, expires_at: float) -> None:
+        path = self._disk_path(key)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"code": code, "expires_at": expires_at}, f)
+        os.replace(tmp, path)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# SINGLETON
+# ═════════════════════════════════════════════════════════════════════════════
+
+_default_cache: Optional[CodegenCache] = None
+
+
+def get_codegen_cache() -> CodegenCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = CodegenCache(
+            max_entries=settings.codegen_cache_max_entries,
+            ttl_seconds=settings.codegen_cache_ttl_seconds,
+            cache_dir=settings.codegen_cache_dir or None
+        )
+    return _default_cache
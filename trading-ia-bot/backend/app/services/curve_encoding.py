@@ -0,0 +1,162 @@
+"""
+Reducción y codificación de curvas de equity
+Decimación LTTB / min-max por bucket y codificación float32 en base64
+"""
+
+import base64
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+CURVE_ENCODINGS = ("json", "float32-base64")
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# DECIMACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+
+def lttb(values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: elige max_points índices que preservan
+    la forma visual de la curva. Siempre conserva el primer y último punto.
+
+    Returns:
+        Índices seleccionados (ordenados)
+    """
+    n = len(values)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    y = np.asarray(values, dtype=np.float64)
+    x = np.arange(n, dtype=np.float64)
+
+    # Bordes de los buckets interiores (el primero y el último punto van aparte)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    prev = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        # Punto medio del bucket siguiente (o el último punto)
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        avg_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+
+        # Área del triángulo (prev, candidato, promedio siguiente)
+        area = np.abs(
+            (x[prev] - avg_x) * (y[start:end] - y[prev])
+            - (x[prev] - x[start:end]) * (avg_y - y[prev])
+        )
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+
+    return selected
+
+
+def minmax_decimate(values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Conserva el mínimo y el máximo de cada bucket ((max_points - 2) / 2
+    buckets, más el primer y último punto).
+    Preserva picos y drawdowns exactos, útil para gráficos por píxel.
+
+    Returns:
+        Índices seleccionados (ordenados, sin duplicados)
+    """
+    n = len(values)
+    if max_points >= n or max_points < 4:
+        return np.arange(n)
+
+    y = np.asarray(values, dtype=np.float64)
+    buckets = (max_points - 2) // 2
+    width = -(-n // buckets)
+
+    # Rellenar con el último valor para poder hacer reshape (buckets, width)
+    padded = np.concatenate((y, np.full(buckets * width - n, y[-1])))
+    grid = padded.reshape(buckets, width)
+    base = np.arange(buckets) * width
+
+    indices = np.concatenate((base + grid.argmin(axis=1), base + grid.argmax(axis=1), [0, n - 1]))
+    return np.unique(np.minimum(indices, n - 1))
+
+
+def downsample(values: Sequence[float], max_points: Optional[int], method: str = "lttb") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce la curva a como mucho max_points puntos.
+
+    Returns:
+        (índices originales, valores)
+    """
+    y = np.asarray(values, dtype=np.float64)
+    if not max_points or len(y) <= max_points:
+        return np.arange(len(y)), y
+
+    if method == "lttb":
+        indices = lttb(y, max_points)
+    elif method == "minmax":
+        indices = minmax_decimate(y, max_points)
+    else:
+        raise ValueError(f"downsample debe ser uno de: {', '.join(DOWNSAMPLE_METHODS)}")
+
+    return indices, y[indices]
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# CODIFICACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+
+def encode_float32_base64(values: np.ndarray) -> str:
+    """
+    Codifica la curva como float32 little-endian en base64 (~5.3 bytes/punto
+    frente a ~18 en JSON). En JS: new Float32Array(Uint8Array.from(atob(s), c => c.charCodeAt(0)).buffer)
+    """
+    return base64.b64encode(np.asarray(values, dtype="<f4").tobytes()).decode("ascii")
+
+
+def decode_float32_base64(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype="<f4").astype(np.float64)
+
+
+def format_curve(
+    values: Sequence[float],
+    max_points: Optional[int] = None,
+    method: str = "lttb",
+    encoding: str = "json"
+) -> Dict:
+    """
+    Aplica decimación y codificación a una curva para la respuesta HTTP.
+
+    Returns:
+        {
+            "equity_curve": [...] ([] si va codificada),
+            "equity_curve_b64": str | None,
+            "equity_curve_index": [...] | None (índices originales si se redujo),
+            "equity_curve_encoding": "json" | "float32-base64",
+            "equity_curve_points": total de puntos originales
+        }
+    """
+    validate_curve_options(max_points, method, encoding)
+
+    total = len(values)
+    indices, reduced = downsample(values, max_points, method)
+    downsampled = len(reduced) < total
+
+    return {
+        "equity_curve": reduced.tolist() if encoding == "json" else [],
+        "equity_curve_b64": encode_float32_base64(reduced) if encoding == "float32-base64" else None,
+        "equity_curve_index": indices.tolist() if downsampled else None,
+        "equity_curve_encoding": encoding,
+        "equity_curve_points": total
+    }
+
+
+def validate_curve_options(max_points: Optional[int], method: str, encoding: str) -> None:
+    if max_points is not None and max_points < 4:
+        raise ValueError("max_points debe ser al menos 4")
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"downsample debe ser uno de: {', '.join(DOWNSAMPLE_METHODS)}")
+    if encoding not in CURVE_ENCODINGS:
+        raise ValueError(f"encoding debe ser uno de: {', '.join(CURVE_ENCODINGS)}")
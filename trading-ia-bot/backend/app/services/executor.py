@@ -0,0 +1,144 @@
+"""
+Pool de ejecución para trabajo bloqueante
+Descarga de datos y simulación fuera del event loop, con concurrencia acotada
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.config import settings
+
+
+class ExecutorBusyError(Exception):
+    """La cola del pool está llena; el cliente debe reintentar más tarde."""
+
+
+class BoundedExecutor:
+    """
+    Ejecuta funciones bloqueantes en un ThreadPoolExecutor sin bloquear
+    el event loop de FastAPI.
+
+    Un semáforo limita cuántas tareas corren a la vez; las demás esperan en
+    cola (hasta max_queue) y se registran métricas de profundidad de cola y
+    tiempo de espera.
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_queue: int = 64, name: str = "backtest"):
+        """
+        Args:
+            max_concurrency: Tareas ejecutándose simultáneamente (= hilos del pool)
+            max_queue: Tareas máximas esperando turno antes de rechazar
+            name: Prefijo de los hilos del pool
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.name = name
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=name)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._stats_lock = threading.Lock()
+
+        # Métricas
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Ejecuta fn(*args, **kwargs) en el pool y espera su resultado.
+
+        Raises:
+            ExecutorBusyError: Si la cola de espera está llena
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        with self._stats_lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise ExecutorBusyError(
+                    f"Demasiadas tareas en cola ({self.queued}), intenta más tarde"
+                )
+            self.queued += 1
+
+        enqueued_at = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            with self._stats_lock:
+                self.queued -= 1
+
+        waited = time.perf_counter() - enqueued_at
+        with self._stats_lock:
+            self.running += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+        started_at = time.perf_counter()
+        failed = False
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._semaphore.release()
+            with self._stats_lock:
+                self.running -= 1
+                self.total_run_seconds += time.perf_counter() - started_at
+                if failed:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+
+
+    def metrics(self) -> Dict:
+        """
+        Retorna las métricas actuales del pool.
+        """
+        with self._stats_lock:
+            finished = self.completed + self.failed
+            started = finished + self.running
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "queue_depth": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait_seconds / started * 1000, 2) if started else 0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+                "avg_run_ms": round(self.total_run_seconds / finished * 1000, 2) if finished else 0
+            }
+
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_backtest_executor: Optional[BoundedExecutor] = None
+
+
+def get_backtest_executor() -> BoundedExecutor:
+    """
+    Retorna el pool compartido para descargas y simulaciones de backtest.
+    """
+    global _backtest_executor
+    if _backtest_executor is None:
+        _backtest_executor = BoundedExecutor(
+            max_concurrency=settings.backtest_max_concurrency,
+            max_queue=settings.backtest_max_queue,
+            name="backtest"
+        )
+    return _backtest_executor
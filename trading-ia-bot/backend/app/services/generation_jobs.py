@@ -0,0 +1,288 @@
+"""
+Cola de generación batch de bots
+Trabajos con varias especificaciones, persistidos en la base de datos, que
+procesa un pool de workers async respetando la cuota de Groq, guardando cada
+bot generado en el repositorio
+"""
+
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from groq import RateLimitError
+
+from app.config import settings
+from app.services import bots_repository, generation_jobs_repository
+from app.services.codegen_cache import get_codegen_cache, normalize_request, request_key
+from app.services.groq_service import request_mql5_code
+
+
+class JobNotFoundError(KeyError):
+    """El trabajo no existe (o ya se descartó por antigüedad)"""
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# LIMITADOR DE TASA
+# ═════════════════════════════════════════════════════════════════════════════
+
+class RateLimiter:
+    """
+    Token bucket de peticiones por minuto. pause() congela el bucket cuando
+    la API responde 429 para que todos los workers esperen a la vez.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int = 1):
+        self.interval = 60.0 / requests_per_minute
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) / self.interval)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.interval)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# TRABAJOS
+# ═════════════════════════════════════════════════════════════════════════════
+
+class GenerationJobManager:
+    """
+    Pool de workers sobre la cola persistente (generation_items). Cada
+    worker reclama el siguiente item, genera su código respetando la cuota
+    de Groq y renueva mientras tanto el lease del item; los items de un
+    proceso caído vuelven a la cola cuando su lease caduca, así que los
+    trabajos se reanudan tras un reinicio.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        requests_per_minute: float,
+        max_attempts: int = 5,
+        retained_jobs: int = 100,
+        poll_seconds: float = 1.0,
+        lease_seconds: float = 30.0
+    ):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retained_jobs = retained_jobs
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.limiter = RateLimiter(requests_per_minute, burst=workers)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"[-64:]
+
+        self._last_requeue = -float("inf")
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        # Se dispara (y se reemplaza) cada vez que un item de este proceso termina
+        self._changed = asyncio.Event()
+
+    async def start(self) -> None:
+        """
+        Arranca los workers y devuelve a la cola los items que quedaron a
+        medias en una parada anterior (los de lease caducado).
+        """
+        if self._tasks:
+            return
+        await self._requeue_expired()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, specs: List[Dict], force_refresh: bool = False) -> Dict:
+        job = await generation_jobs_repository.create_job(specs, force_refresh)
+        await generation_jobs_repository.trim_jobs(self.retained_jobs)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str, include_items: bool = True) -> Dict:
+        job = await generation_jobs_repository.get_job(job_id, include_items)
+        if job is None:
+            raise JobNotFoundError(job_id)
+        return job
+
+    async def list_jobs(self) -> List[Dict]:
+        return await generation_jobs_repository.list_jobs(self.retained_jobs)
+
+    async def follow(self, job_id: str) -> AsyncIterator[Dict]:
+        """
+        Emite un evento "item" por cada especificación terminada (también las
+        que ya lo estaban) y "done" al acabar. Lee el estado de la base de
+        datos, así que sigue también los items que generan otros procesos.
+        """
+        reported = set()
+        while True:
+            changed = self._changed
+            job = await generation_jobs_repository.get_job(job_id)
+            if job is None:
+                return
+            for item in job.pop("items"):
+                if item["status"] in generation_jobs_repository.FINISHED_ITEM_STATUSES and item["index"] not in reported:
+                    reported.add(item["index"])
+                    yield {"event": "item", **item}
+            if job["finished_at"] is not None:
+                yield {"event": "done", **job}
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def shutdown(self) -> None:
+        # Los items en curso vuelven a la cola (ver _run)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+
+    async def _worker(self) -> None:
+        while True:
+            item = await generation_jobs_repository.claim_next_item(self.worker_id)
+            if item is None:
+                await self._requeue_expired()
+                await self._wait()
+                continue
+            await self._run(item)
+
+    async def _requeue_expired(self) -> None:
+        # Como mucho una vez por lease: recoge los items de procesos caídos
+        now = time.monotonic()
+        if now - self._last_requeue >= self.lease_seconds:
+            self._last_requeue = now
+            await generation_jobs_repository.requeue_expired_items(self.lease_seconds)
+
+    async def _wait(self) -> None:
+        # El sondeo periódico recoge trabajos creados por otros procesos
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _run(self, item: Dict) -> None:
+        job_id, index = item["job_id"], item["index"]
+        task = asyncio.ensure_future(self._generate(item["spec"], item["force_refresh"]))
+
+        try:
+            # Mientras genera: renovar el lease; si se pierde, el item ya es
+            # de la cola (o de otro worker) y se abandona sin escribir nada
+            while not task.done():
+                await asyncio.wait({task}, timeout=self.poll_seconds)
+                if not task.done() and not await generation_jobs_repository.renew_lease(job_id, index, self.worker_id):
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    return
+
+            bot_id, cached = task.result()
+            await self._finish(job_id, index, "completed", bot_id=bot_id, cached=cached)
+
+        except RateLimitError as e:
+            # La cuota se agotó pese a los reintentos: congelar a todos y reencolar
+            retry_after = _retry_after(e)
+            self.limiter.pause(retry_after)
+            if item["attempts"] < self.max_attempts:
+                await generation_jobs_repository.finish_item(
+                    job_id, index, self.worker_id, "pending", error=f"Rate limit, reintento en {retry_after:.0f}s"
+                )
+                return
+            await self._finish(job_id, index, "failed", error=str(e))
+
+        except asyncio.CancelledError:
+            task.cancel()
+            await generation_jobs_repository.finish_item(job_id, index, self.worker_id, "pending")
+            raise
+
+        except Exception as e:
+            await self._finish(job_id, index, "failed", error=str(e))
+
+    async def _generate(self, spec: Dict, force_refresh: bool) -> Tuple[int, bool]:
+        """
+        Genera (o lee de la caché) el código de una especificación y guarda
+        el bot.
+
+        Returns:
+            (id del bot, True si el código vino de la caché)
+        """
+        key = request_key(normalize_request(
+            spec["indicators"], spec["symbol"], spec["timeframe"], spec["strategy_type"], settings.groq_model
+        ))
+
+        async def produce() -> str:
+            await self.limiter.acquire()
+            return await request_mql5_code(
+                spec["indicators"], spec["symbol"], spec["timeframe"], spec["strategy_type"]
+            )
+
+        code, cached = await get_codegen_cache().get_or_generate(key, produce, force_refresh=force_refresh)
+
+        bot = await bots_repository.create_bot({
+            "name": spec.get("name") or f"{spec['strategy_type']} {spec['symbol']} {spec['timeframe']}",
+            "indicators": spec["indicators"],
+            "symbol": spec["symbol"],
+            "timeframe": spec["timeframe"],
+            "strategy_type": spec["strategy_type"],
+            "code": code,
+            "description": spec.get("description")
+        })
+        return bot["id"], cached
+
+    async def _finish(self, job_id: str, index: int, status: str, **values) -> None:
+        await generation_jobs_repository.finish_item(job_id, index, self.worker_id, status, **values)
+        # Despertar a los clientes SSE de este proceso
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+def _retry_after(error: RateLimitError) -> float:
+    try:
+        return max(1.0, float(error.response.headers["retry-after"]))
+    except (AttributeError, KeyError, ValueError):
+        return settings.groq_retry_max_delay
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# SINGLETON
+# ═════════════════════════════════════════════════════════════════════════════
+
+_default_manager: Optional[GenerationJobManager] = None
+
+
+def get_generation_jobs() -> GenerationJobManager:
+    global _default_manager
+    if _default_manager is None:
+        _default_manager = GenerationJobManager(
+            workers=settings.generation_batch_workers,
+            requests_per_minute=settings.groq_requests_per_minute,
+            max_attempts=settings.generation_batch_max_attempts,
+            retained_jobs=settings.generation_batch_retained_jobs,
+            poll_seconds=settings.generation_batch_poll_seconds,
+            lease_seconds=settings.generation_batch_lease_seconds
+        )
+    return _default_manager
+
+
+async def shutdown_generation_jobs() -> None:
+    if _default_manager is not None:
+        await _default_manager.shutdown()
@@ -0,0 +1,254 @@
+"""
+Repositorio de trabajos de generación batch
+Acceso a las tablas generation_jobs / generation_items; los items hacen de
+cola persistente
+"""
+
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, or_, select, update
+
+from app.database import SessionLocal
+from app.models import GenerationItem, GenerationJob
+
+
+FINISHED_ITEM_STATUSES = ("completed", "failed")
+
+
+def _item_to_dict(item: GenerationItem) -> Dict:
+    return {
+        "index": item.position,
+        "spec": item.spec,
+        "status": item.status,
+        "bot_id": item.bot_id,
+        "cached": item.cached,
+        "error": item.error
+    }
+
+
+def _to_dict(job: GenerationJob, counts: Dict[str, int], items: Optional[List[GenerationItem]] = None) -> Dict:
+    total = sum(counts.values())
+    completed = counts.get("completed", 0)
+    failed = counts.get("failed", 0)
+    if completed + failed == total:
+        status = "completed" if not failed else "completed_with_errors"
+    elif counts.get("pending", 0) < total:
+        status = "running"
+    else:
+        status = "queued"
+
+    data = {
+        "job_id": job.id,
+        "status": status,
+        "total": total,
+        "completed": completed,
+        "failed": failed,
+        "pending": total - completed - failed,
+        "created_at": job.created_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+    if items is not None:
+        data["items"] = [_item_to_dict(item) for item in items]
+    return data
+
+
+async def _counts(session, job_ids: List[str]) -> Dict[str, Dict[str, int]]:
+    counts: Dict[str, Dict[str, int]] = {job_id: {} for job_id in job_ids}
+    rows = await session.execute(
+        select(GenerationItem.job_id, GenerationItem.status, func.count())
+        .where(GenerationItem.job_id.in_(job_ids))
+        .group_by(GenerationItem.job_id, GenerationItem.status)
+    )
+    for job_id, status, count in rows:
+        counts[job_id][status] = count
+    return counts
+
+
+async def create_job(specs: List[Dict], force_refresh: bool = False) -> Dict:
+    now = datetime.now()
+    async with SessionLocal() as session:
+        async with session.begin():
+            job = GenerationJob(id=uuid.uuid4().hex, force_refresh=force_refresh, created_at=now)
+            session.add(job)
+            await session.flush()
+            session.add_all([
+                GenerationItem(job_id=job.id, position=position, spec=spec, status="pending", attempts=0, created_at=now)
+                for position, spec in enumerate(specs)
+            ])
+        return _to_dict(job, {"pending": len(specs)})
+
+
+async def get_job(job_id: str, include_items: bool = True) -> Optional[Dict]:
+    async with SessionLocal() as session:
+        job = await session.get(GenerationJob, job_id)
+        if job is None:
+            return None
+        items = None
+        if include_items:
+            items = list(await session.scalars(
+                select(GenerationItem).where(GenerationItem.job_id == job_id).order_by(GenerationItem.position)
+            ))
+        return _to_dict(job, (await _counts(session, [job_id]))[job_id], items)
+
+
+async def list_jobs(limit: int = 100) -> List[Dict]:
+    """
+    Trabajos más recientes primero (sin items).
+    """
+    async with SessionLocal() as session:
+        jobs = list(await session.scalars(
+            select(GenerationJob).order_by(GenerationJob.created_at.desc(), GenerationJob.id).limit(limit)
+        ))
+        counts = await _counts(session, [job.id for job in jobs])
+        return [_to_dict(job, counts[job.id]) for job in jobs]
+
+
+async def trim_jobs(retained: int) -> int:
+    """
+    Borra los trabajos terminados que quedan fuera de los `retained` más
+    recientes, con sus items.
+    """
+    async with SessionLocal() as session:
+        async with session.begin():
+            recent = select(GenerationJob.id).order_by(GenerationJob.created_at.desc()).limit(retained)
+            expired = list(await session.scalars(
+                select(GenerationJob.id).where(
+                    GenerationJob.finished_at.is_not(None),
+                    GenerationJob.id.not_in(recent)
+                )
+            ))
+            if expired:
+                await session.execute(delete(GenerationItem).where(GenerationItem.job_id.in_(expired)))
+                await session.execute(delete(GenerationJob).where(GenerationJob.id.in_(expired)))
+        return len(expired)
+
+
+async def claim_next_item(claimed_by: str) -> Optional[Dict]:
+    """
+    Pasa a running el siguiente item pendiente (trabajo más antiguo primero,
+    y en orden dentro de él) con el lease a nombre de claimed_by. El UPDATE
+    condicionado a status = pending hace que dos workers (o dos procesos)
+    nunca reclamen el mismo item.
+
+    Returns:
+        {"job_id", "index", "spec", "attempts", "force_refresh"} o None
+    """
+    query = (
+        select(GenerationItem.job_id, GenerationItem.position)
+        .where(GenerationItem.status == "pending")
+        .order_by(GenerationItem.created_at, GenerationItem.job_id, GenerationItem.position)
+        .limit(1)
+    )
+    async with SessionLocal() as session:
+        async with session.begin():
+            row = (await session.execute(query)).first()
+            if row is None:
+                return None
+            job_id, position = row
+            claimed = await session.execute(
+                update(GenerationItem)
+                .where(
+                    GenerationItem.job_id == job_id,
+                    GenerationItem.position == position,
+                    GenerationItem.status == "pending"
+                )
+                .values(
+                    status="running", attempts=GenerationItem.attempts + 1,
+                    claimed_by=claimed_by, heartbeat_at=datetime.now()
+                )
+            )
+            if not claimed.rowcount:
+                return None
+            item = await session.get(GenerationItem, (job_id, position))
+            job = await session.get(GenerationJob, job_id)
+        return {
+            "job_id": job_id,
+            "index": position,
+            "spec": item.spec,
+            "attempts": item.attempts,
+            "force_refresh": job.force_refresh
+        }
+
+
+def _leased(job_id: str, position: int, claimed_by: str):
+    # Item en ejecución cuyo lease sigue a nombre de claimed_by
+    return (
+        GenerationItem.job_id == job_id,
+        GenerationItem.position == position,
+        GenerationItem.status == "running",
+        GenerationItem.claimed_by == claimed_by
+    )
+
+
+async def renew_lease(job_id: str, position: int, claimed_by: str) -> bool:
+    """
+    Renueva el latido del item y retorna si claimed_by conserva el lease.
+    """
+    async with SessionLocal() as session:
+        async with session.begin():
+            renewed = await session.execute(
+                update(GenerationItem)
+                .where(*_leased(job_id, position, claimed_by))
+                .values(heartbeat_at=datetime.now())
+            )
+        return bool(renewed.rowcount)
+
+
+async def finish_item(
+    job_id: str,
+    position: int,
+    claimed_by: str,
+    status: str,
+    bot_id: Optional[int] = None,
+    cached: Optional[bool] = None,
+    error: Optional[str] = None
+) -> bool:
+    """
+    Cierra el item (completed/failed, o pending para reencolarlo) si
+    claimed_by conserva el lease, y marca el trabajo como terminado cuando
+    ya no le quedan items pendientes.
+
+    Returns:
+        Si se actualizó el item
+    """
+    async with SessionLocal() as session:
+        async with session.begin():
+            finished = await session.execute(
+                update(GenerationItem)
+                .where(*_leased(job_id, position, claimed_by))
+                .values(status=status, bot_id=bot_id, cached=cached, error=error, claimed_by=None, heartbeat_at=None)
+            )
+            if finished.rowcount and status in FINISHED_ITEM_STATUSES:
+                unfinished = (
+                    select(GenerationItem.position)
+                    .where(GenerationItem.job_id == job_id, GenerationItem.status.not_in(FINISHED_ITEM_STATUSES))
+                    .exists()
+                )
+                await session.execute(
+                    update(GenerationJob)
+                    .where(GenerationJob.id == job_id, GenerationJob.finished_at.is_(None), ~unfinished)
+                    .values(finished_at=datetime.now())
+                )
+        return bool(finished.rowcount)
+
+
+async def requeue_expired_items(lease_seconds: float) -> int:
+    """
+    Devuelve a la cola los items en running cuyo lease caducó (el proceso que
+    los generaba se paró o murió). Los que siguen vivos en otros procesos
+    renuevan su latido y no se tocan.
+    """
+    expired = datetime.now() - timedelta(seconds=lease_seconds)
+    async with SessionLocal() as session:
+        async with session.begin():
+            requeued = await session.execute(
+                update(GenerationItem)
+                .where(
+                    GenerationItem.status == "running",
+                    or_(GenerationItem.heartbeat_at.is_(None), GenerationItem.heartbeat_at < expired)
+                )
+                .values(status="pending", claimed_by=None, heartbeat_at=None)
+            )
+        return requeued.rowcount
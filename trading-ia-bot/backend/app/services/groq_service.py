@@ -1,20 +1,210 @@
+import asyncio
 import os
-from groq import Groq
+import random
+from typing import AsyncIterator, Dict, List, Optional
 
-# 1. Definir la función principal para generar el código MQL5
-async def generate_mql5_code(indicators: list, symbol: str, timeframe: str, strategy_type: str) -> str:
+import httpx
+from groq import APIConnectionError, APIStatusError, APITimeoutError, AsyncGroq
+
+from app.config import settings
+from app.services.codegen_cache import normalize_request
+from app.services.mql5_patch import PatchError, apply_patch, error_lines, find_regions, format_regions, parse_patch
+
+
+# Cliente único por proceso: reutiliza conexiones keep-alive entre requests
+_client: Optional[AsyncGroq] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def get_groq_client() -> AsyncGroq:
     """
-    Llama a la API de Groq para generar el código MQL5 del Expert Advisor.
+    Retorna el cliente async compartido (lo crea la primera vez).
+    GROQ_BASE_URL permite apuntarlo a un servidor local compatible en pruebas.
     """
-    # ⚠️ Asegúrate de que la variable de entorno GROQ_API_KEY esté configurada
-    api_key = os.environ.get("GROQ_API_KEY")
-    if not api_key:
-        raise ValueError("GROQ_API_KEY no está configurada en las variables de entorno.")
+    global _client
+    if _client is None:
+        api_key = settings.groq_api_key or os.environ.get("GROQ_API_KEY")
+        if not api_key:
+            raise ValueError("GROQ_API_KEY no está configurada en las variables de entorno.")
+
+        timeout = httpx.Timeout(settings.groq_timeout_seconds, connect=settings.groq_connect_timeout_seconds)
+        http_client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=settings.groq_max_connections,
+                max_keepalive_connections=settings.groq_max_connections
+            )
+        )
+        _client = AsyncGroq(
+            api_key=api_key,
+            base_url=settings.groq_base_url or None,
+            timeout=timeout,
+            max_retries=0,  # los reintentos los hace _chat_completion con jitter
+            http_client=http_client
+        )
+    return _client
+
+
+async def close_groq_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.groq_max_concurrency)
+    return _semaphore
+
+
+def _retry_delay(attempt: int, error: Exception) -> float:
+    """
+    Backoff exponencial con full jitter; respeta Retry-After si viene en la respuesta.
+    """
+    delay = random.uniform(0, min(settings.groq_retry_max_delay, settings.groq_retry_base_delay * 2 ** attempt))
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            delay = max(delay, float(response.headers.get("retry-after", 0)))
+        except ValueError:
+            pass
+    return min(delay, settings.groq_retry_max_delay)
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+
+async def _chat_completion(messages: List[Dict], temperature: float = 0.1, max_tokens: int = 4096) -> str:
+    """
+    Llamada a chat.completions limitada por el semáforo global y con
+    reintentos en 429/5xx/errores de conexión. El semáforo se toma en cada
+    intento: la espera del backoff no ocupa un hueco de concurrencia.
+    """
+    client = get_groq_client()
+
+    for attempt in range(settings.groq_max_retries + 1):
+        async with _get_semaphore():
+            try:
+                completion = await client.chat.completions.create(
+                    model=settings.groq_model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
+                return completion.choices[0].message.content
+            except Exception as e:
+                if attempt >= settings.groq_max_retries or not _is_retryable(e):
+                    raise
+                delay = _retry_delay(attempt, e)
+        await asyncio.sleep(delay)
+
+
+async def _chat_completion_stream(
+    messages: List[Dict],
+    temperature: float = 0.1,
+    max_tokens: int = 4096
+) -> AsyncIterator[str]:
+    """
+    Versión streaming de _chat_completion: produce los fragmentos de texto
+    según llegan. Solo se reintenta mientras no se haya emitido nada.
+    """
+    client = get_groq_client()
 
-    client = Groq(api_key=api_key)
+    for attempt in range(settings.groq_max_retries + 1):
+        emitted = False
+        async with _get_semaphore():
+            try:
+                stream = await client.chat.completions.create(
+                    model=settings.groq_model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True
+                )
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        emitted = True
+                        yield content
+                return
+            except Exception as e:
+                if emitted or attempt >= settings.groq_max_retries or not _is_retryable(e):
+                    raise
+                delay = _retry_delay(attempt, e)
+        await asyncio.sleep(delay)
 
-    # 2. Construir el Prompt Detallado (Few-shot Prompting)
-    # Este es el corazón de la integración, da contexto y pide un formato específico.
+
+class FenceStripper:
+    """
+    Quita las vallas markdown (```mql5 ... ```) de forma incremental.
+
+    Trabaja por líneas: descarta la primera línea si abre una valla y retiene
+    las líneas en blanco o "```" hasta saber si hay más código detrás
+    (si no lo hay, eran el cierre y se descartan en finish()).
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._started = False
+        self._held: List[str] = []
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split("\n")
+        return "".join(self._line(line + "\n") for line in lines)
+
+    def finish(self) -> str:
+        line, self._buffer = self._buffer, ""
+        output = self._line(line) if line else ""
+        self._held = []
+        return output.rstrip()
+
+    def _line(self, line: str) -> str:
+        stripped = line.strip()
+        if not self._started:
+            if not stripped:
+                return ""
+            self._started = True
+            if stripped.startswith("```"):
+                return ""
+
+        if not stripped or stripped == "```":
+            self._held.append(line)
+            return ""
+
+        output = "".join(self._held) + line
+        self._held = []
+        return output
+
+
+def _strip_fences(code: str) -> str:
+    """
+    Limpieza básica del código (eliminar las vallas ```mql5 ... ```)
+    """
+    stripper = FenceStripper()
+    return (stripper.feed(code) + stripper.finish()).strip()
+
+
+def _generation_messages(indicators: list, symbol: str, timeframe: str, strategy_type: str) -> List[Dict]:
+    """
+    Construye el Prompt Detallado (Few-shot Prompting)
+    Este es el corazón de la integración, da contexto y pide un formato específico.
+    Se construye desde la petición normalizada de la caché: dos peticiones con
+    la misma clave (p. ej. los indicadores en otro orden) reciben el mismo prompt.
+    """
+    request = normalize_request(indicators, symbol, timeframe, strategy_type, settings.groq_model)
+    indicators, symbol, timeframe, strategy_type = (
+        request["indicators"], request["symbol"], request["timeframe"], request["strategy_type"]
+    )
     system_prompt = f"""
     Eres un programador experto en MQL5 para MetaTrader 5.
     Tu única tarea es generar el código completo de un Expert Advisor (EA)
@@ -35,53 +225,20 @@ async def generate_mql5_code(indicators: list, symbol: str, timeframe: str, stra
     {', '.join(indicators)}.
 
     Escribe la lógica de entrada y salida basada en una combinación lógica y estándar de estos indicadores.
+    El orden de la lista no importa: asigna a cada indicador el papel que le corresponde
+    por su naturaleza (tendencia, impulso, volatilidad o volumen).
     Por ejemplo:
-    - COMPRA si la tendencia es alcista (según el primer indicador) y el impulso es positivo (según el segundo indicador).
-    - VENTA en caso contrario.
+    - COMPRA si los indicadores de tendencia son alcistas y los de impulso son positivos.
+    - VENTA si los de tendencia son bajistas y los de impulso son negativos.
     """
-    
-    # 3. Llamada a la API de Groq
-    try:
-        completion = client.chat.completions.create(
-            # 'mixtral-8x7b-32768' es un modelo rápido y bueno para código
-            model="mixtral-8x7b-32768", 
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_request}
-            ],
-            # Configuraciones para obtener mejor código
-            temperature=0.1,  # Baja temperatura para código más determinista
-            max_tokens=4096   # Máximo de tokens para asegurar el código completo
-        )
-        
-        mql5_code = completion.choices[0].message.content
-        
-        # 4. Limpieza básica del código (eliminar texto de introducción/cierre)
-        # Esto ayuda a asegurar que solo se retorna el código.
-        if mql5_code.startswith("```mql5"):
-            mql5_code = mql5_code.replace("```mql5", "").strip()
-        if mql5_code.endswith("```"):
-            mql5_code = mql5_code.replace("```", "").strip()
-            
-        return mql5_code
-        
-    except Exception as e:
-        # Manejo de errores de la API (ej. clave no válida, límite excedido)
-        return f"ERROR_GROQ: No se pudo generar el código. Detalle: {e}"
-
 
-# 2. Función para refinar código si tiene errores
-async def refine_mql5_code(code: str, error_message: str) -> str:
-    """
-    Refina el código MQL5 si tiene errores de compilación.
-    Toma el código anterior y el error, y retorna el código corregido.
-    """
-    api_key = os.environ.get("GROQ_API_KEY")
-    if not api_key:
-        raise ValueError("GROQ_API_KEY no está configurada en las variables de entorno.")
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_request}
+    ]
 
-    client = Groq(api_key=api_key)
 
+def _refine_messages(code: str, error_message: str) -> List[Dict]:
     system_prompt = """
     Eres un experto en MQL5 y debugging.
     Tu tarea es REESCRIBIR el código MQL5 completo, línea por línea,
@@ -100,32 +257,185 @@ async def refine_mql5_code(code: str, error_message: str) -> str:
     Por favor, reescribe el código COMPLETAMENTE, corrigiendo estos errores.
     Retorna SOLO el código, nada más.
     """
-    
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_request}
+    ]
+
+
+# 1. Definir la función principal para generar el código MQL5
+async def request_mql5_code(indicators: list, symbol: str, timeframe: str, strategy_type: str) -> str:
+    """
+    Genera el código MQL5 propagando los errores de la API (para quien
+    necesite distinguir un 429 de un fallo definitivo, como la cola batch).
+    """
+    # ⚠️ Asegúrate de que la variable de entorno GROQ_API_KEY esté configurada
+    get_groq_client()
+
+    # Llamada a la API de Groq (modelo en settings.groq_model)
+    mql5_code = await _chat_completion(
+        _generation_messages(indicators, symbol, timeframe, strategy_type),
+        # Configuraciones para obtener mejor código
+        temperature=0.1,  # Baja temperatura para código más determinista
+        max_tokens=4096   # Máximo de tokens para asegurar el código completo
+    )
+
+    # Limpieza básica del código (eliminar texto de introducción/cierre)
+    # Esto ayuda a asegurar que solo se retorna el código.
+    return _strip_fences(mql5_code)
+
+
+async def generate_mql5_code(indicators: list, symbol: str, timeframe: str, strategy_type: str) -> str:
+    """
+    Llama a la API de Groq para generar el código MQL5 del Expert Advisor.
+    """
+    get_groq_client()
+
     try:
-        completion = client.chat.completions.create(
-            model="mixtral-8x7b-32768",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_request}
-            ],
+        return await request_mql5_code(indicators, symbol, timeframe, strategy_type)
+    except Exception as e:
+        # Manejo de errores de la API (ej. clave no válida, límite excedido)
+        return f"ERROR_GROQ: No se pudo generar el código. Detalle: {e}"
+
+
+# 2. Función para refinar código si tiene errores
+async def refine_mql5_code(code: str, error_message: str) -> str:
+    """
+    Refina el código MQL5 si tiene errores de compilación.
+    Toma el código anterior y el error, y retorna el código corregido.
+    """
+    get_groq_client()
+
+    try:
+        refined_code = await _chat_completion(
+            _refine_messages(code, error_message),
             temperature=0.1,
             max_tokens=4096
         )
         
-        refined_code = completion.choices[0].message.content
-        
         # Limpieza
-        if refined_code.startswith("```mql5"):
-            refined_code = refined_code.replace("```mql5", "").strip()
-        if refined_code.endswith("```"):
-            refined_code = refined_code.replace("```", "").strip()
-            
-        return refined_code
+        return _strip_fences(refined_code)
         
     except Exception as e:
         return f"ERROR_GROQ_REFINE: No se pudo refinar el código. Detalle: {e}"
 
 
+def _patch_messages(regions_text: str, error_message: str) -> List[Dict]:
+    system_prompt = """
+    Eres un experto en MQL5 y debugging.
+    Recibirás SOLO las regiones de un Expert Advisor donde el compilador
+    reporta errores, delimitadas por <<<REGION n ... >>>.
+    Devuelve cada región corregida COMPLETA con el mismo formato:
+    <<<REGION n
+    ...código corregido...
+    >>>
+    Si hace falta declarar variables globales, #include o inputs nuevos,
+    añade un bloque <<<GLOBAL ... >>> con SOLO esas declaraciones.
+    No devuelvas regiones que no se te dieron ni explicaciones adicionales.
+    """
+
+    user_request = f"""
+    ERRORES DEL COMPILADOR:
+    {error_message}
+
+    REGIONES:
+    {regions_text}
+    """
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_request}
+    ]
+
+
+async def refine_mql5_code_patch(code: str, error_message: str, allow_fallback: bool = True) -> Dict:
+    """
+    Refina enviando solo las funciones/regiones que señalan los errores y
+    aplicando localmente el parche devuelto. Si no se pueden localizar los
+    errores o el parche no valida, reescribe el archivo completo
+    (refine_mql5_code) salvo que allow_fallback sea False.
+
+    Returns:
+        {"code": str, "mode": "patch" | "full", "regions": [[inicio, fin], ...], "fallback_reason": str | None}
+    """
+    get_groq_client()
+
+    regions = find_regions(code, error_lines(error_message, code))
+    reason = None
+
+    if not regions:
+        reason = "No se pudieron localizar los errores en el código"
+    else:
+        regions_text = format_regions(regions)
+        try:
+            # Salida acotada al tamaño de las regiones (~3.5 caracteres por token)
+            max_tokens = min(4096, 512 + len(regions_text) // 2)
+            response = await _chat_completion(
+                _patch_messages(regions_text, error_message),
+                temperature=0.1,
+                max_tokens=max_tokens
+            )
+            replacements, global_block = parse_patch(response)
+            return {
+                "code": apply_patch(code, regions, replacements, global_block),
+                "mode": "patch",
+                "regions": [[region.start + 1, region.end + 1] for region in regions],
+                "fallback_reason": None
+            }
+        except PatchError as e:
+            reason = f"Parche inválido: {e}"
+        except Exception as e:
+            reason = f"ERROR_GROQ_REFINE: {e}"
+
+    if not allow_fallback:
+        raise PatchError(reason)
+
+    return {
+        "code": await refine_mql5_code(code, error_message),
+        "mode": "full",
+        "regions": [],
+        "fallback_reason": reason
+    }
+
+
+# 3. Variantes streaming: fragmentos de código ya limpios según llegan
+async def stream_mql5_code(indicators: list, symbol: str, timeframe: str, strategy_type: str) -> AsyncIterator[str]:
+    """
+    Igual que generate_mql5_code pero produce el código por fragmentos.
+    Los errores de la API se propagan como excepciones.
+    """
+    get_groq_client()
+    stripper = FenceStripper()
+
+    async for chunk in _chat_completion_stream(
+        _generation_messages(indicators, symbol, timeframe, strategy_type),
+        temperature=0.1,
+        max_tokens=4096
+    ):
+        text = stripper.feed(chunk)
+        if text:
+            yield text
+
+    tail = stripper.finish()
+    if tail:
+        yield tail
+
+
+async def stream_refined_code(code: str, error_message: str) -> AsyncIterator[str]:
+    get_groq_client()
+    stripper = FenceStripper()
+
+    async for chunk in _chat_completion_stream(_refine_messages(code, error_message), temperature=0.1, max_tokens=4096):
+        text = stripper.feed(chunk)
+        if text:
+            yield text
+
+    tail = stripper.finish()
+    if tail:
+        yield tail
+
+
 # --- Ejemplo de uso (NO para el archivo principal) ---
 # Si ejecutas este archivo directamente, mostrará un ejemplo
 if __name__ == '__main__':
@@ -0,0 +1,397 @@
+"""
+Caché compartida de indicadores
+Memoiza los arrays calculados por (símbolo, intervalo, versión de los datos,
+indicador, parámetros) con LRU por bytes, persistencia opcional en disco
+(memory-mapped) y extensión incremental cuando llegan barras nuevas
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.config import settings
+from app.services.indicators import compute_indicator, resolve_indicator
+from app.services.price_store import OHLCV_COLUMNS
+from app.services.strategy_rules import IndicatorFn
+
+
+# (símbolo, intervalo)
+SeriesKey = Tuple[str, str]
+# (símbolo, intervalo, indicador, parámetros)
+EntryKey = Tuple[str, str, str, Tuple[Tuple[str, float], ...]]
+
+
+def _digests(df: pd.DataFrame, points: Iterable[int]) -> Dict[int, str]:
+    """
+    Huella de las primeras k barras (índice + OHLCV) para cada k de points,
+    en una sola pasada incremental sobre las columnas.
+    """
+    columns = [df.index.values.astype("datetime64[ns]").view("int64")]
+    columns += [np.ascontiguousarray(df[column].to_numpy(dtype=np.float64)) for column in OHLCV_COLUMNS]
+    hashers = [hashlib.blake2b(digest_size=16) for _ in columns]
+
+    digests = {}
+    done = 0
+    for point in sorted({p for p in points if 0 <= p <= len(df)}):
+        for hasher, values in zip(hashers, columns):
+            hasher.update(values[done:point])
+        done = point
+        digests[point] = hashlib.blake2b(b"".join(h.digest() for h in hashers), digest_size=16).hexdigest()
+    return digests
+
+
+class _Series:
+    """Última versión vista de una serie: filas y huellas de [:rows-1] y [:rows]"""
+
+    def __init__(self, rows: int, digests: Dict[int, str]):
+        self.rows = rows
+        self.digests = digests
+
+
+class _Entry:
+    def __init__(self, arrays: Dict[str, np.ndarray], rows: int):
+        self.arrays = arrays
+        self.rows = rows
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.arrays.values())
+
+
+class IndicatorCache:
+    """
+    Caché de indicadores calculados sobre la serie completa almacenada de
+    cada símbolo/intervalo.
+
+    La versión de los datos es una huella de las barras: si la serie solo
+    creció por la cola (o se corrigió la última barra, que puede estar
+    incompleta), los indicadores se extienden recalculando la cola con sus
+    barras de calentamiento; si cambió algo anterior, se recalculan enteros.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, cache_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self._entries: "OrderedDict[EntryKey, _Entry]" = OrderedDict()
+        self._series: Dict[SeriesKey, _Series] = {}
+        self._bytes = 0
+        self._guard = threading.Lock()
+        self._locks: Dict[SeriesKey, threading.Lock] = {}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.extensions = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def indicator_fn(self, series_key: SeriesKey, base: pd.DataFrame, df: Optional[pd.DataFrame] = None) -> IndicatorFn:
+        """
+        Función de indicadores para las reglas de estrategia.
+
+        Args:
+            series_key: (símbolo, intervalo)
+            base: Serie completa sobre la que se calculan y cachean los indicadores
+            df: Ventana del backtest dentro de base (default: base completa)
+
+        Returns:
+            (nombre, parámetros) → {salida: array alineado con df}
+        """
+        df = base if df is None else df
+        start = _window_start(base, df)
+        if start is None:
+            # La ventana no está contenida en la serie (p. ej. se refrescó entre
+            # medias): calcular sobre la ventana sin caché
+            return lambda name, params: compute_indicator(df, name, params)
+
+        self._sync(series_key, base)
+        end = start + len(df)
+
+        def get(name: str, params: Dict[str, float]) -> Dict[str, np.ndarray]:
+            arrays = self.get(series_key, base, name, params)
+            return {output: values[start:end] for output, values in arrays.items()}
+
+        return get
+
+
+    def get(self, series_key: SeriesKey, base: pd.DataFrame, name: str, params: Dict[str, float]) -> Dict[str, np.ndarray]:
+        """
+        Indicador sobre base completa. Solo revalida la versión si cambió el
+        número de barras; indicator_fn() la comprueba siempre.
+        """
+        spec = resolve_indicator(name)
+        key: EntryKey = (*series_key, spec.name, tuple(sorted(params.items())))
+        total = len(base)
+
+        # Un solo cálculo por serie a la vez: las peticiones concurrentes del
+        # mismo indicador esperan y encuentran el resultado ya cacheado
+        with self._lock_for(series_key):
+            series = self._series.get(series_key)
+            if series is None or series.rows != total:
+                series = self._sync_locked(series_key, base)
+
+            with self._guard:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+
+            if entry is not None and entry.rows == total:
+                self.hits += 1
+                return entry.arrays
+
+            if entry is None:
+                entry = self._read_disk(key, base, series)
+                if entry is not None and entry.rows == total:
+                    self.disk_hits += 1
+                    self._remember(key, entry)
+                    return entry.arrays
+
+            warmup = spec.warmup_bars(params)
+            if entry is not None and warmup is not None and entry.rows > 0:
+                # Recalcular solo la cola, arrancando warmup barras antes
+                offset = max(0, entry.rows - warmup)
+                tail = compute_indicator(base.iloc[offset:], spec.name, params)
+                arrays = {
+                    output: np.concatenate([entry.arrays[output][:entry.rows], values[entry.rows - offset:]])
+                    for output, values in tail.items()
+                }
+                self.extensions += 1
+            else:
+                arrays = compute_indicator(base, spec.name, params)
+                self.misses += 1
+
+            entry = _Entry(arrays, total)
+            if self.cache_dir:
+                entry = self._write_disk(key, entry, series)
+            self._remember(key, entry)
+            return entry.arrays
+
+
+    def invalidate(self, series_key: Optional[SeriesKey] = None) -> None:
+        """
+        Descarta los indicadores de una serie (o todos).
+        """
+        with self._guard:
+            for key in [k for k in self._entries if series_key is None or k[:2] == series_key]:
+                self._bytes -= self._entries.pop(key).nbytes
+            if series_key is None:
+                self._series.clear()
+            else:
+                self._series.pop(series_key, None)
+
+        if self.cache_dir:
+            for path in self._series_dirs(series_key):
+                _remove_tree(path)
+
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.disk_hits + self.extensions + self.misses
+        return {
+            "entries": len(self._entries),
+            "series": len(self._series),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "persistent": self.cache_dir is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "extensions": self.extensions,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+        }
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Versiones de la serie
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _lock_for(self, series_key: SeriesKey) -> threading.Lock:
+        with self._guard:
+            if series_key not in self._locks:
+                self._locks[series_key] = threading.Lock()
+            return self._locks[series_key]
+
+
+    def _sync(self, series_key: SeriesKey, base: pd.DataFrame) -> None:
+        with self._lock_for(series_key):
+            self._sync_locked(series_key, base)
+
+
+    def _sync_locked(self, series_key: SeriesKey, base: pd.DataFrame) -> _Series:
+        """
+        Compara base con la última versión vista y recorta (o descarta) los
+        indicadores cacheados a las filas que siguen siendo válidas.
+        """
+        total = len(base)
+        previous = self._series.get(series_key)
+
+        points = [total - 1, total]
+        if previous is not None:
+            points += [previous.rows - 1, previous.rows]
+        digests = _digests(base, points)
+
+        current = _Series(total, {point: digests.get(point) for point in (total - 1, total)})
+        if previous is not None and previous.rows == total and previous.digests[total] == digests[total]:
+            return previous
+
+        valid = 0
+        if previous is not None and 0 < previous.rows <= total:
+            if digests[previous.rows] == previous.digests[previous.rows]:
+                valid = previous.rows
+            elif previous.rows > 1 and digests[previous.rows - 1] == previous.digests[previous.rows - 1]:
+                valid = previous.rows - 1
+
+        with self._guard:
+            self._series[series_key] = current
+            for key in [k for k in self._entries if k[:2] == series_key]:
+                if valid == 0:
+                    self._bytes -= self._entries.pop(key).nbytes
+                else:
+                    self._entries[key].rows = min(self._entries[key].rows, valid)
+        return current
+
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # Memoria / disco
+    # ─────────────────────────────────────────────────────────────────────────
+
+    def _remember(self, key: EntryKey, entry: _Entry) -> None:
+        with self._guard:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            if entry.nbytes > self.max_bytes:
+                return
+
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+
+    def _entry_dir(self, key: EntryKey) -> str:
+        symbol, interval, name, params = key
+        safe_symbol = "".join(c if c.isalnum() or c in "-_=." else "_" for c in symbol.upper())
+        label = "-".join([name] + [f"{param}={value}" for param, value in params])
+        return os.path.join(self.cache_dir, safe_symbol, interval, label)
+
+
+    def _series_dirs(self, series_key: Optional[SeriesKey]) -> List[str]:
+        if series_key is None:
+            return [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)]
+        return [os.path.dirname(self._entry_dir((*series_key, "_", ())))]
+
+
+    def _read_disk(self, key: EntryKey, base: pd.DataFrame, series: _Series) -> Optional[_Entry]:
+        """
+        Carga (memory-mapped) un indicador persistido si sus filas siguen
+        coincidiendo con la serie actual.
+        """
+        if not self.cache_dir:
+            return None
+        path = self._entry_dir(key)
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            rows = int(meta["rows"])
+            if rows > len(base):
+                return None
+            digests = dict(series.digests)
+            missing = {rows - 1, rows} - set(digests)
+            if missing:
+                digests.update(_digests(base, missing))
+            if digests.get(rows) != meta["digest"]:
+                # Última barra corregida: vale todo menos esa fila
+                if rows < 2 or digests.get(rows - 1) != meta["prefix_digest"]:
+                    return None
+                rows -= 1
+            arrays = {
+                output: np.load(os.path.join(path, f"{output}.npy"), mmap_mode="r")
+                for output in meta["outputs"]
+            }
+        except (OSError, ValueError, KeyError):
+            return None
+        return _Entry(arrays, rows)
+
+
+    def _write_disk(self, key: EntryKey, entry: _Entry, series: _Series) -> _Entry:
+        """
+        Persiste el indicador (archivo temporal + rename) y lo retorna
+        memory-mapped desde el disco.
+        """
+        path = self._entry_dir(key)
+        os.makedirs(path, exist_ok=True)
+        for output, values in entry.arrays.items():
+            tmp_path = os.path.join(path, f"{output}.tmp.npy")
+            np.save(tmp_path, np.ascontiguousarray(values, dtype=np.float64))
+            os.replace(tmp_path, os.path.join(path, f"{output}.npy"))
+
+        meta = {
+            "rows": entry.rows,
+            "digest": series.digests[entry.rows],
+            "prefix_digest": series.digests.get(entry.rows - 1),
+            "outputs": list(entry.arrays)
+        }
+        tmp_meta = os.path.join(path, "meta.json.tmp")
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, os.path.join(path, "meta.json"))
+
+        return _Entry(
+            {output: np.load(os.path.join(path, f"{output}.npy"), mmap_mode="r") for output in entry.arrays},
+            entry.rows
+        )
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# HELPERS
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _window_start(base: pd.DataFrame, df: pd.DataFrame) -> Optional[int]:
+    """
+    Posición de df dentro de base, o None si df no es un tramo contiguo de base.
+    """
+    if len(df) == 0 or len(df) > len(base):
+        return None
+    start = int(base.index.searchsorted(df.index[0]))
+    end = start + len(df)
+    if end > len(base) or base.index[start] != df.index[0] or base.index[end - 1] != df.index[-1]:
+        return None
+    return start
+
+
+def _remove_tree(path: str) -> None:
+    for root, dirs, files in os.walk(path, topdown=False):
+        for name in files:
+            os.remove(os.path.join(root, name))
+        for name in dirs:
+            os.rmdir(os.path.join(root, name))
+    if os.path.isdir(path):
+        os.rmdir(path)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# SINGLETON
+# ═════════════════════════════════════════════════════════════════════════════
+
+_default_cache: Optional[IndicatorCache] = None
+
+
+def get_indicator_cache() -> IndicatorCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = IndicatorCache(
+            max_bytes=settings.indicator_cache_max_mb * 1024 * 1024,
+            cache_dir=settings.indicator_cache_dir or None
+        )
+    return _default_cache
@@ -0,0 +1,343 @@
+"""
+Librería de indicadores técnicos vectorizados
+Cálculo con NumPy/pandas sobre el DataFrame OHLCV de la caché de precios
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class IndicatorSpec:
+    """Definición de un indicador: función, parámetros por defecto y salidas"""
+    name: str
+    function: Callable[..., Dict[str, np.ndarray]]
+    params: Tuple[Tuple[str, float], ...]
+    outputs: Tuple[str, ...]
+    description: str
+    # Barras previas necesarias para recalcular solo la cola (None = siempre completo)
+    warmup: Optional[Callable[..., int]] = None
+
+    @property
+    def default_output(self) -> str:
+        return self.outputs[0]
+
+    def warmup_bars(self, params: Dict[str, float]) -> Optional[int]:
+        return int(math.ceil(self.warmup(**params))) if self.warmup else None
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# HELPERS
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _series(df: pd.DataFrame, column: str) -> pd.Series:
+    return df[column].astype(np.float64)
+
+
+def _ema(values: pd.Series, period: float) -> pd.Series:
+    return values.ewm(span=period, adjust=False).mean()
+
+
+def _wilder(values: pd.Series, period: float) -> pd.Series:
+    # Suavizado de Wilder (RSI, ATR, ADX) = EMA con alpha 1/n
+    return values.ewm(alpha=1.0 / period, adjust=False).mean()
+
+
+# Barras para que el arranque de un suavizado exponencial pese menos de e^-28
+# (~1e-12): así extender la cola coincide con recalcular desde el principio
+_CONVERGENCE = 28
+
+
+def _ema_warmup(period: float) -> float:
+    return _CONVERGENCE * (period + 1) / 2
+
+
+def _wilder_warmup(period: float) -> float:
+    return _CONVERGENCE * period
+
+
+def _true_range(df: pd.DataFrame) -> pd.Series:
+    high, low, close = _series(df, "High"), _series(df, "Low"), _series(df, "Close")
+    prev_close = close.shift(1)
+    return pd.concat([high - low, (high - prev_close).abs(), (low - prev_close).abs()], axis=1).max(axis=1)
+
+
+def _out(**series: pd.Series) -> Dict[str, np.ndarray]:
+    return {name: value.to_numpy(dtype=np.float64) for name, value in series.items()}
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# INDICADORES
+# ═════════════════════════════════════════════════════════════════════════════
+
+def moving_average(df: pd.DataFrame, period: float = 20) -> Dict[str, np.ndarray]:
+    return _out(value=_series(df, "Close").rolling(int(period)).mean())
+
+
+def exponential_moving_average(df: pd.DataFrame, period: float = 20) -> Dict[str, np.ndarray]:
+    return _out(value=_ema(_series(df, "Close"), period))
+
+
+def triple_ema(df: pd.DataFrame, period: float = 20) -> Dict[str, np.ndarray]:
+    ema1 = _ema(_series(df, "Close"), period)
+    ema2 = _ema(ema1, period)
+    ema3 = _ema(ema2, period)
+    return _out(value=3 * ema1 - 3 * ema2 + ema3)
+
+
+def rsi(df: pd.DataFrame, period: float = 14) -> Dict[str, np.ndarray]:
+    delta = _series(df, "Close").diff()
+    gain = _wilder(delta.clip(lower=0), period)
+    loss = _wilder(-delta.clip(upper=0), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = 100 - 100 / (1 + gain / loss)
+    # Sin pérdidas en la ventana → 100
+    value = value.where(loss != 0, 100.0)
+    value.iloc[:int(period)] = np.nan
+    return _out(value=value)
+
+
+def macd(df: pd.DataFrame, fast: float = 12, slow: float = 26, signal: float = 9) -> Dict[str, np.ndarray]:
+    close = _series(df, "Close")
+    line = _ema(close, fast) - _ema(close, slow)
+    signal_line = _ema(line, signal)
+    return _out(macd=line, signal=signal_line, hist=line - signal_line)
+
+
+def bollinger(df: pd.DataFrame, period: float = 20, std: float = 2) -> Dict[str, np.ndarray]:
+    close = _series(df, "Close")
+    middle = close.rolling(int(period)).mean()
+    deviation = close.rolling(int(period)).std(ddof=0)
+    upper = middle + std * deviation
+    lower = middle - std * deviation
+    return _out(
+        middle=middle,
+        upper=upper,
+        lower=lower,
+        width=(upper - lower) / middle,
+        pct_b=(close - lower) / (upper - lower)
+    )
+
+
+def atr(df: pd.DataFrame, period: float = 14) -> Dict[str, np.ndarray]:
+    return _out(value=_wilder(_true_range(df), period))
+
+
+def adx(df: pd.DataFrame, period: float = 14) -> Dict[str, np.ndarray]:
+    high, low = _series(df, "High"), _series(df, "Low")
+    up = high.diff()
+    down = -low.diff()
+    plus_dm = pd.Series(np.where((up > down) & (up > 0), up, 0.0), index=df.index)
+    minus_dm = pd.Series(np.where((down > up) & (down > 0), down, 0.0), index=df.index)
+
+    tr = _wilder(_true_range(df), period)
+    plus_di = 100 * _wilder(plus_dm, period) / tr
+    minus_di = 100 * _wilder(minus_dm, period) / tr
+    dx = 100 * (plus_di - minus_di).abs() / (plus_di + minus_di)
+    return _out(adx=_wilder(dx.fillna(0), period), plus_di=plus_di, minus_di=minus_di)
+
+
+def stochastic(df: pd.DataFrame, k: float = 14, d: float = 3, smooth: float = 3) -> Dict[str, np.ndarray]:
+    close = _series(df, "Close")
+    lowest = _series(df, "Low").rolling(int(k)).min()
+    highest = _series(df, "High").rolling(int(k)).max()
+    raw_k = 100 * (close - lowest) / (highest - lowest)
+    slow_k = raw_k.rolling(int(smooth)).mean()
+    return _out(k=slow_k, d=slow_k.rolling(int(d)).mean())
+
+
+def cci(df: pd.DataFrame, period: float = 20) -> Dict[str, np.ndarray]:
+    typical = (_series(df, "High") + _series(df, "Low") + _series(df, "Close")) / 3
+    window = int(period)
+    mean = typical.rolling(window).mean()
+
+    # Desviación media absoluta por ventana, con una vista (n, window) sin copias
+    mad = np.full(len(typical), np.nan)
+    if len(typical) >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(typical.to_numpy(), window)
+        mad[window - 1:] = np.abs(windows - windows.mean(axis=1, keepdims=True)).mean(axis=1)
+    return _out(value=(typical - mean) / (0.015 * pd.Series(mad, index=typical.index)))
+
+
+def mfi(df: pd.DataFrame, period: float = 14) -> Dict[str, np.ndarray]:
+    typical = (_series(df, "High") + _series(df, "Low") + _series(df, "Close")) / 3
+    flow = typical * _series(df, "Volume")
+    direction = typical.diff()
+    positive = flow.where(direction > 0, 0.0).rolling(int(period)).sum()
+    negative = flow.where(direction < 0, 0.0).rolling(int(period)).sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = 100 - 100 / (1 + positive / negative)
+    return _out(value=value.where(negative != 0, 100.0).where(positive.notna()))
+
+
+def kdj(df: pd.DataFrame, period: float = 9, k: float = 3, d: float = 3) -> Dict[str, np.ndarray]:
+    close = _series(df, "Close")
+    lowest = _series(df, "Low").rolling(int(period)).min()
+    highest = _series(df, "High").rolling(int(period)).max()
+    rsv = 100 * (close - lowest) / (highest - lowest)
+    k_line = rsv.ewm(alpha=1.0 / k, adjust=False).mean()
+    d_line = k_line.ewm(alpha=1.0 / d, adjust=False).mean()
+    return _out(k=k_line, d=d_line, j=3 * k_line - 2 * d_line)
+
+
+def rvi(df: pd.DataFrame, period: float = 10) -> Dict[str, np.ndarray]:
+    open_, close = _series(df, "Open"), _series(df, "Close")
+    high, low = _series(df, "High"), _series(df, "Low")
+
+    def swma(values: pd.Series) -> pd.Series:
+        # Media ponderada simétrica 1-2-2-1
+        return (values + 2 * values.shift(1) + 2 * values.shift(2) + values.shift(3)) / 6
+
+    numerator = swma(close - open_).rolling(int(period)).sum()
+    denominator = swma(high - low).rolling(int(period)).sum()
+    value = numerator / denominator
+    return _out(value=value, signal=swma(value))
+
+
+def ichimoku(df: pd.DataFrame, tenkan: float = 9, kijun: float = 26, senkou: float = 52) -> Dict[str, np.ndarray]:
+    high, low = _series(df, "High"), _series(df, "Low")
+
+    def midpoint(period: float) -> pd.Series:
+        return (high.rolling(int(period)).max() + low.rolling(int(period)).min()) / 2
+
+    tenkan_line = midpoint(tenkan)
+    kijun_line = midpoint(kijun)
+    # Las nubes se proyectan kijun barras adelante: en la barra t se ve la
+    # nube calculada en t - kijun (sin mirar al futuro)
+    senkou_a = ((tenkan_line + kijun_line) / 2).shift(int(kijun))
+    senkou_b = midpoint(senkou).shift(int(kijun))
+    return _out(tenkan=tenkan_line, kijun=kijun_line, senkou_a=senkou_a, senkou_b=senkou_b)
+
+
+def parabolic_sar(df: pd.DataFrame, step: float = 0.02, max_step: float = 0.2) -> Dict[str, np.ndarray]:
+    """
+    Parabolic SAR. Es recursivo por naturaleza (cada valor depende del
+    anterior y del cambio de tendencia), así que se recorre una sola vez
+    sobre arrays NumPy.
+    """
+    high = df["High"].to_numpy(dtype=np.float64)
+    low = df["Low"].to_numpy(dtype=np.float64)
+    n = len(high)
+    sar = np.full(n, np.nan)
+    if n < 2:
+        return {"value": sar}
+
+    rising = high[1] >= high[0]
+    extreme = high[0] if rising else low[0]
+    current = low[0] if rising else high[0]
+    factor = step
+
+    for i in range(1, n):
+        current = current + factor * (extreme - current)
+        if rising:
+            current = min(current, low[i - 1], low[i - 2] if i > 1 else low[i - 1])
+            if low[i] < current:
+                rising, current, extreme, factor = False, extreme, low[i], step
+            elif high[i] > extreme:
+                extreme, factor = high[i], min(factor + step, max_step)
+        else:
+            current = max(current, high[i - 1], high[i - 2] if i > 1 else high[i - 1])
+            if high[i] > current:
+                rising, current, extreme, factor = True, extreme, high[i], step
+            elif low[i] < extreme:
+                extreme, factor = low[i], min(factor + step, max_step)
+        sar[i] = current
+
+    return {"value": sar, "trend": np.where(np.isnan(sar), np.nan, (df["Close"].to_numpy() > sar).astype(np.float64))}
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# REGISTRO
+# ═════════════════════════════════════════════════════════════════════════════
+
+INDICATORS: Dict[str, IndicatorSpec] = {
+    spec.name: spec for spec in (
+        IndicatorSpec("MA", moving_average, (("period", 20),), ("value",), "Media móvil simple",
+                      warmup=lambda period: period),
+        IndicatorSpec("EMA", exponential_moving_average, (("period", 20),), ("value",), "Media móvil exponencial",
+                      warmup=_ema_warmup),
+        IndicatorSpec("TEMA", triple_ema, (("period", 20),), ("value",), "Triple EMA",
+                      warmup=lambda period: 3 * _ema_warmup(period)),
+        IndicatorSpec("RSI", rsi, (("period", 14),), ("value",), "Relative Strength Index",
+                      warmup=lambda period: _wilder_warmup(period) + 1),
+        IndicatorSpec("MACD", macd, (("fast", 12), ("slow", 26), ("signal", 9)), ("macd", "signal", "hist"), "MACD",
+                      warmup=lambda fast, slow, signal: _ema_warmup(max(fast, slow)) + _ema_warmup(signal)),
+        IndicatorSpec("BOLLINGER", bollinger, (("period", 20), ("std", 2.0)),
+                      ("middle", "upper", "lower", "width", "pct_b"), "Bandas de Bollinger",
+                      warmup=lambda period, std: period),
+        IndicatorSpec("ATR", atr, (("period", 14),), ("value",), "Average True Range",
+                      warmup=lambda period: _wilder_warmup(period) + 1),
+        IndicatorSpec("ADX", adx, (("period", 14),), ("adx", "plus_di", "minus_di"), "Average Directional Index",
+                      warmup=lambda period: 2 * _wilder_warmup(period) + 1),
+        IndicatorSpec("STOCHASTIC", stochastic, (("k", 14), ("d", 3), ("smooth", 3)), ("k", "d"), "Oscilador estocástico",
+                      warmup=lambda k, d, smooth: k + d + smooth),
+        IndicatorSpec("CCI", cci, (("period", 20),), ("value",), "Commodity Channel Index",
+                      warmup=lambda period: period),
+        IndicatorSpec("MFI", mfi, (("period", 14),), ("value",), "Money Flow Index",
+                      warmup=lambda period: period + 1),
+        IndicatorSpec("KDJ", kdj, (("period", 9), ("k", 3), ("d", 3)), ("k", "d", "j"), "KDJ",
+                      warmup=lambda period, k, d: period + _wilder_warmup(k) + _wilder_warmup(d)),
+        IndicatorSpec("RVI", rvi, (("period", 10),), ("value", "signal"), "Relative Vigor Index",
+                      warmup=lambda period: period + 6),
+        IndicatorSpec("ICHIMOKU", ichimoku, (("tenkan", 9), ("kijun", 26), ("senkou", 52)),
+                      ("tenkan", "kijun", "senkou_a", "senkou_b"), "Ichimoku Kinko Hyo",
+                      warmup=lambda tenkan, kijun, senkou: max(tenkan, kijun, senkou) + kijun),
+        # Dependiente de toda la trayectoria: sin cálculo incremental
+        IndicatorSpec("PSAR", parabolic_sar, (("step", 0.02), ("max_step", 0.2)), ("value", "trend"), "Parabolic SAR"),
+    )
+}
+
+ALIASES = {
+    "SMA": "MA",
+    "BB": "BOLLINGER",
+    "BANDS": "BOLLINGER",
+    "STOCH": "STOCHASTIC",
+    "SAR": "PSAR",
+}
+
+
+def resolve_indicator(name: str) -> IndicatorSpec:
+    key = name.upper()
+    key = ALIASES.get(key, key)
+    if key not in INDICATORS:
+        raise ValueError(f"Indicador desconocido: {name}. Disponibles: {', '.join(INDICATORS)}")
+    return INDICATORS[key]
+
+
+def bind_params(spec: IndicatorSpec, args: List[float]) -> Dict[str, float]:
+    """
+    Asigna argumentos posicionales a los parámetros del indicador
+    (los que falten toman el valor por defecto). Los periodos se mantienen
+    enteros para que RSI y RSI(14) compartan la misma clave.
+    """
+    if len(args) > len(spec.params):
+        raise ValueError(f"{spec.name} acepta como máximo {len(spec.params)} parámetros")
+    params = dict(spec.params)
+    for (name, default), value in zip(spec.params, args):
+        if isinstance(default, int):
+            if value != int(value) or value < 1:
+                raise ValueError(f"El parámetro {name} de {spec.name} debe ser un entero positivo")
+            value = int(value)
+        params[name] = value if isinstance(default, int) else float(value)
+    return params
+
+
+def compute_indicator(df: pd.DataFrame, name: str, params: Dict[str, float]) -> Dict[str, np.ndarray]:
+    spec = resolve_indicator(name)
+    return spec.function(df, **params)
+
+
+def describe_indicators() -> List[Dict]:
+    return [
+        {
+            "name": spec.name,
+            "params": dict(spec.params),
+            "outputs": list(spec.outputs),
+            "description": spec.description
+        }
+        for spec in INDICATORS.values()
+    ]
@@ -0,0 +1,254 @@
+"""
+Repositorio de trabajos de backtest
+Acceso a la tabla backtest_jobs, que hace de cola persistente
+"""
+
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, or_, select, update
+
+from app.database import SessionLocal
+from app.models import BacktestJob
+
+
+JOB_STATUSES = ("queued", "running", "completed", "failed", "cancelled")
+
+
+def _to_dict(job: BacktestJob) -> Dict:
+    return {
+        "job_id": job.id,
+        "user": job.user,
+        "priority": job.priority,
+        "status": job.status,
+        "symbol": job.request.get("symbol"),
+        "timeframe": job.request.get("timeframe"),
+        "progress_pct": round(job.progress_pct, 2),
+        "cancel_requested": job.cancel_requested,
+        "result_id": job.result_id,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "claimed_by": job.claimed_by,
+        "heartbeat_at": job.heartbeat_at.isoformat() if job.heartbeat_at else None
+    }
+
+
+async def create_job(user: str, priority: int, request: Dict) -> Dict:
+    async with SessionLocal() as session:
+        async with session.begin():
+            job = BacktestJob(
+                id=uuid.uuid4().hex,
+                user=user,
+                priority=priority,
+                status="queued",
+                request=request,
+                progress_pct=0.0,
+                cancel_requested=False,
+                created_at=datetime.now()
+            )
+            session.add(job)
+        return _to_dict(job)
+
+
+async def get_job(job_id: str) -> Optional[Dict]:
+    async with SessionLocal() as session:
+        job = await session.get(BacktestJob, job_id)
+        return _to_dict(job) if job else None
+
+
+async def get_job_request(job_id: str) -> Optional[Dict]:
+    async with SessionLocal() as session:
+        return await session.scalar(select(BacktestJob.request).where(BacktestJob.id == job_id))
+
+
+async def list_jobs(
+    user: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0
+) -> List[Dict]:
+    """
+    Trabajos más recientes primero, filtrando por usuario y estado.
+    """
+    if status is not None and status not in JOB_STATUSES:
+        raise ValueError(f"status debe ser uno de: {', '.join(JOB_STATUSES)}")
+
+    query = select(BacktestJob)
+    if user:
+        query = query.where(BacktestJob.user == user)
+    if status:
+        query = query.where(BacktestJob.status == status)
+    query = query.order_by(BacktestJob.created_at.desc(), BacktestJob.id).limit(limit).offset(offset)
+
+    async with SessionLocal() as session:
+        return [_to_dict(job) for job in await session.scalars(query)]
+
+
+async def claim_next_job(claimed_by: str, max_per_user: int = 0) -> Optional[str]:
+    """
+    Pasa a running el siguiente trabajo de la cola, con el lease a nombre de
+    claimed_by, y retorna su id.
+
+    Orden: mayor prioridad; a igual prioridad, el usuario con menos trabajos
+    en ejecución y, entre esos, el que arrancó hace más tiempo el último de
+    ellos (reparto justo entre usuarios); por último el trabajo más antiguo.
+    Las cuentas por usuario solo miran los trabajos activos (queued/running),
+    no todo el histórico de la tabla.
+    Con max_per_user > 0 se saltan los usuarios que ya tienen ese número de
+    trabajos corriendo. El UPDATE condicionado a status = queued hace que
+    dos workers (o dos procesos) nunca reclamen el mismo trabajo.
+    """
+    users = (
+        select(
+            BacktestJob.user,
+            func.sum(case((BacktestJob.status == "running", 1), else_=0)).label("running"),
+            func.max(BacktestJob.started_at).label("last_started")
+        )
+        .where(BacktestJob.status.in_(("queued", "running")))
+        .group_by(BacktestJob.user)
+        .subquery()
+    )
+    running_count = users.c.running
+    query = (
+        select(BacktestJob.id)
+        .join(users, users.c.user == BacktestJob.user)
+        .where(BacktestJob.status == "queued")
+        .order_by(
+            BacktestJob.priority.desc(),
+            running_count,
+            users.c.last_started.asc().nulls_first(),
+            BacktestJob.created_at,
+            BacktestJob.id
+        )
+        .limit(1)
+    )
+    if max_per_user > 0:
+        query = query.where(running_count < max_per_user)
+
+    async with SessionLocal() as session:
+        async with session.begin():
+            job_id = await session.scalar(query)
+            if job_id is None:
+                return None
+            now = datetime.now()
+            claimed = await session.execute(
+                update(BacktestJob)
+                .where(BacktestJob.id == job_id, BacktestJob.status == "queued")
+                .values(
+                    status="running", started_at=now, progress_pct=0.0,
+                    claimed_by=claimed_by, heartbeat_at=now
+                )
+            )
+        return job_id if claimed.rowcount else None
+
+
+def _leased(job_id: str, claimed_by: str):
+    # Trabajo en ejecución cuyo lease sigue a nombre de claimed_by
+    return (
+        BacktestJob.id == job_id,
+        BacktestJob.status == "running",
+        BacktestJob.claimed_by == claimed_by
+    )
+
+
+async def update_progress(job_id: str, claimed_by: str, progress_pct: float) -> Tuple[bool, bool]:
+    """
+    Guarda el progreso y renueva el lease de claimed_by.
+
+    Returns:
+        (lease conservado, cancelación pedida). Sin lease (caducó y el
+        trabajo volvió a la cola o lo reclamó otro worker) no se escribe nada
+        y el worker debe dejar el trabajo.
+    """
+    async with SessionLocal() as session:
+        async with session.begin():
+            renewed = await session.execute(
+                update(BacktestJob)
+                .where(*_leased(job_id, claimed_by))
+                .values(progress_pct=progress_pct, heartbeat_at=datetime.now())
+            )
+            if not renewed.rowcount:
+                return False, False
+            return True, bool(await session.scalar(
+                select(BacktestJob.cancel_requested).where(BacktestJob.id == job_id)
+            ))
+
+
+async def finish_job(
+    job_id: str,
+    claimed_by: str,
+    status: str,
+    result_id: Optional[int] = None,
+    error: Optional[str] = None
+) -> bool:
+    """
+    Cierra el trabajo si claimed_by conserva el lease y retorna si lo cerró.
+    """
+    values = {"status": status, "result_id": result_id, "error": error, "finished_at": datetime.now()}
+    if status == "completed":
+        values["progress_pct"] = 100.0
+    async with SessionLocal() as session:
+        async with session.begin():
+            finished = await session.execute(
+                update(BacktestJob).where(*_leased(job_id, claimed_by)).values(**values)
+            )
+        return bool(finished.rowcount)
+
+
+async def requeue_job(job_id: str, claimed_by: str) -> bool:
+    """
+    Devuelve a la cola un trabajo en ejecución de claimed_by (pool lleno o
+    apagado) y retorna si lo devolvió.
+    """
+    async with SessionLocal() as session:
+        async with session.begin():
+            requeued = await session.execute(
+                update(BacktestJob)
+                .where(*_leased(job_id, claimed_by))
+                .values(status="queued", started_at=None, progress_pct=0.0, claimed_by=None, heartbeat_at=None)
+            )
+        return bool(requeued.rowcount)
+
+
+async def requeue_expired_jobs(lease_seconds: float) -> int:
+    """
+    Devuelve a la cola los trabajos en running cuyo lease caducó (el proceso
+    que los ejecutaba se paró o murió sin devolverlos). Los que siguen vivos
+    en otros procesos renuevan su latido y no se tocan.
+    """
+    expired = datetime.now() - timedelta(seconds=lease_seconds)
+    async with SessionLocal() as session:
+        async with session.begin():
+            requeued = await session.execute(
+                update(BacktestJob)
+                .where(
+                    BacktestJob.status == "running",
+                    or_(BacktestJob.heartbeat_at.is_(None), BacktestJob.heartbeat_at < expired)
+                )
+                .values(status="queued", started_at=None, progress_pct=0.0, claimed_by=None, heartbeat_at=None)
+            )
+        return requeued.rowcount
+
+
+async def request_cancel(job_id: str) -> Optional[Dict]:
+    """
+    Cancela un trabajo en cola al momento; uno en ejecución queda marcado y
+    el worker lo detiene en el siguiente punto de control.
+
+    Returns:
+        Trabajo actualizado, o None si no existe
+    """
+    async with SessionLocal() as session:
+        async with session.begin():
+            job = await session.get(BacktestJob, job_id)
+            if job is None:
+                return None
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished_at = datetime.now()
+            elif job.status == "running":
+                job.cancel_requested = True
+        return _to_dict(job)
@@ -0,0 +1,381 @@
+"""
+Métricas de backtest en una sola pasada
+Acumulador online que se actualiza por barra, por tramo o por trade y que
+se puede combinar (merge) con el de un tramo posterior, sin guardar la
+curva de equity completa
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+
+# Periodos por año por defecto (retornos diarios de acciones); con
+# calendars.ReturnGrid se usan los del timeframe y el mercado reales
+PERIODS_PER_YEAR = 252
+
+# Barras que update_equity procesa de una vez: acota sus temporales
+BLOCK_BARS = 1 << 16
+
+
+class MetricsAccumulator:
+    """
+    Acumulador de métricas financieras:
+    - Retornos entre niveles consecutivos (por barra o sobre la rejilla del
+      calendario): media y M2 (Welford/Chan) para Sharpe y suma de cuadrados
+      negativos para Sortino.
+    - Drawdown: pico, peor equity/pico y la "escalera" de máximos con el
+      mínimo posterior a cada uno, que es lo que permite combinar tramos de
+      forma exacta (solo se guardan los máximos que pueden decidir el
+      drawdown de un tramo anterior: pocos frente al número de barras).
+    - Trades: recuento, ganadores, ganancias/pérdidas brutas y duración.
+    - Exposición: barras con posición abierta.
+    """
+
+    def __init__(self, initial_capital: float, periods_per_year: float = PERIODS_PER_YEAR):
+        self.initial_capital = initial_capital
+        self.periods_per_year = periods_per_year
+        # Equity
+        self.bars = 0
+        self.last_equity: Optional[float] = None
+        self.peak = -np.inf
+        self.worst_ratio = 1.0
+        self.highs = np.empty(0)
+        self.lows = np.empty(0)
+        self.exposure_bars = 0
+        # Retornos entre niveles consecutivos (la equity por barra o sobre la
+        # rejilla del calendario, ver calendars.ReturnGrid)
+        self.first_level: Optional[float] = None
+        self.last_level: Optional[float] = None
+        self.returns = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.downside_sq = 0.0
+        # Trades
+        self.trades = 0
+        self.wins = 0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.duration_bars = 0
+        self.timed_trades = 0
+
+    # ═════════════════════════════════════════════════════════════════════════
+    # ACTUALIZACIÓN
+    # ═════════════════════════════════════════════════════════════════════════
+
+    def add_bar(self, equity: float, in_position: bool = False) -> None:
+        """
+        Añade una barra sobre el estado escalar (sin arrays temporales).
+        """
+        equity = float(equity)
+        if not self.bars:
+            self.peak = equity
+            self.highs, self.lows = np.array([equity]), np.array([equity])
+        elif equity > self.peak:
+            # Nuevo máximo: un último escalón intermedio sin caída se reutiliza
+            if len(self.highs) > 1 and self.lows[-1] >= self.highs[-1]:
+                self.highs[-1] = self.lows[-1] = equity
+            else:
+                self.highs, self.lows = np.append(self.highs, equity), np.append(self.lows, equity)
+            self.peak = equity
+        else:
+            self.worst_ratio = min(self.worst_ratio, equity / self.peak)
+            if equity < self.lows[-1]:
+                self.lows[-1] = equity
+                if len(self.lows) > 1 and self.lows[-2] >= equity:
+                    self.highs, self.lows = _prune(self.highs, self.lows)
+        self.bars += 1
+        self.last_equity = equity
+        self.exposure_bars += int(in_position)
+
+        # Welford
+        if self.last_level is None:
+            self.first_level = equity
+        else:
+            ret = equity / self.last_level - 1
+            self.returns += 1
+            delta = ret - self.mean
+            self.mean += delta / self.returns
+            self.m2 += delta * (ret - self.mean)
+            if ret < 0:
+                self.downside_sq += ret * ret
+        self.last_level = equity
+
+    def add_trade(self, profit: float, duration_bars: Optional[int] = None) -> None:
+        self.update_trades(
+            np.array([profit], dtype=np.float64),
+            None if duration_bars is None else np.array([duration_bars])
+        )
+
+    def update_equity(self, equity: np.ndarray, exposure_bars: int = 0, levels: Optional[np.ndarray] = None) -> None:
+        """
+        Añade un tramo consecutivo de la curva de equity (vectorizado, en
+        bloques de BLOCK_BARS que se pliegan sobre el estado acumulado).
+
+        Args:
+            equity: Equity por barra del tramo
+            exposure_bars: Barras del tramo con posición abierta
+            levels: Equity sobre la rejilla de retornos (default: la de cada barra)
+        """
+        equity = np.asarray(equity, dtype=np.float64)
+        levels = equity if levels is None else np.asarray(levels, dtype=np.float64)
+        for start in range(0, len(equity), BLOCK_BARS):
+            self._fold_equity(equity[start:start + BLOCK_BARS])
+        if len(equity):
+            self.exposure_bars += exposure_bars
+        self.update_levels(levels)
+
+    def update_levels(self, levels: np.ndarray) -> None:
+        """
+        Añade solo niveles de la rejilla de retornos (p. ej. el último punto
+        pendiente de ReturnGrid.finish()).
+        """
+        levels = np.asarray(levels, dtype=np.float64)
+        for start in range(0, len(levels), BLOCK_BARS):
+            self._fold_levels(levels[start:start + BLOCK_BARS])
+
+    def update_trades(self, profits: np.ndarray, durations: Optional[np.ndarray] = None) -> None:
+        """
+        Args:
+            profits: Beneficio de cada trade cerrado
+            durations: Barras entre entrada y salida de cada trade (opcional)
+        """
+        profits = np.asarray(profits, dtype=np.float64)
+        self.trades += len(profits)
+        self.wins += int(np.count_nonzero(profits > 0))
+        self.gross_profit += float(profits[profits > 0].sum())
+        self.gross_loss += float(-profits[profits < 0].sum())
+        if durations is not None:
+            self.duration_bars += int(np.sum(durations))
+            self.timed_trades += len(durations)
+
+    def update_simulation(self, sim, levels: Optional[np.ndarray] = None) -> None:
+        """
+        Añade el resultado de simulate() (un tramo o la serie completa).
+        """
+        self.update_equity(sim.equity, sim.exposure_bars, levels)
+        self.update_trades(sim.trades['profit'], sim.trades['exit_index'] - sim.trades['entry_index'])
+
+    def merge(self, other: "MetricsAccumulator") -> "MetricsAccumulator":
+        """
+        Combina con el acumulador de las barras inmediatamente posteriores
+        (p. ej. tramos calculados en paralelo). El resultado es exacto: el
+        mismo que si se hubieran añadido todas las barras en orden.
+        """
+        self._merge_equity(other)
+        self._merge_levels(other)
+        self.trades += other.trades
+        self.wins += other.wins
+        self.gross_profit += other.gross_profit
+        self.gross_loss += other.gross_loss
+        self.duration_bars += other.duration_bars
+        self.timed_trades += other.timed_trades
+        return self
+
+    # ═════════════════════════════════════════════════════════════════════════
+    # RESULTADO
+    # ═════════════════════════════════════════════════════════════════════════
+
+    def result(self) -> Dict:
+        """
+        Métricas con lo acumulado hasta ahora (se puede llamar a mitad de
+        ejecución para mostrar métricas en vivo).
+
+        Returns:
+            Dict con: total_return_pct, sharpe_ratio, max_drawdown_pct,
+            win_rate_pct, profit_factor, sortino_ratio, calmar_ratio,
+            exposure_pct, avg_trade_duration_bars. profit_factor es None si
+            hay ganancias sin ninguna pérdida (como en monte_carlo)
+        """
+        annualization = np.sqrt(self.periods_per_year)
+        total_return_pct = (
+            (self.last_equity - self.initial_capital) / self.initial_capital * 100
+            if self.bars else 0
+        )
+        max_drawdown_pct = (self.worst_ratio - 1) * 100
+
+        std = np.sqrt(self.m2 / self.returns) if self.returns else 0
+        sharpe_ratio = self.mean / std * annualization if std > 0 else 0
+
+        downside = np.sqrt(self.downside_sq / self.returns) if self.returns else 0
+        sortino_ratio = self.mean / downside * annualization if downside > 0 else 0
+
+        calmar_ratio = 0
+        if self.returns and max_drawdown_pct < 0 and self.last_equity > 0:
+            years = self.returns / self.periods_per_year
+            with np.errstate(over="ignore"):
+                growth = np.float64(self.last_equity / self.initial_capital) ** (1 / years)
+            calmar_ratio = (growth - 1) * 100 / abs(max_drawdown_pct)
+            if not np.isfinite(calmar_ratio):
+                calmar_ratio = 0
+
+        if self.trades:
+            win_rate_pct = self.wins / self.trades * 100
+            if self.gross_loss > 0:
+                profit_factor = self.gross_profit / self.gross_loss
+            else:
+                profit_factor = None if self.gross_profit > 0 else 0
+        else:
+            win_rate_pct = 0
+            profit_factor = 0
+
+        exposure_pct = self.exposure_bars / self.bars * 100 if self.bars else 0
+        avg_trade_duration = self.duration_bars / self.timed_trades if self.timed_trades else 0
+
+        return {
+            "total_return_pct": round(float(total_return_pct), 2),
+            "sharpe_ratio": round(float(sharpe_ratio), 2),
+            "max_drawdown_pct": round(float(max_drawdown_pct), 2),
+            "win_rate_pct": round(float(win_rate_pct), 2),
+            "profit_factor": None if profit_factor is None else round(float(profit_factor), 2),
+            "sortino_ratio": round(float(sortino_ratio), 2),
+            "calmar_ratio": round(float(calmar_ratio), 2),
+            "exposure_pct": round(float(exposure_pct), 2),
+            "avg_trade_duration_bars": round(float(avg_trade_duration), 2)
+        }
+
+    # ═════════════════════════════════════════════════════════════════════════
+    # INTERNOS
+    # ═════════════════════════════════════════════════════════════════════════
+
+    def _fold_equity(self, equity: np.ndarray) -> None:
+        # Cada nuevo máximo abre un escalón; su mínimo es el de las barras hasta el siguiente
+        if not len(equity):
+            return
+        running_max = np.maximum.accumulate(equity)
+        rising = np.empty(len(equity), dtype=bool)
+        rising[0] = True
+        np.greater(running_max[1:], running_max[:-1], out=rising[1:])
+        starts = np.flatnonzero(rising)
+        highs = running_max[starts]
+        lows = np.minimum.reduceat(equity, starts)
+
+        if self.bars:
+            self._merge_stairs(highs, lows)
+        else:
+            self.peak = float(highs[-1])
+            self.worst_ratio = float(np.min(lows / highs))
+            self.highs, self.lows = _prune(highs, lows)
+        self.bars += len(equity)
+        self.last_equity = float(equity[-1])
+
+    def _fold_levels(self, levels: np.ndarray) -> None:
+        if not len(levels):
+            return
+        if self.last_level is None:
+            self.first_level = float(levels[0])
+            count = len(levels) - 1
+        else:
+            count = len(levels)
+        if count:
+            # Retornos del bloque (con el del último nivel propio al primero)
+            returns = np.empty(count)
+            np.divide(levels[1:], levels[:-1], out=returns[count - len(levels) + 1:])
+            if count == len(levels):
+                returns[0] = levels[0] / self.last_level
+            returns -= 1
+            negative = np.minimum(returns, 0.0)
+            mean = float(returns.mean())
+            # M2 sobre el mismo buffer, sin el temporal (returns - mean) ** 2
+            returns -= mean
+            self._add_moments(count, mean, float(returns @ returns), float(negative @ negative))
+        self.last_level = float(levels[-1])
+
+    def _merge_levels(self, other: "MetricsAccumulator") -> None:
+        if other.first_level is None:
+            return
+        if self.last_level is not None:
+            # Retorno entre el último nivel propio y el primero del otro tramo
+            boundary = other.first_level / self.last_level - 1
+            self._add_moments(1, boundary, 0.0, boundary ** 2 if boundary < 0 else 0.0)
+        else:
+            self.first_level = other.first_level
+        self._add_moments(other.returns, other.mean, other.m2, other.downside_sq)
+        self.last_level = other.last_level
+
+    def _merge_equity(self, other: "MetricsAccumulator") -> None:
+        if not other.bars:
+            return
+        if self.bars:
+            self._merge_stairs(other.highs, other.lows)
+        else:
+            self.peak, self.worst_ratio = other.peak, other.worst_ratio
+            self.highs, self.lows = other.highs.copy(), other.lows.copy()
+        self.bars += other.bars
+        self.last_equity = other.last_equity
+        self.exposure_bars += other.exposure_bars
+
+    def _merge_stairs(self, highs: np.ndarray, lows: np.ndarray) -> None:
+        # Drawdown de las barras posteriores respecto al pico acumulado: los
+        # escalones por debajo del pico se miden contra él
+        below = highs <= self.peak
+        if below.any():
+            trough = float(lows[below].min())
+            self.worst_ratio = min(self.worst_ratio, trough / self.peak)
+            self.lows[-1] = min(self.lows[-1], trough)
+        above = ~below
+        if above.any():
+            self.worst_ratio = min(self.worst_ratio, float(np.min(lows[above] / highs[above])))
+            self.highs, self.lows = _prune(
+                np.concatenate((self.highs, highs[above])),
+                np.concatenate((self.lows, lows[above]))
+            )
+            self.peak = max(self.peak, float(highs[-1]))
+        elif len(self.lows) > 1 and self.lows[-2] >= self.lows[-1]:
+            self.highs, self.lows = _prune(self.highs, self.lows)
+
+    def _add_moments(self, count: int, mean: float, m2: float, downside_sq: float) -> None:
+        if not count:
+            return
+        total = self.returns + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.returns * count / total
+        self.downside_sq += downside_sq
+        self.returns = total
+
+
+def _prune(highs: np.ndarray, lows: np.ndarray):
+    """
+    Quita escalones que no pueden fijar el drawdown al combinar con un tramo
+    anterior: los que tienen un escalón posterior (más alto) con mínimo igual
+    o menor, y los intermedios sin caída (mínimo == máximo), que siempre
+    quedan por detrás del primero.
+    """
+    if len(highs) <= 1:
+        return highs.copy(), lows.copy()
+    later_min = np.minimum.accumulate(lows[::-1])[::-1]
+    keep = np.concatenate((lows[:-1] < later_min[1:], [True]))
+    highs, lows = highs[keep], lows[keep]
+    flat = lows >= highs
+    flat[0] = flat[-1] = False
+    return highs[~flat], lows[~flat]
+
+
+def compute_metrics(
+    trades: Dict[str, np.ndarray],
+    equity: np.ndarray,
+    initial_capital: float,
+    exposure_bars: int = 0,
+    grid_positions: Optional[np.ndarray] = None,
+    periods_per_year: float = PERIODS_PER_YEAR
+) -> Dict:
+    """
+    Métricas de una curva de equity y sus trades en una sola pasada.
+
+    Args:
+        trades: Columnas de trades de simulate() (basta con 'profit')
+        equity: Equity por barra
+        initial_capital: Capital inicial
+        exposure_bars: Barras con posición abierta
+        grid_positions: Barras que forman la rejilla de retornos
+                        (ReturnGrid.positions(); default: todas)
+        periods_per_year: Periodos por año de esa rejilla
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    levels = None if grid_positions is None else equity[grid_positions]
+    accumulator = MetricsAccumulator(initial_capital, periods_per_year)
+    accumulator.update_equity(equity, exposure_bars, levels)
+    durations = trades["exit_index"] - trades["entry_index"] if "entry_index" in trades else None
+    accumulator.update_trades(trades["profit"], durations)
+    return accumulator.result()
@@ -0,0 +1,151 @@
+"""
+Análisis de robustez Monte Carlo sobre la lista de trades
+Remuestrea los trades (bootstrap con reemplazo o permutación del orden) en
+una matriz simulaciones x trades, por lotes para acotar la memoria
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+
+
+MONTE_CARLO_METHODS = ("bootstrap", "permutation")
+
+
+def trade_growth(trades: List[Dict], initial_capital: float) -> np.ndarray:
+    """
+    Factor de crecimiento del capital en cada trade (1 + beneficio / capital
+    antes del trade). Los trades del motor son secuenciales y su tamaño es
+    proporcional al capital, así que remuestrear factores conserva el sizing.
+    """
+    profits = np.array([float(trade.get("profit", 0.0)) for trade in trades], dtype=np.float64)
+    capital_before = initial_capital + np.concatenate(([0.0], np.cumsum(profits)[:-1]))
+    if np.any(capital_before <= 0):
+        raise ValueError("La lista de trades deja el capital en cero o negativo")
+    return 1 + profits / capital_before
+
+
+def _resample(growth: np.ndarray, rng: np.random.Generator, count: int, method: str) -> np.ndarray:
+    """
+    Matriz (count, n) de factores remuestreados: una simulación por fila.
+    """
+    n = len(growth)
+    if method == "bootstrap":
+        return growth[rng.integers(0, n, size=(count, n))]
+    return rng.permuted(np.tile(growth, (count, 1)), axis=1)
+
+
+def _path_stats(samples: np.ndarray, initial_capital: float) -> Dict[str, np.ndarray]:
+    """
+    Retorno, drawdown máximo y profit factor de cada fila de factores
+    (inf en las filas sin pérdidas).
+    """
+    # Equity tras cada trade (con el capital inicial como primer punto)
+    equity = np.empty((samples.shape[0], samples.shape[1] + 1))
+    equity[:, 0] = initial_capital
+    np.cumprod(samples, axis=1, out=equity[:, 1:])
+    equity[:, 1:] *= initial_capital
+
+    peaks = np.maximum.accumulate(equity, axis=1)
+    max_drawdown = np.min(equity / peaks, axis=1) - 1
+
+    profits = equity[:, :-1] * (samples - 1)
+    gross_profit = np.where(profits > 0, profits, 0).sum(axis=1)
+    gross_loss = -np.where(profits < 0, profits, 0).sum(axis=1)
+    profit_factor = np.divide(
+        gross_profit, gross_loss, out=np.full_like(gross_profit, np.inf), where=gross_loss > 0
+    )
+
+    return {
+        "total_return_pct": (equity[:, -1] / initial_capital - 1) * 100,
+        "max_drawdown_pct": max_drawdown * 100,
+        "profit_factor": profit_factor
+    }
+
+
+def _distribution(values: np.ndarray, confidence: float) -> Optional[Dict]:
+    if not len(values):
+        return None
+    tail = (1 - confidence) / 2 * 100
+    low, median, high = np.percentile(values, [tail, 50, 100 - tail])
+    return {
+        "mean": round(float(values.mean()), 2),
+        "median": round(float(median), 2),
+        "std": round(float(values.std()), 2),
+        "ci_low": round(float(low), 2),
+        "ci_high": round(float(high), 2),
+        "worst": round(float(values.min()), 2),
+        "best": round(float(values.max()), 2)
+    }
+
+
+def run_monte_carlo(
+    trades: List[Dict],
+    initial_capital: float,
+    simulations: int = 10000,
+    method: str = "bootstrap",
+    confidence: float = 0.95,
+    seed: Optional[int] = None
+) -> Dict:
+    """
+    Distribución de retorno, drawdown máximo y profit factor bajo
+    remuestreo de los trades. Síncrono (se ejecuta en el pool).
+
+    Args:
+        trades: Trades del resultado ([{'profit': ...}, ...] en orden)
+        initial_capital: Capital inicial del resultado
+        simulations: Número de simulaciones
+        method: bootstrap (con reemplazo) o permutation (solo cambia el orden:
+                el retorno final es el mismo y varía el drawdown)
+        confidence: Nivel del intervalo de confianza (0-1)
+        seed: Semilla del generador (resultados reproducibles)
+
+    Returns:
+        {"total_return_pct": {...}, "max_drawdown_pct": {...}, "profit_factor": {...}, ...}
+        La distribución del profit factor solo incluye las simulaciones con
+        alguna pérdida (None si no hay ninguna); las demás se cuentan en
+        no_loss_simulations y su profit factor original es None.
+    """
+    if method not in MONTE_CARLO_METHODS:
+        raise ValueError(f"method debe ser uno de: {', '.join(MONTE_CARLO_METHODS)}")
+    if not 1 <= simulations <= settings.monte_carlo_max_simulations:
+        raise ValueError(f"simulations debe estar entre 1 y {settings.monte_carlo_max_simulations}")
+    if not 0 < confidence < 1:
+        raise ValueError("confidence debe estar entre 0 y 1")
+    if initial_capital <= 0:
+        raise ValueError("Initial capital debe ser mayor a 0")
+    if not trades:
+        raise ValueError("El resultado no tiene trades")
+
+    growth = trade_growth(trades, initial_capital)
+    rng = np.random.default_rng(seed)
+
+    # Lotes de como mucho monte_carlo_batch_cells celdas por matriz
+    batch = max(1, settings.monte_carlo_batch_cells // len(growth))
+    results = {"total_return_pct": [], "max_drawdown_pct": [], "profit_factor": []}
+    for start in range(0, simulations, batch):
+        samples = _resample(growth, rng, min(batch, simulations - start), method)
+        stats = _path_stats(samples, initial_capital)
+        for name, values in stats.items():
+            results[name].append(values)
+    results = {name: np.concatenate(chunks) for name, chunks in results.items()}
+
+    original = _path_stats(growth[np.newaxis, :], initial_capital)
+    no_loss = np.isinf(results["profit_factor"])
+    results["profit_factor"] = results["profit_factor"][~no_loss]
+    return {
+        "method": method,
+        "simulations": simulations,
+        "trades": len(growth),
+        "confidence": confidence,
+        "seed": seed,
+        "original": {
+            name: round(float(values[0]), 2) if np.isfinite(values[0]) else None
+            for name, values in original.items()
+        },
+        "probability_of_loss_pct": round(float(np.mean(results["total_return_pct"] < 0) * 100), 2),
+        "no_loss_simulations": int(no_loss.sum()),
+        **{name: _distribution(values, confidence) for name, values in results.items()}
+    }
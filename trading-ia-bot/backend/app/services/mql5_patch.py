@@ -0,0 +1,236 @@
+"""
+Parches por regiones para refinar código MQL5
+Localiza las funciones que señalan los errores del compilador, y aplica y
+valida localmente los reemplazos que devuelve el modelo
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+class PatchError(ValueError):
+    """El parche no se pudo aplicar o el resultado no es válido"""
+
+
+@dataclass
+class Region:
+    """Bloque de líneas [start, end] (0-based, inclusivo) que se envía al modelo"""
+    number: int
+    start: int
+    end: int
+    text: str
+
+
+# MetaEditor: "EA.mq5(45,12) : error 256: ..." o columnas separadas por tabs "... \t EA.mq5 \t 45 \t 12"
+_LOCATION_PATTERNS = (
+    re.compile(r"\((\d+)\s*,\s*\d+\)"),
+    re.compile(r"\t(\d+)\t\d+"),
+    re.compile(r"\b(?:line|línea|linea)\s*:?\s*(\d+)", re.IGNORECASE),
+)
+_IDENTIFIER = re.compile(r"'([A-Za-z_][A-Za-z0-9_]*)'")
+
+# Líneas de contexto alrededor de un error fuera de cualquier función
+_CONTEXT_LINES = 3
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# LOCALIZACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+
+def error_lines(error_message: str, code: str) -> List[int]:
+    """
+    Líneas (0-based) que señalan los errores. Si el mensaje no trae número
+    de línea, se usan las líneas donde aparecen los identificadores citados.
+    """
+    total = code.count("\n") + 1
+    lines = set()
+    for pattern in _LOCATION_PATTERNS:
+        for match in pattern.finditer(error_message):
+            number = int(match.group(1))
+            if 1 <= number <= total:
+                lines.add(number - 1)
+
+    if not lines:
+        identifiers = set(_IDENTIFIER.findall(error_message))
+        for index, line in enumerate(code.split("\n")):
+            if any(re.search(rf"\b{re.escape(name)}\b", line) for name in identifiers):
+                lines.add(index)
+
+    return sorted(lines)
+
+
+def _strip_literals(line: str, in_comment: bool) -> Tuple[str, bool]:
+    """
+    Quita comentarios y literales de una línea para contar llaves.
+
+    Returns:
+        (línea sin literales, sigue dentro de un comentario /* */)
+    """
+    output = []
+    i = 0
+    while i < len(line):
+        if in_comment:
+            end = line.find("*/", i)
+            if end < 0:
+                return "".join(output), True
+            i, in_comment = end + 2, False
+            continue
+
+        char = line[i]
+        if line.startswith("//", i):
+            break
+        if line.startswith("/*", i):
+            in_comment = True
+            i += 2
+            continue
+        if char in "\"'":
+            i += 1
+            while i < len(line) and line[i] != char:
+                i += 2 if line[i] == "\\" else 1
+            i += 1
+            continue
+        output.append(char)
+        i += 1
+    return "".join(output), in_comment
+
+
+def _depths(lines: List[str]) -> List[Tuple[int, int]]:
+    """
+    Profundidad de llaves al inicio y al final de cada línea.
+    """
+    depths = []
+    depth = 0
+    in_comment = False
+    for line in lines:
+        stripped, in_comment = _strip_literals(line, in_comment)
+        start = depth
+        depth += stripped.count("{") - stripped.count("}")
+        depths.append((start, depth))
+    return depths
+
+
+def find_regions(code: str, lines: List[int]) -> List[Region]:
+    """
+    Agrupa las líneas con error en regiones: la función de primer nivel que
+    las contiene (con su firma) o, fuera de funciones, unas líneas de contexto.
+    """
+    source = code.split("\n")
+    depths = _depths(source)
+    spans = []
+
+    for line in lines:
+        start, end = line, line
+        if depths[line][0] > 0 or depths[line][1] > depths[line][0]:
+            # Subir hasta la línea que abre el bloque de primer nivel
+            while start > 0 and depths[start][0] > 0:
+                start -= 1
+            # Incluir la firma si la llave va en su propia línea
+            while start > 0 and source[start].strip().startswith("{") and source[start - 1].strip():
+                start -= 1
+            while end < len(source) - 1 and depths[end][1] > 0:
+                end += 1
+        else:
+            start = max(0, line - _CONTEXT_LINES)
+            end = min(len(source) - 1, line + _CONTEXT_LINES)
+            # No cortar una función por la mitad
+            while start > 0 and depths[start][0] > 0:
+                start -= 1
+            while end < len(source) - 1 and depths[end][1] > 0:
+                end += 1
+            # ni dejar la firma de la función siguiente separada de su cuerpo
+            while end > line and end + 1 < len(source) and source[end + 1].strip().startswith("{"):
+                end -= 1
+        spans.append([start, end])
+
+    merged: List[List[int]] = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return [
+        Region(number, start, end, "\n".join(source[start:end + 1]))
+        for number, (start, end) in enumerate(merged, start=1)
+    ]
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# PARCHE
+# ═════════════════════════════════════════════════════════════════════════════
+
+_BLOCK = re.compile(r"<<<(REGION (\d+)|GLOBAL)[^\n]*\n(.*?)\n?>>>", re.DOTALL)
+
+
+def format_regions(regions: List[Region]) -> str:
+    return "\n\n".join(
+        f"<<<REGION {region.number} (líneas {region.start + 1}-{region.end + 1})\n{region.text}\n>>>"
+        for region in regions
+    )
+
+
+def parse_patch(response: str) -> Tuple[Dict[int, str], Optional[str]]:
+    """
+    Returns:
+        ({número de región: código nuevo}, declaraciones globales nuevas o None)
+    """
+    replacements: Dict[int, str] = {}
+    global_block = None
+    for match in _BLOCK.finditer(response):
+        body = match.group(3)
+        if match.group(2) is not None:
+            replacements[int(match.group(2))] = body
+        else:
+            global_block = body
+    return replacements, global_block
+
+
+def apply_patch(code: str, regions: List[Region], replacements: Dict[int, str], global_block: Optional[str] = None) -> str:
+    """
+    Sustituye cada región por su reemplazo (de abajo arriba para no mover
+    los índices) e inserta las declaraciones globales tras los #include /
+    #property. Lanza PatchError si falta alguna región o el resultado no valida.
+    """
+    missing = [region.number for region in regions if region.number not in replacements]
+    if missing:
+        raise PatchError(f"El parche no incluye las regiones {missing}")
+
+    source = code.split("\n")
+    for region in sorted(regions, key=lambda region: region.start, reverse=True):
+        replacement = replacements[region.number]
+        if not replacement.strip():
+            raise PatchError(f"Región {region.number} vacía")
+        _check_balanced(replacement, f"región {region.number}")
+        source[region.start:region.end + 1] = replacement.split("\n")
+
+    if global_block and global_block.strip():
+        _check_balanced(global_block, "bloque global")
+        insert_at = 0
+        for index, line in enumerate(source):
+            if line.lstrip().startswith(("#include", "#property", "#define")):
+                insert_at = index + 1
+        source[insert_at:insert_at] = global_block.split("\n")
+
+    patched = "\n".join(source)
+    _check_balanced(patched, "código parcheado")
+    return patched
+
+
+def _check_balanced(code: str, label: str) -> None:
+    in_comment = False
+    counts = {"{": 0, "(": 0, "[": 0}
+    closing = {"}": "{", ")": "(", "]": "["}
+    for line in code.split("\n"):
+        stripped, in_comment = _strip_literals(line, in_comment)
+        for char in stripped:
+            if char in counts:
+                counts[char] += 1
+            elif char in closing:
+                counts[closing[char]] -= 1
+                if counts[closing[char]] < 0:
+                    raise PatchError(f"'{char}' sin abrir en {label}")
+
+    unbalanced = [char for char, count in counts.items() if count]
+    if unbalanced:
+        raise PatchError(f"Delimitadores sin cerrar en {label}: {' '.join(unbalanced)}")
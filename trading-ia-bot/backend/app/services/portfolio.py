@@ -0,0 +1,168 @@
+"""
+Backtest de portafolio multi-símbolo
+Carga en lote, alineación en un índice común y equity combinada vectorizada
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services.backtest_engine import BacktestEngine
+from app.services.calendars import ReturnGrid, broadest_calendar, market_calendar
+from app.services.executor import get_backtest_executor
+from app.services.metrics import compute_metrics
+from app.services.simulation import demo_positions, simulate, trades_to_records
+
+
+def normalize_weights(symbols: List[str], weights: Optional[List[float]] = None) -> np.ndarray:
+    """
+    Valida y normaliza los pesos para que sumen 1 (default: equiponderado).
+    """
+    if not symbols:
+        raise ValueError("Debe indicar al menos un símbolo")
+    if len(set(symbols)) != len(symbols):
+        raise ValueError("Los símbolos no pueden repetirse")
+
+    if weights is None:
+        return np.full(len(symbols), 1.0 / len(symbols))
+
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(weights) != len(symbols):
+        raise ValueError("weights debe tener la misma longitud que symbols")
+    if np.any(weights < 0) or weights.sum() <= 0:
+        raise ValueError("Los pesos deben ser positivos")
+    return weights / weights.sum()
+
+
+def align_close(frames: Dict[str, pd.DataFrame], symbols: List[str]) -> pd.DataFrame:
+    """
+    Alinea los cierres de todos los símbolos en un índice temporal común.
+
+    Usa la unión de índices con forward-fill (mercados con horarios distintos)
+    y descarta el tramo inicial donde algún símbolo aún no tiene datos.
+    """
+    missing = [symbol for symbol in symbols if frames[symbol].empty]
+    if missing:
+        raise ValueError(f"No hay datos disponibles para {', '.join(missing)}")
+
+    close = pd.concat({symbol: frames[symbol]['Close'] for symbol in symbols}, axis=1)
+    close = close.sort_index().ffill().dropna()
+    if close.empty:
+        raise ValueError("Los símbolos no tienen un rango de fechas en común")
+    return close
+
+
+def simulate_portfolio(
+    close: pd.DataFrame,
+    weights: np.ndarray,
+    initial_capital: float = 10000.0,
+    commission: float = 0.0001,
+    position_size: float = 0.95,
+    trades_count: int = 50,
+    seed: Optional[int] = None,
+    timeframe: str = "H1"
+) -> Dict:
+    """
+    Simula cada símbolo como una subcuenta con capital = peso * capital inicial
+    y suma las equity barra a barra. Síncrono (se ejecuta en el pool).
+    """
+    symbols = list(close.columns)
+    prices = close.to_numpy(dtype=np.float64)
+    n_bars = prices.shape[0]
+
+    equity = np.zeros(n_bars, dtype=np.float64)
+    profits = []
+    trades = []
+    attribution = []
+
+    for i, symbol in enumerate(symbols):
+        allocated = initial_capital * weights[i]
+        symbol_seed = None if seed is None else seed + i
+        positions = demo_positions(n_bars, trades_count, symbol_seed)
+
+        sim = simulate(
+            prices[:, i],
+            positions,
+            initial_capital=allocated,
+            commission=commission,
+            position_size=position_size
+        )
+        equity += sim.equity
+        profits.append(sim.trades['profit'])
+        trades.extend({"symbol": symbol, **t} for t in trades_to_records(sim.trades, close.index))
+
+        final = float(sim.equity[-1])
+        grid = ReturnGrid(timeframe, market_calendar(symbol))
+        metrics = compute_metrics(
+            sim.trades, sim.equity, allocated, sim.exposure_bars, grid.positions(close.index), grid.periods_per_year
+        )
+        attribution.append({
+            "symbol": symbol,
+            "weight": round(float(weights[i]), 6),
+            "allocated_capital": round(allocated, 2),
+            "final_capital": round(final, 2),
+            "pnl": round(final - allocated, 2),
+            "contribution_pct": round((final - allocated) / initial_capital * 100, 2),
+            "total_trades": int(len(sim.trades['profit'])),
+            **metrics
+        })
+
+    grid = ReturnGrid(timeframe, broadest_calendar(symbols))
+    metrics = compute_metrics(
+        {"profit": np.concatenate(profits)}, equity, initial_capital, 0, grid.positions(close.index), grid.periods_per_year
+    )
+
+    return {
+        "bars": n_bars,
+        "start_date": close.index[0].isoformat(),
+        "end_date": close.index[-1].isoformat(),
+        "final_capital": float(equity[-1]),
+        "total_trades": len(trades),
+        "equity_curve": equity.tolist(),
+        "trades": trades,
+        "attribution": attribution,
+        **metrics
+    }
+
+
+async def run_portfolio_backtest(
+    symbols: List[str],
+    weights: Optional[List[float]] = None,
+    timeframe: str = "H1",
+    period_years: int = 5,
+    initial_capital: float = 10000.0,
+    commission: float = 0.0001,
+    position_size: float = 0.95,
+    trades_count: int = 50,
+    seed: Optional[int] = None
+) -> Dict:
+    """
+    Función helper para ejecutar un backtest de portafolio desde rutas FastAPI.
+    """
+    normalized = normalize_weights(symbols, weights)
+
+    engine = BacktestEngine(initial_capital, commission, position_size)
+    frames = await engine.download_portfolio_data(symbols, timeframe, period_years)
+    close = align_close(frames, symbols)
+
+    result = await get_backtest_executor().run(
+        simulate_portfolio,
+        close,
+        normalized,
+        initial_capital,
+        commission,
+        position_size,
+        trades_count,
+        seed,
+        timeframe
+    )
+
+    return {
+        "status": "success",
+        "symbols": symbols,
+        "timeframe": timeframe,
+        "period_years": period_years,
+        "initial_capital": initial_capital,
+        **result
+    }
@@ -0,0 +1,672 @@
+"""
+Almacén local de precios OHLCV
+Caché persistente en disco (NumPy memory-mapped) por símbolo + intervalo
+"""
+
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.config import settings
+
+
+# Columnas OHLCV que se persisten (una matriz .npy por columna)
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# Filas libres que se reservan al reescribir una serie, para que las colas
+# siguientes se añadan en el sitio (como mínimo _MIN_HEADROOM)
+_HEADROOM_FRACTION = 0.125
+_MIN_HEADROOM = 1024
+
+# Un fetcher recibe (symbol, interval, start, end) y retorna un DataFrame OHLCV
+Fetcher = Callable[[str, str, datetime, datetime], pd.DataFrame]
+
+# Un batch fetcher recibe una lista de símbolos y retorna {symbol: DataFrame}
+BatchFetcher = Callable[[List[str], str, datetime, datetime], Dict[str, pd.DataFrame]]
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# FETCHERS
+# ═════════════════════════════════════════════════════════════════════════════
+
+# Días máximos por petición que acepta yfinance (el resto se trocea)
+_MAX_REQUEST_DAYS = {"1m": 7}
+
+
+def _request_chunks(interval: str, start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+    days = _MAX_REQUEST_DAYS.get(interval)
+    if days is None:
+        return [(start, end)]
+    chunks = []
+    while start < end:
+        chunks.append((start, min(end, start + timedelta(days=days))))
+        start = chunks[-1][1]
+    return chunks
+
+
+def yfinance_fetcher(symbol: str, interval: str, start: datetime, end: datetime) -> pd.DataFrame:
+    """
+    Descarga barras OHLCV desde yfinance (fetcher por defecto).
+    """
+    import yfinance as yf
+
+    pieces = [
+        yf.download(symbol, start=s, end=e, interval=interval, progress=False)
+        for s, e in _request_chunks(interval, start, end)
+    ]
+    pieces = [piece for piece in pieces if piece is not None and not piece.empty]
+    if not pieces:
+        return pd.DataFrame()
+    return pd.concat(pieces) if len(pieces) > 1 else pieces[0]
+
+
+def yfinance_batch_fetcher(
+    symbols: List[str],
+    interval: str,
+    start: datetime,
+    end: datetime
+) -> Dict[str, pd.DataFrame]:
+    """
+    Descarga varios símbolos en una sola llamada a yf.download (troceada
+    por fechas si el intervalo lo exige).
+    """
+    import yfinance as yf
+
+    pieces = [
+        yf.download(symbols, start=s, end=e, interval=interval, group_by="ticker", progress=False)
+        for s, e in _request_chunks(interval, start, end)
+    ]
+    pieces = [piece for piece in pieces if piece is not None and not piece.empty]
+    if not pieces:
+        return {}
+    df = pd.concat(pieces) if len(pieces) > 1 else pieces[0]
+
+    if not isinstance(df.columns, pd.MultiIndex):
+        return {symbols[0]: df}
+
+    tickers = set(df.columns.get_level_values(0))
+    return {
+        symbol: df[symbol].dropna(how="all")
+        for symbol in symbols
+        if symbol in tickers
+    }
+
+
+class LocalFileFetcher:
+    """
+    Fetcher que lee barras desde archivos CSV locales ({SYMBOL}_{interval}.csv).
+    Pensado para tests y fixtures sin acceso a red.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.calls = 0
+
+    def __call__(self, symbol: str, interval: str, start: datetime, end: datetime) -> pd.DataFrame:
+        self.calls += 1
+        path = os.path.join(self.directory, f"{symbol}_{interval}.csv")
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=OHLCV_COLUMNS)
+
+        df = pd.read_csv(path, index_col=0, parse_dates=True)
+        return df[(df.index >= pd.Timestamp(start)) & (df.index < pd.Timestamp(end))]
+
+    def batch(self, symbols: List[str], interval: str, start: datetime, end: datetime) -> Dict[str, pd.DataFrame]:
+        return {symbol: self(symbol, interval, start, end) for symbol in symbols}
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# ALMACÉN
+# ═════════════════════════════════════════════════════════════════════════════
+
+class PriceStore:
+    """
+    Caché persistente de barras OHLCV.
+
+    Cada serie (símbolo + intervalo) se guarda como un directorio con
+    versiones: cada versión es un subdirectorio inmutable con un archivo .npy
+    por columna más el índice temporal en int64 (ns, UTC), y meta.json (que
+    se reemplaza de forma atómica) indica la versión y las filas vigentes.
+    Un lector que lee meta.json y abre esa versión nunca mezcla columnas de
+    dos escrituras. Las escrituras de varios procesos se serializan con un
+    lock de archivo por serie.
+
+    Las lecturas usan memory-mapping, y solo se descarga la cola que falta
+    desde la última barra almacenada. Si la cola solo añade barras, se
+    escriben en las filas reservadas de la versión actual (más allá de las
+    filas que ven los lectores) y basta con publicar el nuevo meta.json.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        fetcher: Optional[Fetcher] = None,
+        refresh_seconds: int = 300,
+        batch_fetcher: Optional[BatchFetcher] = None
+    ):
+        """
+        Args:
+            cache_dir: Directorio raíz de la caché
+            fetcher: Función de descarga (default: yfinance)
+            refresh_seconds: Segundos mínimos entre descargas de la cola
+            batch_fetcher: Descarga multi-símbolo (default: yfinance si no se
+                pasa fetcher; si no, se descarga símbolo a símbolo)
+        """
+        self.cache_dir = cache_dir
+        self.fetcher = fetcher or yfinance_fetcher
+        self.batch_fetcher = batch_fetcher or (yfinance_batch_fetcher if fetcher is None else None)
+        self.refresh_seconds = refresh_seconds
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+
+    def get(self, symbol: str, interval: str, start: datetime, end: datetime) -> pd.DataFrame:
+        """
+        Retorna las barras de [start, end), completando la caché si hace falta.
+
+        Args:
+            symbol: Símbolo del activo
+            interval: Intervalo en formato del proveedor (1h, 1d, ...)
+            start: Fecha inicial
+            end: Fecha final
+
+        Returns:
+            DataFrame OHLCV con índice datetime (UTC, sin zona horaria)
+        """
+        start = _to_naive_utc(start)
+        end = _to_naive_utc(end)
+
+        with self._lock_for(symbol, interval):
+            self._complete(symbol, interval, start, end)
+            df = self._load(symbol, interval)
+
+        return df[(df.index >= start) & (df.index < end)]
+
+
+    def ensure(self, symbol: str, interval: str, start: datetime, end: datetime) -> None:
+        """
+        Completa la caché para [start, end) sin cargar la serie en memoria
+        (el backtest por tramos la lee después con arrays()).
+        """
+        with self._lock_for(symbol, interval):
+            self._complete(symbol, interval, _to_naive_utc(start), _to_naive_utc(end))
+
+
+    def arrays(self, symbol: str, interval: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Índice (int64 ns, UTC) y columnas OHLCV memory-mapped de la serie
+        completa, sin construir un DataFrame.
+        """
+        with self._lock_for(symbol, interval):
+            if self._read_meta(symbol, interval) is None:
+                return np.empty(0, dtype=np.int64), {column: np.empty(0) for column in OHLCV_COLUMNS}
+            return self._open_arrays(symbol, interval)
+
+
+    def get_many(self, symbols: List[str], interval: str, start: datetime, end: datetime) -> Dict[str, pd.DataFrame]:
+        """
+        Igual que get() para varios símbolos, pero descargando lo que falte
+        con una llamada al batch_fetcher por tipo de tramo.
+
+        Returns:
+            {symbol: DataFrame OHLCV}
+        """
+        if self.batch_fetcher is None:
+            return {symbol: self.get(symbol, interval, start, end) for symbol in symbols}
+
+        start = _to_naive_utc(start)
+        end = _to_naive_utc(end)
+        unique_symbols = sorted(set(symbols))
+
+        with ExitStack() as stack:
+            # Orden fijo de adquisición para evitar deadlocks entre peticiones
+            for symbol in unique_symbols:
+                stack.enter_context(self._lock_for(symbol, interval))
+
+            missing = [
+                symbol for symbol in unique_symbols
+                if self._missing_ranges(self._read_meta(symbol, interval), start, end)[0]
+            ]
+            for symbol in missing:
+                stack.enter_context(self._file_lock(symbol, interval))
+
+            # Se recalcula con los locks de archivo tomados (otro proceso pudo
+            # completar alguna serie mientras tanto)
+            plans = {}
+            for symbol in missing:
+                meta = self._read_meta(symbol, interval)
+                ranges, coverage_start = self._missing_ranges(meta, start, end)
+                if ranges:
+                    plans[symbol] = (meta, ranges, coverage_start)
+
+            # Una llamada por tipo de tramo (símbolos nuevos, cabezas, colas):
+            # un símbolo nuevo no obliga a re-descargar el histórico de los
+            # que solo necesitan su cola
+            groups: Dict[str, Dict[str, Tuple[datetime, datetime]]] = {}
+            for symbol, (_, ranges, _) in plans.items():
+                for range_start, range_end in ranges:
+                    kind = ("head" if range_start == start else "") + ("tail" if range_end == end else "")
+                    groups.setdefault(kind, {})[symbol] = (range_start, range_end)
+
+            pieces: Dict[str, List[pd.DataFrame]] = {symbol: [] for symbol in plans}
+            for group in groups.values():
+                fetch_start = min(range_start for range_start, _ in group.values())
+                fetch_end = max(range_end for _, range_end in group.values())
+                frames = self.batch_fetcher(list(group), interval, fetch_start, fetch_end)
+                for symbol in group:
+                    pieces[symbol].append(self._normalize(frames.get(symbol)))
+
+            for symbol, (meta, _, coverage_start) in plans.items():
+                self._merge(symbol, interval, meta, pieces[symbol], coverage_start)
+
+            frames = {symbol: self._load(symbol, interval) for symbol in unique_symbols}
+
+        return {
+            symbol: frames[symbol][(frames[symbol].index >= start) & (frames[symbol].index < end)]
+            for symbol in symbols
+        }
+
+
+    def history(self, symbol: str, interval: str) -> pd.DataFrame:
+        """
+        Serie completa almacenada (sin descargar nada). Los indicadores se
+        calculan sobre ella para que su calentamiento use las barras previas
+        a la ventana pedida.
+        """
+        with self._lock_for(symbol, interval):
+            if self._read_meta(symbol, interval) is None:
+                return _empty_frame()
+            return self._load(symbol, interval)
+
+
+    def derive(
+        self,
+        symbol: str,
+        source_interval: str,
+        interval: str,
+        aggregate: Callable[[pd.DataFrame], pd.DataFrame]
+    ) -> pd.DataFrame:
+        """
+        Serie derivada de otra almacenada (p. ej. H4 desde 1h), persistida
+        como una serie más. Si la base solo creció por la cola, se recalcula
+        desde la última barra derivada (que puede estar incompleta).
+
+        Args:
+            symbol: Símbolo del activo
+            source_interval: Intervalo de la serie base
+            interval: Nombre de la serie derivada
+            aggregate: Función base → derivada (debe ser estable por ventanas)
+
+        Returns:
+            DataFrame OHLCV completo de la serie derivada
+        """
+        with self._lock_for(symbol, source_interval):
+            source_meta = self._read_meta(symbol, source_interval)
+            if source_meta is None or not source_meta["rows"]:
+                return _empty_frame()
+            source = self._load(symbol, source_interval)
+
+        with self._lock_for(symbol, interval), self._file_lock(symbol, interval):
+            meta = self._read_meta(symbol, interval)
+            same_head = meta is not None and meta.get("source_first") == source_meta["first"]
+
+            if same_head and meta.get("source_updated_at") == source_meta["updated_at"]:
+                return self._load(symbol, interval)
+
+            if same_head and meta["rows"]:
+                derived = self._load(symbol, interval)
+                tail_start = derived.index[-1]
+                tail = self._normalize(aggregate(source[source.index >= tail_start]))
+                bars = pd.concat([derived[derived.index < tail_start], tail])
+            else:
+                bars = self._normalize(aggregate(source))
+
+            self._store(symbol, interval, meta, bars, pd.Timestamp(source_meta["coverage_start"]).to_pydatetime(), {
+                "source_interval": source_interval,
+                "source_first": source_meta["first"],
+                "source_updated_at": source_meta["updated_at"]
+            })
+            return self._load(symbol, interval)
+
+
+    def invalidate(self, symbol: str, interval: str) -> None:
+        """
+        Elimina la serie almacenada de un símbolo/intervalo.
+        """
+        with self._lock_for(symbol, interval), self._file_lock(symbol, interval):
+            shutil.rmtree(self._series_dir(symbol, interval), ignore_errors=True)
+
+
+    def _complete(self, symbol: str, interval: str, start: datetime, end: datetime) -> None:
+        """
+        Descarga y fusiona lo que falte de [start, end) (con el lock tomado).
+        """
+        ranges, _ = self._missing_ranges(self._read_meta(symbol, interval), start, end)
+        if not ranges:
+            return
+
+        with self._file_lock(symbol, interval):
+            # Otro proceso puede haber completado la serie mientras se esperaba
+            meta = self._read_meta(symbol, interval)
+            ranges, coverage_start = self._missing_ranges(meta, start, end)
+            if ranges:
+                pieces = [self._fetch(symbol, interval, s, e) for s, e in ranges]
+                self._merge(symbol, interval, meta, pieces, coverage_start)
+
+
+    def _missing_ranges(
+        self,
+        meta: Optional[Dict],
+        start: datetime,
+        end: datetime
+    ) -> Tuple[List[Tuple[datetime, datetime]], datetime]:
+        """
+        Calcula los tramos que faltan (cabeza y/o cola) para cubrir [start, end).
+
+        Returns:
+            (lista de rangos a descargar, nuevo inicio de cobertura)
+        """
+        if meta is None:
+            return [(start, end)], start
+
+        coverage_start = pd.Timestamp(meta["coverage_start"]).to_pydatetime()
+        last_bar = pd.Timestamp(meta["last"]).to_pydatetime() if meta["rows"] else coverage_start
+        updated_at = datetime.fromisoformat(meta["updated_at"])
+
+        ranges = []
+
+        # Cabeza: el rango pedido empieza antes de lo cubierto
+        if start < coverage_start:
+            ranges.append((start, coverage_start))
+            coverage_start = start
+
+        # Cola: barras nuevas desde la última almacenada (se re-descarga la
+        # última barra porque puede haber estado incompleta)
+        stale = (datetime.utcnow() - updated_at).total_seconds() >= self.refresh_seconds
+        if end > last_bar and stale:
+            ranges.append((last_bar, end))
+
+        return ranges, coverage_start
+
+
+    def _merge(
+        self,
+        symbol: str,
+        interval: str,
+        meta: Optional[Dict],
+        pieces: List[pd.DataFrame],
+        coverage_start: datetime
+    ) -> None:
+        """
+        Fusiona los tramos descargados con la serie almacenada y la persiste
+        (con el lock de archivo tomado).
+        """
+        if meta is not None:
+            pieces = [self._load(symbol, interval)] + pieces
+
+        merged = pd.concat(pieces) if len(pieces) > 1 else pieces[0]
+        merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+        self._store(symbol, interval, meta, merged, coverage_start)
+
+
+    def _fetch(self, symbol: str, interval: str, start: datetime, end: datetime) -> pd.DataFrame:
+        """
+        Llama al fetcher y normaliza el resultado.
+        """
+        return self._normalize(self.fetcher(symbol, interval, start, end))
+
+
+    def _normalize(self, df: Optional[pd.DataFrame]) -> pd.DataFrame:
+        """
+        Normaliza un DataFrame del proveedor a OHLCV float64 con índice UTC.
+        """
+        if df is None or df.empty:
+            return _empty_frame()
+
+        # yfinance recientes retornan columnas MultiIndex (campo, ticker)
+        if isinstance(df.columns, pd.MultiIndex):
+            df = df.droplevel(-1, axis=1)
+
+        df = df[OHLCV_COLUMNS].dropna(how="all").astype("float64")
+        df.index = pd.DatetimeIndex(df.index)
+        if df.index.tz is not None:
+            df.index = df.index.tz_convert("UTC").tz_localize(None)
+        df.index.name = "Date"
+        return df[~df.index.duplicated(keep="last")]
+
+
+    def _load(self, symbol: str, interval: str) -> pd.DataFrame:
+        """
+        Carga la serie almacenada usando memory-mapping.
+        """
+        index, columns = self._open_arrays(symbol, interval)
+        return pd.DataFrame(
+            columns,
+            index=pd.DatetimeIndex(np.asarray(index).view("datetime64[ns]"), name="Date", copy=False),
+            copy=False
+        )
+
+
+    def _open_arrays(self, symbol: str, interval: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        # La versión de meta.json y sus archivos se leen juntos; si otro
+        # proceso la retiró entre medias (dos escrituras después), se relee
+        for attempt in range(3):
+            meta = self._read_meta(symbol, interval)
+            path = os.path.join(self._series_dir(symbol, interval), meta.get("version", ""))
+            rows = meta["rows"]
+            try:
+                index = np.load(os.path.join(path, "index.npy"), mmap_mode="r")[:rows]
+                columns = {
+                    column: np.load(os.path.join(path, f"{column.lower()}.npy"), mmap_mode="r")[:rows]
+                    for column in OHLCV_COLUMNS
+                }
+                return index, columns
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+
+
+    def _store(
+        self,
+        symbol: str,
+        interval: str,
+        meta: Optional[Dict],
+        df: pd.DataFrame,
+        coverage_start: datetime,
+        extra: Optional[Dict] = None
+    ) -> None:
+        """
+        Persiste la serie (con el lock de archivo tomado): si las filas
+        almacenadas no cambian y caben las nuevas, se añaden en el sitio; si
+        no, se escribe una versión nueva.
+        """
+        arrays = {"index": df.index.values.astype("datetime64[ns]").view("int64")}
+        for column in OHLCV_COLUMNS:
+            arrays[column.lower()] = np.ascontiguousarray(df[column].values, dtype="float64")
+
+        if meta is not None and meta.get("version") and meta["rows"] and self._append(symbol, interval, meta, arrays):
+            version = meta["version"]
+        else:
+            version = self._write(symbol, interval, arrays)
+
+        self._publish(symbol, interval, {
+            "symbol": symbol,
+            "interval": interval,
+            "version": version,
+            "rows": int(len(df)),
+            "first": df.index[0].isoformat() if len(df) else None,
+            "last": df.index[-1].isoformat() if len(df) else None,
+            "coverage_start": pd.Timestamp(coverage_start).isoformat(),
+            "updated_at": datetime.utcnow().isoformat(),
+            **(extra or {})
+        }, previous=meta.get("version") if meta else None)
+
+
+    def _append(self, symbol: str, interval: str, meta: Dict, arrays: Dict[str, np.ndarray]) -> bool:
+        """
+        Escribe las filas nuevas en las filas reservadas de la versión actual.
+        Los lectores solo ven las meta["rows"] primeras, así que no se toca
+        nada visible hasta publicar el nuevo meta.json.
+
+        Returns:
+            False si alguna fila almacenada cambió o no hay sitio (hay que
+            escribir una versión nueva)
+        """
+        rows = meta["rows"]
+        path = os.path.join(self._series_dir(symbol, interval), meta["version"])
+        files = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r+") for name in arrays}
+        try:
+            for name, values in arrays.items():
+                stored = files[name]
+                if len(values) < rows or len(values) > len(stored):
+                    return False
+                if not np.array_equal(stored[:rows], values[:rows], equal_nan=name != "index"):
+                    return False
+
+            for name, values in arrays.items():
+                files[name][rows:len(values)] = values[rows:]
+                files[name].flush()
+            return True
+        finally:
+            del files
+
+
+    def _write(self, symbol: str, interval: str, arrays: Dict[str, np.ndarray]) -> str:
+        """
+        Escribe la serie completa en un directorio de versión nuevo (nombre
+        único, nunca se sobrescribe uno existente) y retorna su nombre.
+        """
+        version = f"v{datetime.utcnow():%Y%m%d%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self._series_dir(symbol, interval), version)
+        os.makedirs(path)
+
+        rows = len(arrays["index"])
+        capacity = rows + max(_MIN_HEADROOM, int(rows * _HEADROOM_FRACTION))
+        for name, values in arrays.items():
+            stored = np.lib.format.open_memmap(
+                os.path.join(path, f"{name}.npy"), mode="w+", dtype=values.dtype, shape=(capacity,)
+            )
+            stored[:rows] = values
+            stored.flush()
+            del stored
+        return version
+
+
+    def _publish(self, symbol: str, interval: str, meta: Dict, previous: Optional[str] = None) -> None:
+        """
+        Reemplaza meta.json de forma atómica (archivo temporal único + rename)
+        y borra las versiones anteriores a la previa: la previa se conserva
+        para los lectores que acaban de leer el meta.json anterior.
+        """
+        path = self._series_dir(symbol, interval)
+        tmp_meta = os.path.join(path, f"meta.json.{uuid.uuid4().hex}.tmp")
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, os.path.join(path, "meta.json"))
+
+        keep = {meta["version"], previous}
+        for name in os.listdir(path):
+            version_path = os.path.join(path, name)
+            if name.startswith("v") and name not in keep and os.path.isdir(version_path):
+                # En Windows falla mientras otro proceso la tenga mapeada: se
+                # reintenta en la siguiente escritura
+                shutil.rmtree(version_path, ignore_errors=True)
+
+
+    def _read_meta(self, symbol: str, interval: str) -> Optional[Dict]:
+        path = os.path.join(self._series_dir(symbol, interval), "meta.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+
+    @contextmanager
+    def _file_lock(self, symbol: str, interval: str) -> Iterator[None]:
+        """
+        Lock exclusivo entre procesos para escribir una serie (junto al
+        directorio de la serie, para que invalidate() pueda borrarlo).
+        """
+        path = self._series_dir(symbol, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.lock", "a+b") as f:
+            _lock_file(f)
+            try:
+                yield
+            finally:
+                _unlock_file(f)
+
+
+    def _series_dir(self, symbol: str, interval: str) -> str:
+        safe_symbol = "".join(c if c.isalnum() or c in "-_=." else "_" for c in symbol.upper())
+        return os.path.join(self.cache_dir, safe_symbol, interval)
+
+
+    def _lock_for(self, symbol: str, interval: str) -> threading.Lock:
+        key = f"{symbol}/{interval}"
+        with self._locks_guard:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# HELPERS
+# ═════════════════════════════════════════════════════════════════════════════
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock_file(f) -> None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(f) -> None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(f) -> None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f) -> None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _to_naive_utc(value: datetime) -> datetime:
+    ts = pd.Timestamp(value)
+    if ts.tz is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.to_pydatetime()
+
+
+def _empty_frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {column: np.empty(0, dtype="float64") for column in OHLCV_COLUMNS},
+        index=pd.DatetimeIndex([], name="Date")
+    )
+
+
+_default_store: Optional[PriceStore] = None
+
+
+def get_price_store() -> PriceStore:
+    """
+    Retorna el almacén de precios compartido del proceso.
+    """
+    global _default_store
+    if _default_store is None:
+        _default_store = PriceStore(
+            cache_dir=settings.price_cache_dir,
+            refresh_seconds=settings.price_cache_refresh_seconds
+        )
+    return _default_store
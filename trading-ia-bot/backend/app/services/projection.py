@@ -0,0 +1,36 @@
+"""
+Proyecciones de campos para los endpoints de listado
+view=summary / fields=a,b,c
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+
+VIEWS = ("full", "summary")
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """
+    Convierte "id,name,symbol" en lista validada.
+
+    Returns:
+        Lista de campos, o None si no se pidió proyección
+    """
+    if not fields:
+        return None
+
+    allowed = list(allowed)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise ValueError(f"Campos desconocidos: {', '.join(unknown)}. Disponibles: {', '.join(allowed)}")
+    return requested
+
+
+def validate_view(view: str) -> None:
+    if view not in VIEWS:
+        raise ValueError(f"view debe ser uno de: {', '.join(VIEWS)}")
+
+
+def project(rows: List[Dict], fields: List[str]) -> List[Dict]:
+    return [{field: row.get(field) for field in fields} for row in rows]
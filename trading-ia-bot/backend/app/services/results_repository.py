@@ -0,0 +1,425 @@
+"""
+Repositorio de resultados de backtest
+Acceso a las tablas results / result_blobs
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.database import IS_SQLITE, SessionLocal
+from app.models import RANKED_METRICS, RESULT_SCOPES, Result, ResultAggregate, ResultBlob
+
+
+METRIC_COLUMNS = (
+    "period_years",
+    "initial_capital",
+    "final_capital",
+    "total_return_pct",
+    "sharpe_ratio",
+    "max_drawdown_pct",
+    "win_rate_pct",
+    "profit_factor",
+    "total_trades"
+)
+
+# Agrupaciones mantenidas en result_aggregates ("all" es el total global)
+AGGREGATE_SCOPES = tuple(RESULT_SCOPES)
+
+# Columnas por las que se puede ordenar /list (todas con índice (columna, id);
+# las métricas también con (symbol | timeframe, métrica, id) para los filtros)
+SORTABLE_COLUMNS = (
+    "id",
+    "created_at",
+    "total_return_pct",
+    "sharpe_ratio",
+    "max_drawdown_pct",
+    "win_rate_pct",
+    "profit_factor"
+)
+
+
+def _to_dict(result: Result, blob: Optional[ResultBlob] = None) -> Dict:
+    data = {
+        "id": result.id,
+        "bot_id": result.bot_id,
+        "bot_name": result.bot_name,
+        "symbol": result.symbol,
+        "timeframe": result.timeframe,
+        "strategy_type": result.strategy_type,
+        **{column: getattr(result, column) for column in METRIC_COLUMNS},
+        "description": result.description,
+        "created_at": result.created_at.isoformat(),
+        "status": "completed"
+    }
+    if blob is not None:
+        data["equity_curve"] = decode_curve(blob.equity_curve)
+        data["trades"] = blob.trades
+    return data
+
+
+def encode_curve(values: List[float]) -> bytes:
+    return np.asarray(values, dtype="<f8").tobytes()
+
+
+def decode_curve(data: bytes) -> List[float]:
+    return np.frombuffer(data, dtype="<f8").tolist()
+
+
+def encode_cursor(value, result_id: int) -> str:
+    """
+    Cursor opaco con la última clave (valor de orden, id) de la página.
+    """
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, result_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str) -> Tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, result_id = json.loads(raw)
+        if sort_by == "created_at":
+            value = datetime.fromisoformat(value)
+        return value, int(result_id)
+    except (ValueError, TypeError):
+        raise ValueError("cursor inválido")
+
+
+def _ordering(column, descending: bool) -> Tuple:
+    """
+    ORDER BY (columna, id). Los NULL de profit_factor (sin pérdidas) son el
+    valor más alto: al final en ascendente y al principio en descendente.
+    """
+    if descending:
+        key = column.desc().nulls_first() if column.nullable else column.desc()
+        return key, Result.id.desc()
+    key = column.asc().nulls_last() if column.nullable else column.asc()
+    return key, Result.id.asc()
+
+
+def _after(column, value, last_id: int, descending: bool):
+    """
+    Filas posteriores a la clave (value, last_id) en el orden de _ordering.
+    """
+    if column is Result.id:
+        return Result.id < last_id if descending else Result.id > last_id
+    if value is None:
+        # Tras un NULL: el resto de NULL por id y, en descendente, todos los valores
+        same = and_(column.is_(None), Result.id < last_id if descending else Result.id > last_id)
+        return or_(same, column.is_not(None)) if descending else same
+    if descending:
+        return or_(column < value, and_(column == value, Result.id < last_id))
+    following = or_(column > value, and_(column == value, Result.id > last_id))
+    return or_(following, column.is_(None)) if column.nullable else following
+
+
+async def list_results(
+    limit: int = 50,
+    offset: int = 0,
+    symbol: Optional[str] = None,
+    timeframe: Optional[str] = None,
+    bot_id: Optional[int] = None,
+    sort_by: str = "id",
+    order: str = "asc",
+    cursor: Optional[str] = None,
+    include_blobs: bool = True
+) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Lista resultados filtrando y ordenando en SQL. Con include_blobs=False
+    no se lee result_blobs (sin equity_curve ni trades).
+
+    Con cursor la paginación es por keyset sobre (sort_by, id): cada página
+    es un range scan del índice, sin recorrer las filas anteriores como OFFSET.
+
+    Returns:
+        (resultados, cursor de la página siguiente o None si no hay más)
+    """
+    if sort_by not in SORTABLE_COLUMNS:
+        raise ValueError(f"sort_by debe ser uno de: {', '.join(SORTABLE_COLUMNS)}")
+    if order not in ("asc", "desc"):
+        raise ValueError("order debe ser asc o desc")
+
+    column = getattr(Result, sort_by)
+    descending = order == "desc"
+
+    if include_blobs:
+        query = select(Result, ResultBlob).join(ResultBlob, ResultBlob.result_id == Result.id)
+    else:
+        query = select(Result)
+    if symbol:
+        query = query.where(Result.symbol == symbol)
+    if timeframe:
+        query = query.where(Result.timeframe == timeframe)
+    if bot_id is not None:
+        query = query.where(Result.bot_id == bot_id)
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_by)
+        query = query.where(_after(column, value, last_id, descending))
+    elif offset:
+        query = query.offset(offset)
+
+    query = query.order_by(*_ordering(column, descending))
+
+    # Una fila extra indica si hay página siguiente
+    async with SessionLocal() as session:
+        rows = (await session.execute(query.limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        next_cursor = encode_cursor(getattr(last, sort_by), last.id)
+
+    return [_to_dict(*row) for row in rows], next_cursor
+
+
+async def get_result(result_id: int) -> Optional[Dict]:
+    async with SessionLocal() as session:
+        row = (await session.execute(
+            select(Result, ResultBlob)
+            .join(ResultBlob, ResultBlob.result_id == Result.id)
+            .where(Result.id == result_id)
+        )).first()
+        return _to_dict(*row) if row else None
+
+
+async def get_result_curve(result_id: int) -> Optional[List[float]]:
+    async with SessionLocal() as session:
+        data = await session.scalar(select(ResultBlob.equity_curve).where(ResultBlob.result_id == result_id))
+        return decode_curve(data) if data is not None else None
+
+
+async def get_result_trades(result_id: int) -> Optional[List[Dict]]:
+    async with SessionLocal() as session:
+        return await session.scalar(select(ResultBlob.trades).where(ResultBlob.result_id == result_id))
+
+
+async def get_result_trades_and_capital(result_id: int) -> Optional[Tuple[List[Dict], float]]:
+    """
+    Trades y capital inicial de un resultado (sin leer la curva).
+    """
+    async with SessionLocal() as session:
+        row = (await session.execute(
+            select(ResultBlob.trades, Result.initial_capital)
+            .join(Result, Result.id == ResultBlob.result_id)
+            .where(ResultBlob.result_id == result_id)
+        )).first()
+        return tuple(row) if row else None
+
+
+async def save_result(data: Dict) -> Dict:
+    """
+    Guarda métricas y blobs (curva + trades) en una sola transacción.
+    """
+    async with SessionLocal() as session:
+        async with session.begin():
+            result = Result(
+                bot_id=data.get("bot_id"),
+                bot_name=data["bot_name"],
+                symbol=data["symbol"],
+                timeframe=data["timeframe"],
+                strategy_type=data.get("strategy_type"),
+                **{column: data[column] for column in METRIC_COLUMNS},
+                description=data.get("description"),
+                created_at=datetime.now()
+            )
+            session.add(result)
+            await session.flush()
+
+            blob = ResultBlob(
+                result_id=result.id,
+                equity_curve=encode_curve(data["equity_curve"]),
+                trades=data["trades"]
+            )
+            session.add(blob)
+            await _apply_aggregates(session, result, +1)
+        return _to_dict(result, blob)
+
+
+async def delete_result(result_id: int) -> bool:
+    async with SessionLocal() as session:
+        async with session.begin():
+            # Escribir antes de leer: en SQLite (WAL) una transacción que lee y
+            # luego escribe falla con "database is locked" si otro proceso
+            # escribió entre medias; el primer DELETE ya toma el bloqueo
+            await session.execute(delete(ResultBlob).where(ResultBlob.result_id == result_id))
+            result = await session.get(Result, result_id)
+            if result is None:
+                return False
+
+            await _apply_aggregates(session, result, -1)
+            await session.delete(result)
+        return True
+
+
+async def count_results() -> int:
+    async with SessionLocal() as session:
+        aggregate = await session.get(ResultAggregate, ("all", ""))
+        return aggregate.count if aggregate else 0
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# AGREGADOS INCREMENTALES
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _aggregate_keys(result: Result) -> List[Tuple[str, str]]:
+    keys = [("all", "")]
+    for scope in AGGREGATE_SCOPES:
+        value = getattr(result, scope)
+        if value is not None:
+            keys.append((scope, value))
+    return keys
+
+
+async def _apply_aggregates(session, result: Result, sign: int) -> None:
+    """
+    Suma (+1) o resta (-1) un resultado de sus agregados, dentro de la misma
+    transacción que el insert/delete para que nunca se desincronicen.
+    Cada agregado se actualiza con un único upsert atómico (count = count + 1
+    en la propia base de datos), así que los guardados concurrentes de varios
+    workers o procesos no se pisan.
+    """
+    insert = sqlite.insert if IS_SQLITE else postgresql.insert
+    columns = ResultAggregate.__table__.c
+    deltas = {
+        "count": sign,
+        "sum_return": sign * result.total_return_pct,
+        "sum_sharpe": sign * result.sharpe_ratio,
+        "sum_drawdown": sign * result.max_drawdown_pct,
+        "sum_win_rate": sign * result.win_rate_pct
+    }
+
+    keys = _aggregate_keys(result)
+    for scope, key in keys:
+        statement = insert(ResultAggregate).values(scope=scope, key=key, **deltas)
+        await session.execute(statement.on_conflict_do_update(
+            index_elements=[columns.scope, columns.key],
+            set_={name: columns[name] + statement.excluded[name] for name in deltas}
+        ))
+
+    if sign < 0:
+        # Sin filas: reiniciar en vez de arrastrar error de redondeo
+        await session.execute(
+            delete(ResultAggregate).where(
+                or_(*(and_(ResultAggregate.scope == scope, ResultAggregate.key == key) for scope, key in keys)),
+                ResultAggregate.count <= 0
+            )
+        )
+
+
+async def rebuild_aggregates() -> None:
+    """
+    Recalcula result_aggregates desde results con GROUP BY. Se usa al arrancar
+    si la tabla de agregados está vacía pero ya hay resultados guardados.
+    """
+    async with SessionLocal() as session:
+        async with session.begin():
+            await session.execute(delete(ResultAggregate))
+
+            for scope in ("all",) + AGGREGATE_SCOPES:
+                key_column = getattr(Result, scope) if scope != "all" else None
+                columns = [
+                    func.count(Result.id),
+                    func.sum(Result.total_return_pct),
+                    func.sum(Result.sharpe_ratio),
+                    func.sum(Result.max_drawdown_pct),
+                    func.sum(Result.win_rate_pct)
+                ]
+                query = select(*columns) if key_column is None else (
+                    select(key_column, *columns).where(key_column.is_not(None)).group_by(key_column)
+                )
+
+                for row in await session.execute(query):
+                    key, values = ("", row) if key_column is None else (row[0], row[1:])
+                    count, sum_return, sum_sharpe, sum_drawdown, sum_win_rate = values
+                    if not count:
+                        continue
+                    session.add(ResultAggregate(
+                        scope=scope, key=key, count=count,
+                        sum_return=sum_return, sum_sharpe=sum_sharpe,
+                        sum_drawdown=sum_drawdown, sum_win_rate=sum_win_rate
+                    ))
+
+
+async def ensure_aggregates() -> None:
+    async with SessionLocal() as session:
+        has_aggregates = await session.get(ResultAggregate, ("all", "")) is not None
+        has_results = await session.scalar(select(Result.id).limit(1)) is not None
+
+    if has_results and not has_aggregates:
+        await rebuild_aggregates()
+
+
+def _aggregate_to_dict(aggregate: Optional[ResultAggregate]) -> Dict:
+    if aggregate is None:
+        return {"total_results": 0, "avg_return": 0, "avg_sharpe": 0, "avg_drawdown": 0, "avg_win_rate": 0}
+    return {
+        "total_results": aggregate.count,
+        "avg_return": aggregate.sum_return / aggregate.count,
+        "avg_sharpe": aggregate.sum_sharpe / aggregate.count,
+        "avg_drawdown": aggregate.sum_drawdown / aggregate.count,
+        "avg_win_rate": aggregate.sum_win_rate / aggregate.count
+    }
+
+
+def _brief(result: Optional[Result]) -> Optional[Dict]:
+    if result is None:
+        return None
+    return {
+        "id": result.id,
+        "bot_name": result.bot_name,
+        "symbol": result.symbol,
+        "total_return_pct": result.total_return_pct,
+        "sharpe_ratio": result.sharpe_ratio
+    }
+
+
+async def _extremes(session, metric: str, scope: Optional[str] = None, key: Optional[str] = None) -> Tuple:
+    """
+    Mejor y peor resultado por metric: dos ORDER BY ... LIMIT 1 que recorren
+    un extremo del índice (metric, id), o (scope, metric, id) por grupo, O(log n).
+    """
+    column = getattr(Result, metric)
+    query = select(Result)
+    if scope is not None:
+        query = query.where(getattr(Result, scope) == key)
+
+    best = await session.scalar(query.order_by(*_ordering(column, True)).limit(1))
+    worst = await session.scalar(query.order_by(*_ordering(column, False)).limit(1))
+    return _brief(best), _brief(worst)
+
+
+async def summary_stats(metric: str = "total_return_pct", group_by: Optional[str] = None) -> Dict:
+    """
+    Estadísticas leídas de result_aggregates (O(1)) más mejor/peor resultado
+    por índice. Con group_by añade el desglose por symbol/timeframe/strategy_type.
+    """
+    if metric not in RANKED_METRICS:
+        raise ValueError(f"metric debe ser uno de: {', '.join(RANKED_METRICS)}")
+    if group_by is not None and group_by not in AGGREGATE_SCOPES:
+        raise ValueError(f"group_by debe ser uno de: {', '.join(AGGREGATE_SCOPES)}")
+
+    async with SessionLocal() as session:
+        stats = _aggregate_to_dict(await session.get(ResultAggregate, ("all", "")))
+        stats["best_result"], stats["worst_result"] = await _extremes(session, metric)
+
+        if group_by is not None:
+            groups = {}
+            aggregates = await session.scalars(
+                select(ResultAggregate).where(ResultAggregate.scope == group_by).order_by(ResultAggregate.key)
+            )
+            for aggregate in aggregates.all():
+                group = _aggregate_to_dict(aggregate)
+                group["best_result"], group["worst_result"] = await _extremes(session, metric, group_by, aggregate.key)
+                groups[aggregate.key] = group
+            stats["groups"] = groups
+
+    return stats
@@ -0,0 +1,274 @@
+"""
+Núcleo de simulación vectorizado
+Equity barra a barra, fills, comisiones y trades con operaciones NumPy
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Columnas de la tabla de trades (arrays paralelos)
+TRADE_COLUMNS = ["entry_index", "exit_index", "entry_price", "exit_price", "size", "profit", "return_pct"]
+
+
+@dataclass
+class SimulationState:
+    """
+    Estado de la cuenta entre llamadas a simulate().
+    Permite simular una serie larga por tramos sin perder la posición abierta.
+    """
+    cash: float
+    in_position: bool = False
+    entry_price: float = 0.0
+    size: float = 0.0
+    entry_index: int = -1
+    bars_processed: int = 0
+
+
+@dataclass
+class SimulationResult:
+    """
+    Resultado de simulate(): equity por barra y trades cerrados como columnas.
+    """
+    equity: np.ndarray
+    trades: Dict[str, np.ndarray]
+    state: SimulationState
+    exposure_bars: int = 0
+    metadata: Dict = field(default_factory=dict)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# SEÑALES → POSICIONES
+# ═════════════════════════════════════════════════════════════════════════════
+
+def signals_to_positions(
+    index: pd.DatetimeIndex,
+    close: np.ndarray,
+    signals: List[Dict]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convierte señales [{'date', 'type': 'BUY'|'SELL', 'price'}] en un vector
+    de posición por barra (1 = long, 0 = fuera) y un vector de precios de fill.
+
+    Cada señal se asigna a la barra con fecha igual o anterior. La posición
+    en cada barra es la de la última señal vista (BUY abre, SELL cierra).
+    """
+    n = len(close)
+    codes = np.zeros(n, dtype=np.int8)
+    fill_prices = np.asarray(close, dtype=np.float64).copy()
+
+    if not signals:
+        return codes.astype(bool), fill_prices
+
+    dates = pd.DatetimeIndex(pd.to_datetime([s["date"] for s in signals]))
+    if dates.tz is not None and index.tz is None:
+        dates = dates.tz_convert("UTC").tz_localize(None)
+    bars = np.clip(index.searchsorted(dates, side="right") - 1, 0, n - 1)
+
+    types = np.array([1 if s["type"] == "BUY" else -1 for s in signals], dtype=np.int8)
+    prices = np.array([s.get("price", np.nan) for s in signals], dtype=np.float64)
+
+    # Si varias señales caen en la misma barra gana la última (tipo y precio)
+    last = len(bars) - 1 - np.unique(bars[::-1], return_index=True)[1]
+    bars, types, prices = bars[last], types[last], prices[last]
+    codes[bars] = types
+    has_price = ~np.isnan(prices)
+    fill_prices[bars[has_price]] = prices[has_price]
+
+    state = pd.Series(codes, dtype="float64").replace(0, np.nan).ffill().fillna(-1).to_numpy()
+    return state > 0, fill_prices
+
+
+def demo_positions(n: int, trades_count: int = 50, seed: Optional[int] = None) -> np.ndarray:
+    """
+    Vector de posición demo: trades_count puntos aleatorios (con semilla)
+    que alternan BUY, SELL, BUY, ...
+    """
+    rng = np.random.default_rng(seed)
+    flips = np.zeros(n, dtype=np.int8)
+    points = rng.choice(n, size=min(trades_count, n), replace=False)
+    flips[points] = 1
+    return (np.cumsum(flips) % 2).astype(bool)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# SIMULACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+
+def simulate(
+    close: np.ndarray,
+    positions: np.ndarray,
+    fill_prices: Optional[np.ndarray] = None,
+    initial_capital: float = 10000.0,
+    commission: float = 0.0001,
+    position_size: float = 0.95,
+    state: Optional[SimulationState] = None
+) -> SimulationResult:
+    """
+    Simula una estrategia long-only a partir de un vector de posición.
+
+    Reglas (las mismas del motor original):
+    - Al entrar se compra position_size * cash / precio de entrada.
+    - Al salir se cobra comisión de entrada + salida sobre el precio de salida.
+    - La equity se marca a mercado con el cierre de cada barra.
+
+    Como el tamaño es proporcional al cash, el cash tras cada trade es un
+    producto acumulado de factores de crecimiento, lo que permite resolver
+    todo el backtest con operaciones sobre arrays.
+
+    Args:
+        close: Precios de cierre por barra
+        positions: Posición deseada al cierre de cada barra (bool / 0-1)
+        fill_prices: Precio de ejecución por barra (default: close)
+        initial_capital: Capital inicial (si no hay estado previo)
+        commission: Comisión por lado en fracción
+        position_size: Fracción del cash invertida en cada entrada
+        state: Estado de un tramo anterior (simulación por tramos)
+
+    Returns:
+        SimulationResult con equity por barra y columnas de trades
+    """
+    close = np.asarray(close, dtype=np.float64)
+    pos = np.asarray(positions, dtype=bool)
+    fill = close if fill_prices is None else np.asarray(fill_prices, dtype=np.float64)
+    state = state or SimulationState(cash=initial_capital)
+    n = len(close)
+    offset = state.bars_processed
+
+    if n == 0:
+        return SimulationResult(equity=np.empty(0), trades=_empty_trades(), state=state)
+
+    prev = np.empty(n, dtype=bool)
+    prev[0] = state.in_position
+    prev[1:] = pos[:-1]
+    entry_flags = pos & ~prev
+    exit_flags = ~pos & prev
+    entries = np.flatnonzero(entry_flags)
+    exits = np.flatnonzero(exit_flags)
+
+    # 1. Trade arrastrado del tramo anterior (se cierra en la primera salida)
+    cash_start = state.cash
+    carried_closed = state.in_position and exits.size > 0
+    if carried_closed:
+        carried_exit = exits[0]
+        exit_fill = fill[carried_exit]
+        carried_profit = state.size * (exit_fill - state.entry_price) - state.size * exit_fill * commission * 2
+        cash_start = state.cash + carried_profit
+        exits = exits[1:]
+
+    # 2. Trades nuevos: cash tras cada cierre = cumprod de factores de crecimiento
+    closed = exits.size
+    entry_price = fill[entries]
+    exit_price = fill[exits]
+    growth = 1 + position_size * ((exit_price - entry_price[:closed]) - 2 * commission * exit_price) / entry_price[:closed]
+    cash_after = cash_start * np.cumprod(growth)
+    cash_before = np.concatenate(([cash_start], cash_after))[:entries.size]
+    sizes = position_size * cash_before / entry_price
+    profit = cash_after - cash_before[:closed]
+
+    # 3. Equity por barra: cash realizado + PnL no realizado de la posición abierta
+    cash_levels = np.concatenate(([state.cash], [cash_start] if carried_closed else [], cash_after))
+    realized = cash_levels[np.cumsum(exit_flags)]
+
+    trade_id = np.cumsum(entry_flags) - 1
+    has_new = trade_id >= 0
+    safe_id = np.where(has_new, trade_id, 0)
+    held_entry = np.where(has_new, entry_price[safe_id] if entries.size else 0.0, state.entry_price)
+    held_size = np.where(has_new, sizes[safe_id] if entries.size else 0.0, state.size)
+    equity = realized + np.where(pos, held_size * (close - held_entry), 0.0)
+
+    # 4. Tabla de trades cerrados (índices globales)
+    trades = {
+        "entry_index": entries[:closed] + offset,
+        "exit_index": exits + offset,
+        "entry_price": entry_price[:closed],
+        "exit_price": exit_price,
+        "size": sizes[:closed],
+        "profit": profit
+    }
+    if carried_closed:
+        trades = {
+            "entry_index": np.concatenate(([state.entry_index], trades["entry_index"])),
+            "exit_index": np.concatenate(([carried_exit + offset], trades["exit_index"])),
+            "entry_price": np.concatenate(([state.entry_price], trades["entry_price"])),
+            "exit_price": np.concatenate(([exit_fill], trades["exit_price"])),
+            "size": np.concatenate(([state.size], trades["size"])),
+            "profit": np.concatenate(([carried_profit], trades["profit"]))
+        }
+    notional = trades["entry_price"] * trades["size"]
+    trades["return_pct"] = np.divide(
+        trades["profit"] * 100, notional, out=np.zeros_like(notional), where=notional != 0
+    )
+
+    # 5. Estado final para el siguiente tramo
+    in_position = bool(pos[-1])
+    if in_position and entries.size > closed:
+        new_state = SimulationState(
+            cash=float(cash_levels[-1]),
+            in_position=True,
+            entry_price=float(entry_price[-1]),
+            size=float(sizes[-1]),
+            entry_index=int(entries[-1] + offset),
+            bars_processed=offset + n
+        )
+    elif in_position:
+        new_state = SimulationState(
+            cash=state.cash,
+            in_position=True,
+            entry_price=state.entry_price,
+            size=state.size,
+            entry_index=state.entry_index,
+            bars_processed=offset + n
+        )
+    else:
+        new_state = SimulationState(cash=float(cash_levels[-1]), bars_processed=offset + n)
+
+    return SimulationResult(
+        equity=equity,
+        trades=trades,
+        state=new_state,
+        exposure_bars=int(np.count_nonzero(pos))
+    )
+
+
+def trades_to_records(trades: Dict[str, np.ndarray], index: pd.DatetimeIndex) -> List[Dict]:
+    """
+    Convierte las columnas de trades a la lista de dicts que expone la API.
+    Solo se usa en el borde HTTP; el motor trabaja con columnas.
+
+    Args:
+        trades: Columnas de trades (índices de barra globales)
+        index: Índice temporal completo de la serie simulada
+    """
+    entry_dates = index[trades["entry_index"]].strftime("%Y-%m-%d %H:%M")
+    exit_dates = index[trades["exit_index"]].strftime("%Y-%m-%d %H:%M")
+    return [
+        {
+            "entry_date": entry_date,
+            "exit_date": exit_date,
+            "entry_price": entry_price,
+            "exit_price": exit_price,
+            "size": size,
+            "profit": profit,
+            "return_pct": return_pct
+        }
+        for entry_date, exit_date, entry_price, exit_price, size, profit, return_pct in zip(
+            entry_dates,
+            exit_dates,
+            trades["entry_price"].tolist(),
+            trades["exit_price"].tolist(),
+            trades["size"].tolist(),
+            trades["profit"].tolist(),
+            trades["return_pct"].tolist()
+        )
+    ]
+
+
+def _empty_trades() -> Dict[str, np.ndarray]:
+    trades = {column: np.empty(0, dtype=np.float64) for column in TRADE_COLUMNS}
+    trades["entry_index"] = np.empty(0, dtype=np.int64)
+    trades["exit_index"] = np.empty(0, dtype=np.int64)
+    return trades
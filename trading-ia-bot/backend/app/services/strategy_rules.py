@@ -0,0 +1,475 @@
+"""
+DSL de reglas de estrategia
+Convierte condiciones sobre indicadores ("RSI(14) < 30 and close > EMA(200)")
+en vectores de posición por barra que consume el motor de simulación
+"""
+
+import re
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.services.indicators import bind_params, compute_indicator, resolve_indicator
+
+
+MAX_EXPRESSION_LENGTH = 2000
+# Profundidad máxima del árbol (paréntesis, not, signos y cadenas de operadores):
+# el parser y el evaluador son recursivos
+MAX_NESTING_DEPTH = 64
+
+PRICE_SERIES = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+
+_TOKEN = re.compile(
+    r"\s*(?:(?P<number>\d+(?:\.\d+)?)|(?P<name>[A-Za-z_][A-Za-z0-9_]*)|(?P<op><=|>=|==|!=|[<>+\-*/()\[\],.]))"
+)
+
+# (nombre, parámetros, salida) → arrays de salida
+IndicatorKey = Tuple[str, Tuple[Tuple[str, float], ...]]
+IndicatorFn = Callable[[str, Dict[str, float]], Dict[str, np.ndarray]]
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# PARSER
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _tokenize(expression: str) -> List[Tuple[str, str]]:
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"La regla excede {MAX_EXPRESSION_LENGTH} caracteres")
+
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match:
+            raise ValueError(f"Carácter inesperado en la regla: '{expression[position:].strip()[:10]}'")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "name" and value.lower() in ("and", "or", "not", "crosses_above", "crosses_below"):
+            kind, value = "keyword", value.lower()
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    Descenso recursivo. Gramática:
+        expr       := and ("or" and)*
+        and        := not ("and" not)*
+        not        := "not" not | comparison
+        comparison := sum (("<" | "<=" | ">" | ">=" | "==" | "!=" | "crosses_above" | "crosses_below") sum)?
+        sum        := product (("+" | "-") product)*
+        product    := unary (("*" | "/") unary)*
+        unary      := "-" unary | atom ("[" entero "]")?
+        atom       := número | "(" expr ")" | precio | INDICADOR ("(" args ")")? ("." salida)?
+    """
+
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.position = 0
+        self.depth = 0
+
+    def parse(self) -> tuple:
+        node = self._or()
+        if self.position < len(self.tokens):
+            raise ValueError(f"Token inesperado: '{self.tokens[self.position][1]}'")
+        if _tree_depth(node) > MAX_NESTING_DEPTH:
+            raise ValueError(f"La regla excede {MAX_NESTING_DEPTH} niveles de anidamiento")
+        return node
+
+    def _nest(self) -> None:
+        # Cada paréntesis, not o signo es un nivel más de recursión
+        self.depth += 1
+        if self.depth > MAX_NESTING_DEPTH:
+            raise ValueError(f"La regla excede {MAX_NESTING_DEPTH} niveles de anidamiento")
+
+    def _peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _accept(self, *values: str) -> Optional[str]:
+        token = self._peek()
+        if token and token[0] in ("op", "keyword") and token[1] in values:
+            self.position += 1
+            return token[1]
+        return None
+
+    def _expect(self, value: str) -> None:
+        if not self._accept(value):
+            found = self._peek()
+            raise ValueError(f"Se esperaba '{value}'" + (f" y se encontró '{found[1]}'" if found else " al final de la regla"))
+
+    def _or(self) -> tuple:
+        node = self._and()
+        while self._accept("or"):
+            node = ("or", node, self._and())
+        return node
+
+    def _and(self) -> tuple:
+        node = self._not()
+        while self._accept("and"):
+            node = ("and", node, self._not())
+        return node
+
+    def _not(self) -> tuple:
+        if self._accept("not"):
+            self._nest()
+            node = ("not", self._not())
+            self.depth -= 1
+            return node
+        return self._comparison()
+
+    def _comparison(self) -> tuple:
+        node = self._sum()
+        op = self._accept("<", "<=", ">", ">=", "==", "!=", "crosses_above", "crosses_below")
+        if op:
+            node = ("cmp", op, node, self._sum())
+        return node
+
+    def _sum(self) -> tuple:
+        node = self._product()
+        while True:
+            op = self._accept("+", "-")
+            if not op:
+                return node
+            node = ("math", op, node, self._product())
+
+    def _product(self) -> tuple:
+        node = self._unary()
+        while True:
+            op = self._accept("*", "/")
+            if not op:
+                return node
+            node = ("math", op, node, self._unary())
+
+    def _unary(self) -> tuple:
+        if self._accept("-"):
+            self._nest()
+            node = ("neg", self._unary())
+            self.depth -= 1
+            return node
+        node = self._atom()
+        if self._accept("["):
+            token = self._peek()
+            if not token or token[0] != "number" or "." in token[1]:
+                raise ValueError("El desfase [n] debe ser un entero")
+            self.position += 1
+            self._expect("]")
+            node = ("shift", node, int(token[1]))
+        return node
+
+    def _atom(self) -> tuple:
+        token = self._peek()
+        if token is None:
+            raise ValueError("Regla incompleta")
+
+        kind, value = token
+        if kind == "number":
+            self.position += 1
+            return ("num", float(value))
+        if self._accept("("):
+            self._nest()
+            node = self._or()
+            self._expect(")")
+            self.depth -= 1
+            return node
+        if kind != "name":
+            raise ValueError(f"Token inesperado: '{value}'")
+
+        self.position += 1
+        if value.lower() in PRICE_SERIES:
+            return ("price", PRICE_SERIES[value.lower()])
+
+        spec = resolve_indicator(value)
+        args = []
+        if self._accept("("):
+            if not self._accept(")"):
+                while True:
+                    number = self._peek()
+                    if not number or number[0] != "number":
+                        raise ValueError(f"Los parámetros de {spec.name} deben ser números")
+                    args.append(float(number[1]))
+                    self.position += 1
+                    if self._accept(")"):
+                        break
+                    self._expect(",")
+
+        output = spec.default_output
+        if self._accept("."):
+            name = self._peek()
+            if not name or name[0] != "name" or name[1].lower() not in spec.outputs:
+                raise ValueError(f"{spec.name} tiene las salidas: {', '.join(spec.outputs)}")
+            output = name[1].lower()
+            self.position += 1
+
+        params = bind_params(spec, args)
+        return ("indicator", spec.name, tuple(params.items()), output)
+
+
+def _tree_depth(node: tuple) -> int:
+    """
+    Profundidad del árbol sin recursión ("1 + 1 + ... + 1" se parsea con un
+    bucle pero anida un nodo por operador).
+    """
+    depth = 0
+    stack = [(node, 1)]
+    while stack:
+        node, level = stack.pop()
+        depth = max(depth, level)
+        stack.extend((child, level + 1) for child in node[1:] if isinstance(child, tuple) and child and isinstance(child[0], str))
+    return depth
+
+
+def parse_rule(expression: str) -> tuple:
+    """
+    Parsea una regla y retorna su árbol (lanza ValueError si es inválida).
+    """
+    if not expression or not expression.strip():
+        raise ValueError("La regla está vacía")
+    return _Parser(_tokenize(expression)).parse()
+
+
+def rule_indicators(node: tuple, found: Optional[Set[IndicatorKey]] = None) -> Set[IndicatorKey]:
+    """
+    Indicadores (nombre, parámetros) que usa una regla.
+    """
+    found = set() if found is None else found
+    if node[0] == "indicator":
+        found.add((node[1], node[2]))
+    for child in node[1:]:
+        if isinstance(child, tuple) and child and isinstance(child[0], str):
+            rule_indicators(child, found)
+    return found
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# EVALUACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _shift(values: np.ndarray, bars: int) -> np.ndarray:
+    shifted = np.full(len(values), np.nan)
+    if bars < len(values):
+        shifted[bars:] = values[:len(values) - bars]
+    return shifted
+
+
+class _Evaluator:
+    def __init__(self, df: pd.DataFrame, indicator_fn: IndicatorFn):
+        self.df = df
+        self.indicator_fn = indicator_fn
+        self._computed: Dict[IndicatorKey, Dict[str, np.ndarray]] = {}
+
+    def evaluate(self, node: tuple):
+        kind = node[0]
+
+        if kind == "num":
+            return node[1]
+        if kind == "price":
+            return self.df[node[1]].to_numpy(dtype=np.float64)
+        if kind == "indicator":
+            _, name, params, output = node
+            key = (name, params)
+            if key not in self._computed:
+                self._computed[key] = self.indicator_fn(name, dict(params))
+            return self._computed[key][output]
+        if kind == "shift":
+            return _shift(np.asarray(self._numeric(node[1]), dtype=np.float64), node[2])
+        if kind == "neg":
+            return -self._numeric(node[1])
+        if kind == "math":
+            left, right = self._numeric(node[2]), self._numeric(node[3])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return {"+": np.add, "-": np.subtract, "*": np.multiply, "/": np.divide}[node[1]](left, right)
+        if kind == "cmp":
+            return self._compare(node[1], self._numeric(node[2]), self._numeric(node[3]))
+        if kind == "and":
+            return self._mask(node[1]) & self._mask(node[2])
+        if kind == "or":
+            return self._mask(node[1]) | self._mask(node[2])
+        if kind == "not":
+            return ~self._mask(node[1])
+        raise ValueError(f"Nodo desconocido: {kind}")
+
+    def _numeric(self, node: tuple):
+        value = self.evaluate(node)
+        if isinstance(value, np.ndarray) and value.dtype == bool:
+            raise ValueError("Una condición no puede usarse como número")
+        return value
+
+    def _mask(self, node: tuple) -> np.ndarray:
+        value = self.evaluate(node)
+        if not (isinstance(value, np.ndarray) and value.dtype == bool):
+            raise ValueError("Se esperaba una condición (comparación) y se encontró un valor numérico")
+        return value
+
+    def _compare(self, op: str, left, right) -> np.ndarray:
+        n = len(self.df)
+        left = np.broadcast_to(np.asarray(left, dtype=np.float64), (n,))
+        right = np.broadcast_to(np.asarray(right, dtype=np.float64), (n,))
+
+        # Las comparaciones con NaN (periodo de calentamiento) dan False
+        with np.errstate(invalid="ignore"):
+            if op == "crosses_above":
+                return (left > right) & (_shift(left, 1) <= _shift(right, 1))
+            if op == "crosses_below":
+                return (left < right) & (_shift(left, 1) >= _shift(right, 1))
+            return {
+                "<": np.less, "<=": np.less_equal, ">": np.greater,
+                ">=": np.greater_equal, "==": np.equal, "!=": np.not_equal
+            }[op](left, right)
+
+
+def evaluate_rule(df: pd.DataFrame, expression: str, indicator_fn: Optional[IndicatorFn] = None) -> np.ndarray:
+    """
+    Evalúa una regla sobre todas las barras.
+
+    Returns:
+        Máscara booleana por barra
+    """
+    indicator_fn = indicator_fn or (lambda name, params: compute_indicator(df, name, params))
+    return _Evaluator(df, indicator_fn)._mask(parse_rule(expression))
+
+
+def rules_to_positions(entry: np.ndarray, exit: np.ndarray, initial: bool = False) -> np.ndarray:
+    """
+    Posición long por barra: entra cuando se cumple entry y sale cuando se
+    cumple exit (si ambas coinciden en una barra se mantiene la posición).
+    Se ejecuta al cierre de la barra de la señal, igual que las señales.
+
+    Args:
+        initial: Posición al empezar (la del tramo anterior en modo por tramos)
+    """
+    codes = np.where(entry & ~exit, 1.0, np.where(exit & ~entry, -1.0, np.nan))
+    state = pd.Series(codes).ffill().fillna(1 if initial else -1).to_numpy()
+    return state > 0
+
+
+def strategy_masks(
+    df: pd.DataFrame,
+    strategy: Dict[str, str],
+    indicator_fn: Optional[IndicatorFn] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Args:
+        strategy: {"entry": "<regla>", "exit": "<regla>"} (sin exit se sale
+                  cuando deja de cumplirse entry)
+
+    Returns:
+        (máscara de entrada, máscara de salida) por barra
+    """
+    indicator_fn = indicator_fn or (lambda name, params: compute_indicator(df, name, params))
+    evaluator = _Evaluator(df, indicator_fn)
+
+    entry = evaluator._mask(parse_rule(strategy.get("entry", "")))
+    exit_rule = strategy.get("exit")
+    exit = evaluator._mask(parse_rule(exit_rule)) if exit_rule else ~entry
+    return entry, exit
+
+
+def strategy_positions(
+    df: pd.DataFrame,
+    strategy: Dict[str, str],
+    indicator_fn: Optional[IndicatorFn] = None
+) -> np.ndarray:
+    """
+    Returns:
+        Vector booleano de posición por barra
+    """
+    return rules_to_positions(*strategy_masks(df, strategy, indicator_fn))
+
+
+def _lag(node: tuple) -> int:
+    # Barras hacia atrás que mira una expresión además de sus indicadores
+    kind = node[0]
+    if kind in ("num", "price", "indicator"):
+        return 0
+    children = [child for child in node[1:] if isinstance(child, tuple)]
+    lag = max((_lag(child) for child in children), default=0)
+    if kind == "shift":
+        return node[2] + lag
+    if kind == "cmp" and node[1] in ("crosses_above", "crosses_below"):
+        return 1 + lag
+    return lag
+
+
+def strategy_lookback(strategy: Dict[str, str]) -> int:
+    """
+    Barras previas necesarias para evaluar las reglas en una barra igual que
+    con todo el histórico (calentamiento de indicadores + desfases).
+    Lanza ValueError si algún indicador no admite cálculo por tramos.
+    """
+    lookback = 0
+    for rule in (strategy.get("entry"), strategy.get("exit")):
+        if not rule:
+            continue
+        node = parse_rule(rule)
+        warmup = 0
+        for name, params in rule_indicators(node):
+            bars = resolve_indicator(name).warmup_bars(dict(params))
+            if bars is None:
+                raise ValueError(f"{name} depende de todo el histórico y no admite el modo por tramos")
+            warmup = max(warmup, bars)
+        lookback = max(lookback, warmup + _lag(node))
+    return lookback
+
+
+def format_strategy(strategy: Dict[str, str], params: Dict[str, float]) -> Dict[str, str]:
+    """
+    Sustituye los marcadores {nombre} de una plantilla de reglas por valores
+    numéricos (barridos de umbrales: "RSI(14) < {oversold}").
+    """
+    def replace(match: re.Match) -> str:
+        name = match.group(1)
+        if name not in params:
+            raise ValueError(f"Falta el parámetro de estrategia '{name}'")
+        value = params[name]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"El parámetro '{name}' debe ser numérico")
+        return str(value) if isinstance(value, int) else np.format_float_positional(value, trim="-")
+
+    return {
+        side: re.sub(r"\{(\w+)\}", replace, rule)
+        for side, rule in strategy.items() if rule
+    }
+
+
+def strategy_indicators(strategy: Dict[str, str]) -> Set[IndicatorKey]:
+    """
+    Indicadores (nombre, parámetros) que usan las reglas entry/exit.
+    """
+    found: Set[IndicatorKey] = set()
+    for rule in (strategy.get("entry"), strategy.get("exit")):
+        if rule:
+            rule_indicators(parse_rule(rule), found)
+    return found
+
+
+def _is_condition(node: tuple) -> bool:
+    """
+    Comprueba los tipos del árbol sin datos, con los mismos errores que el
+    evaluador, y retorna si el nodo es una condición (máscara booleana).
+    """
+    kind = node[0]
+    if kind in ("and", "or", "not"):
+        if not all(_is_condition(child) for child in node[1:]):
+            raise ValueError("Se esperaba una condición (comparación) y se encontró un valor numérico")
+        return True
+
+    children = {"shift": node[1:2], "neg": node[1:2], "math": node[2:], "cmp": node[2:]}.get(kind, ())
+    if any(_is_condition(child) for child in children):
+        raise ValueError("Una condición no puede usarse como número")
+    return kind == "cmp"
+
+
+def validate_strategy(strategy: Dict[str, str]) -> None:
+    """
+    Valida la sintaxis de las reglas sin datos (lanza ValueError): cada regla
+    debe ser una condición, no un valor numérico como "MACD.hist".
+    """
+    rules = {"entry": strategy.get("entry", "")}
+    if strategy.get("exit"):
+        rules["exit"] = strategy["exit"]
+    for side, rule in rules.items():
+        if not _is_condition(parse_rule(rule)):
+            raise ValueError(f"La regla {side} debe ser una condición (comparación), no un valor numérico")
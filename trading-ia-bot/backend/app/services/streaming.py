@@ -0,0 +1,35 @@
+"""
+Helpers de streaming
+Formato Server-Sent Events para respuestas incrementales
+"""
+
+import json
+from typing import Any
+
+import numpy as np
+
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# Cabeceras para que proxies (nginx) no acumulen el stream en buffer
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
+
+
+def sse_event(event: str, data: Any) -> str:
+    """
+    Serializa un evento SSE (event + data JSON en una sola línea).
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=_json_default)}\n\n"
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
@@ -0,0 +1,345 @@
+"""
+Optimización por barrido de parámetros (grid search)
+Los datos se cargan una vez y las variantes se reparten en un ProcessPoolExecutor
+que lee los precios (y los indicadores ya calculados) desde memoria compartida
+"""
+
+import asyncio
+import itertools
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.config import settings
+from app.services.metrics import PERIODS_PER_YEAR, compute_metrics
+from app.services.price_store import OHLCV_COLUMNS
+from app.services.simulation import demo_positions, simulate
+from app.services.strategy_rules import IndicatorFn, format_strategy, strategy_indicators, strategy_positions
+
+
+# Parámetros de cuenta; el resto de claves del grid se tratan como parámetros de estrategia
+ACCOUNT_PARAMS = ("initial_capital", "commission", "position_size")
+
+RANKABLE_METRICS = (
+    "total_return_pct",
+    "sharpe_ratio",
+    "max_drawdown_pct",
+    "win_rate_pct",
+    "profit_factor",
+    "sortino_ratio",
+    "calmar_ratio",
+    "exposure_pct",
+    "final_capital",
+    "total_trades"
+)
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# GRID
+# ═════════════════════════════════════════════════════════════════════════════
+
+def expand_grid(parameters: Dict[str, List], strategy_params: Optional[Dict[str, List]] = None) -> List[Dict]:
+    """
+    Producto cartesiano de los rangos de parámetros.
+
+    Returns:
+        [{"initial_capital": ..., "commission": ..., "position_size": ..., "strategy": {...}}, ...]
+    """
+    strategy_params = strategy_params or {}
+    account_keys = [k for k in ACCOUNT_PARAMS if k in parameters]
+    unknown = set(parameters) - set(ACCOUNT_PARAMS)
+    if unknown:
+        raise ValueError(f"Parámetros no soportados: {', '.join(sorted(unknown))}")
+
+    account_values = [parameters[k] for k in account_keys]
+    strategy_keys = list(strategy_params)
+    strategy_values = [strategy_params[k] for k in strategy_keys]
+
+    variants = []
+    for account_combo in itertools.product(*account_values):
+        for strategy_combo in itertools.product(*strategy_values):
+            variant = {
+                "initial_capital": settings.backtest_initial_capital,
+                "commission": settings.backtest_commission,
+                "position_size": 0.95
+            }
+            variant.update(zip(account_keys, account_combo))
+            variant["strategy"] = dict(zip(strategy_keys, strategy_combo))
+            variants.append(variant)
+    return variants
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# REGLAS (barrido de umbrales sobre indicadores)
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _array_name(name: str, params: tuple, output: str) -> str:
+    return f"{name}|{','.join(f'{k}={v}' for k, v in params)}|{output}"
+
+
+def rule_series(
+    df: pd.DataFrame,
+    rules: Dict[str, str],
+    variants: List[Dict],
+    indicator_fn: IndicatorFn
+) -> Dict[str, np.ndarray]:
+    """
+    Calcula una sola vez cada indicador que usan las variantes de una
+    plantilla de reglas (p. ej. "RSI(14) < {oversold}").
+
+    Returns:
+        {nombre: array} con OHLCV y las salidas de los indicadores, para
+        compartir con los procesos del barrido
+    """
+    indicators = set()
+    for strategy in {tuple(sorted(variant["strategy"].items())) for variant in variants}:
+        indicators |= strategy_indicators(format_strategy(rules, dict(strategy)))
+
+    series = {column: df[column].to_numpy(dtype=np.float64) for column in OHLCV_COLUMNS}
+    for name, params in sorted(indicators):
+        for output, values in indicator_fn(name, dict(params)).items():
+            series[_array_name(name, params, output)] = values
+    return series
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# WORKER (se ejecuta en procesos hijos)
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _strategy_positions(
+    close: np.ndarray,
+    strategy: Dict,
+    series: Optional[Dict[str, np.ndarray]] = None,
+    rules: Optional[Dict[str, str]] = None
+) -> np.ndarray:
+    """
+    Vector de posición para una combinación de parámetros de estrategia.
+    Con plantilla de reglas se evalúan sobre los indicadores precalculados;
+    si no, estrategia demo: trades_count entradas/salidas aleatorias con semilla.
+    """
+    if rules:
+        df = pd.DataFrame({column: series[column] for column in OHLCV_COLUMNS}, copy=False)
+
+        def indicator_fn(name: str, params: Dict[str, float]) -> Dict[str, np.ndarray]:
+            key = tuple(params.items())
+            prefix = _array_name(name, key, "")
+            return {array[len(prefix):]: values for array, values in series.items() if array.startswith(prefix)}
+
+        return strategy_positions(df, format_strategy(rules, strategy), indicator_fn)
+
+    return demo_positions(len(close), int(strategy.get("trades_count", 50)), strategy.get("seed"))
+
+
+def run_variant_batch(
+    shm_name: str,
+    length: int,
+    variants: List[Dict],
+    names: Sequence[str] = ("Close",),
+    rules: Optional[Dict[str, str]] = None,
+    grid_length: Optional[int] = None,
+    periods_per_year: float = PERIODS_PER_YEAR
+) -> List[Dict]:
+    """
+    Ejecuta un lote de variantes sobre los arrays en memoria compartida
+    (una fila por nombre de names; la primera es el cierre, y detrás la
+    rejilla de retornos si grid_length no es None).
+    """
+    # Los hijos (spawn) comparten el resource tracker del padre, que es
+    # quien hace unlink al terminar el barrido
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        matrix, grid_positions = _series_views(shm, length, len(names), grid_length)
+        series = dict(zip(names, matrix))
+        close = matrix[0]
+        positions_cache: Dict[tuple, np.ndarray] = {}
+        rows = []
+
+        for variant in variants:
+            strategy_key = tuple(sorted(variant["strategy"].items()))
+            if strategy_key not in positions_cache:
+                positions_cache[strategy_key] = _strategy_positions(close, variant["strategy"], series, rules)
+
+            sim = simulate(
+                close,
+                positions_cache[strategy_key],
+                initial_capital=variant["initial_capital"],
+                commission=variant["commission"],
+                position_size=variant["position_size"]
+            )
+            metrics = compute_metrics(
+                sim.trades,
+                sim.equity,
+                variant["initial_capital"],
+                sim.exposure_bars,
+                grid_positions,
+                periods_per_year
+            )
+
+            rows.append({
+                **variant,
+                "final_capital": round(float(sim.equity[-1]), 2),
+                "total_trades": int(len(sim.trades["profit"])),
+                **metrics
+            })
+
+        del close, series, matrix, grid_positions, positions_cache
+        return rows
+    finally:
+        shm.close()
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# ORQUESTACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Pool de procesos compartido para barridos (contexto spawn: seguro con hilos).
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.sweep_max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def _series_views(
+    shm: shared_memory.SharedMemory,
+    length: int,
+    rows: int,
+    grid_length: Optional[int] = None
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    # Matriz float64 (rows x length) seguida de la rejilla int64, si la hay
+    matrix = np.ndarray((rows, length), dtype=np.float64, buffer=shm.buf)
+    if grid_length is None:
+        return matrix, None
+    grid = np.ndarray((grid_length,), dtype=np.int64, buffer=shm.buf, offset=matrix.nbytes)
+    return matrix, grid
+
+
+@contextmanager
+def shared_series(
+    close: np.ndarray,
+    series: Optional[Dict[str, np.ndarray]] = None,
+    grid_positions: Optional[np.ndarray] = None
+) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Copia el cierre y los arrays adicionales a un bloque de memoria compartida
+    (una fila por nombre; la primera es el cierre) para los procesos del pool.
+    La rejilla de retornos (ReturnGrid.positions()), si se pasa, va en el
+    mismo bloque detrás de la matriz.
+
+    Yields:
+        (nombre del bloque, nombres de las filas)
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    names = ["Close"] + [name for name in (series or {}) if name != "Close"]
+    grid_length = None if grid_positions is None else len(grid_positions)
+    size = close.nbytes * len(names) + (grid_length or 0) * np.dtype(np.int64).itemsize
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        matrix, grid = _series_views(shm, len(close), len(names), grid_length)
+        matrix[0] = close
+        for row, name in enumerate(names[1:], start=1):
+            matrix[row] = series[name]
+        if grid is not None:
+            grid[:] = grid_positions
+        del matrix, grid
+        yield shm.name, names
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+async def run_sweep(
+    close: np.ndarray,
+    variants: List[Dict],
+    series: Optional[Dict[str, np.ndarray]] = None,
+    rules: Optional[Dict[str, str]] = None,
+    grid_positions: Optional[np.ndarray] = None,
+    periods_per_year: float = PERIODS_PER_YEAR
+) -> AsyncIterator[Dict]:
+    """
+    Reparte las variantes en lotes sobre el pool de procesos.
+
+    Args:
+        close: Precios de cierre
+        variants: Variantes de expand_grid
+        series: Arrays adicionales para las reglas (ver rule_series)
+        rules: Plantilla de reglas entry/exit con marcadores {parámetro}
+        grid_positions: Rejilla de retornos de las métricas (ReturnGrid.positions())
+        periods_per_year: Periodos por año de la rejilla
+
+    Yields:
+        {"event": "progress", "completed": k, "total": n, "rows": [...]} por lote terminado
+    """
+    grid_length = None if grid_positions is None else len(grid_positions)
+    with shared_series(close, series, grid_positions) as (shm_name, names):
+        pool = get_process_pool()
+        workers = settings.sweep_max_workers or 1
+        batch_size = max(1, math.ceil(len(variants) / (workers * 4)))
+        batches = [variants[i:i + batch_size] for i in range(0, len(variants), batch_size)]
+
+        loop = asyncio.get_running_loop()
+        futures = [
+            loop.run_in_executor(
+                pool, run_variant_batch, shm_name, len(close), batch, names, rules, grid_length, periods_per_year
+            )
+            for batch in batches
+        ]
+
+        completed = 0
+        try:
+            for future in asyncio.as_completed(futures):
+                rows = await future
+                completed += len(rows)
+                yield {
+                    "event": "progress",
+                    "completed": completed,
+                    "total": len(variants),
+                    "rows": rows
+                }
+        finally:
+            for future in futures:
+                future.cancel()
+            # Esperar a que los lotes en curso suelten la memoria compartida
+            await asyncio.gather(*futures, return_exceptions=True)
+
+
+def rank_value(row: Dict, rank_by: str) -> float:
+    """
+    Valor de orden de una variante: profit_factor None (sin pérdidas) es el mejor.
+    """
+    value = row[rank_by]
+    return math.inf if value is None else value
+
+
+def rank_results(rows: List[Dict], rank_by: str = "sharpe_ratio", top: Optional[int] = None) -> List[Dict]:
+    """
+    Ordena las variantes por una métrica (mayor es mejor) y añade el ranking.
+    """
+    if rank_by not in RANKABLE_METRICS:
+        raise ValueError(f"rank_by debe ser uno de: {', '.join(RANKABLE_METRICS)}")
+
+    ranked = sorted(rows, key=lambda row: rank_value(row, rank_by), reverse=True)
+    if top:
+        ranked = ranked[:top]
+    return [{"rank": i + 1, **row} for i, row in enumerate(ranked)]
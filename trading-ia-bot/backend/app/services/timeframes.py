@@ -0,0 +1,227 @@
+"""
+Timeframes y remuestreo OHLCV
+Traduce timeframes MT5 (M1..MN1 y personalizados como M3, H6 o D2) a la
+resolución base que sirve el proveedor y deriva el resto localmente
+"""
+
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+from pandas.tseries.offsets import Tick
+
+from app.services.price_store import PriceStore
+
+
+# Intervalos base de yfinance: (minutos, días máximos de histórico o None)
+# Se usan solo estos para que cada serie base se descargue una vez y se
+# compartan entre timeframes (H4 y H1 salen de 1h; D1, W1 y MN1 de 1d)
+PROVIDER_INTERVALS = {
+    "1m": (1, 29),
+    "5m": (5, 59),
+    "15m": (15, 59),
+    "30m": (30, 59),
+    "1h": (60, 729),
+    "1d": (1440, None),
+}
+
+_UNITS = {"M": 1, "H": 60, "D": 1440}
+_PATTERN = re.compile(r"^(MN|M|H|D|W)(\d+)$")
+
+_AGGREGATION = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+
+# Lunes a medianoche: origen fijo de las ventanas (semanas de N días empiezan en lunes)
+_ORIGIN = pd.Timestamp("1970-01-05")
+
+
+@dataclass(frozen=True)
+class Timeframe:
+    """Timeframe resuelto: de qué intervalo base sale y cómo se agrega"""
+    name: str
+    source: str
+    rule: Optional[str]
+
+    @property
+    def store_interval(self) -> str:
+        # Las series derivadas se guardan con el nombre MT5 (H4, MN1, ...)
+        return self.source if self.rule is None else self.name
+
+    @property
+    def max_days(self) -> Optional[int]:
+        return PROVIDER_INTERVALS[self.source][1]
+
+
+def resolve_timeframe(timeframe: str) -> Timeframe:
+    """
+    Args:
+        timeframe: Timeframe MT5 (M1, M5, M15, M30, H1, H4, D1, W1, MN1) o
+                   personalizado (M3, H6, D2, ...). "MN" equivale a MN1.
+
+    Returns:
+        Timeframe con el intervalo base y la regla de agregación (None si el
+        proveedor lo sirve directamente)
+    """
+    name = (timeframe or "").strip().upper()
+    if name == "MN":
+        name = "MN1"
+    match = _PATTERN.match(name)
+    if not match or int(match.group(2)) < 1:
+        raise ValueError(f"Timeframe no soportado: {timeframe}. Formato: M<n>, H<n>, D<n>, W<n> o MN<n>")
+
+    unit, count = match.group(1), int(match.group(2))
+    if unit == "MN":
+        return Timeframe(name, "1d", f"{count}MS")
+    if unit == "W":
+        # Semanas de lunes a domingo, etiquetadas con el lunes (en minutos:
+        # los días de pandas son de calendario y no se anclan al origen)
+        return Timeframe(name, "1d", "W-MON" if count == 1 else f"{count * 7 * 1440}min")
+
+    minutes = count * _UNITS[unit]
+    # El intervalo base más grueso que divide al timeframe
+    source = max(
+        (interval for interval, (size, _) in PROVIDER_INTERVALS.items() if minutes % size == 0),
+        key=lambda interval: PROVIDER_INTERVALS[interval][0]
+    )
+    if PROVIDER_INTERVALS[source][0] == minutes:
+        return Timeframe(name, source, None)
+    return Timeframe(name, source, f"{minutes}min")
+
+
+def resample_ohlcv(df: pd.DataFrame, rule: str) -> pd.DataFrame:
+    """
+    Agrega barras OHLCV a una regla de pandas (vectorizado). Las ventanas se
+    anclan a un origen fijo para que recalcular solo la cola produzca las
+    mismas barras que el cálculo completo.
+    """
+    if df.empty:
+        return df
+    # Semanas y meses (W-MON, MS) ya van anclados al calendario
+    anchor = {"origin": _ORIGIN} if isinstance(to_offset(rule), Tick) else {}
+    bars = df.resample(rule, label="left", closed="left", **anchor).agg(_AGGREGATION)
+    return bars.dropna(subset=["Close"])
+
+
+def provider_start(timeframe: Timeframe, start: datetime, end: datetime) -> datetime:
+    """
+    Recorta el inicio al histórico máximo que sirve el proveedor.
+    """
+    if timeframe.max_days is None:
+        return start
+    return max(start, end - timedelta(days=timeframe.max_days))
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# LECTURA
+# ═════════════════════════════════════════════════════════════════════════════
+
+def get_bars(store: PriceStore, symbol: str, timeframe: str, start: datetime, end: datetime) -> pd.DataFrame:
+    """
+    Barras de [start, end) en cualquier timeframe: descarga (una vez) la
+    serie base y deriva el timeframe pedido desde la caché.
+    """
+    tf = resolve_timeframe(timeframe)
+    fetch_start = provider_start(tf, start, end)
+    base = store.get(symbol, tf.source, fetch_start, end)
+    if tf.rule is None and fetch_start <= start:
+        return base
+
+    # Lo que el proveedor ya no sirve puede seguir en la caché de descargas anteriores
+    if tf.rule is None:
+        bars = store.history(symbol, tf.source)
+    else:
+        bars = store.derive(symbol, tf.source, tf.store_interval, lambda df: resample_ohlcv(df, tf.rule))
+    return _window(bars, start, end)
+
+
+def get_many_bars(
+    store: PriceStore,
+    symbols: List[str],
+    timeframe: str,
+    start: datetime,
+    end: datetime
+) -> Dict[str, pd.DataFrame]:
+    """
+    Igual que get_bars() para varios símbolos (la base se descarga en lote).
+    """
+    tf = resolve_timeframe(timeframe)
+    fetch_start = provider_start(tf, start, end)
+    frames = store.get_many(symbols, tf.source, fetch_start, end)
+    if tf.rule is None and fetch_start <= start:
+        return frames
+
+    derived = {}
+    for symbol in set(symbols):
+        if tf.rule is None:
+            bars = store.history(symbol, tf.source)
+        else:
+            bars = store.derive(symbol, tf.source, tf.store_interval, lambda df: resample_ohlcv(df, tf.rule))
+        derived[symbol] = _window(bars, start, end)
+    return {symbol: derived[symbol] for symbol in symbols}
+
+
+@dataclass
+class BarWindow:
+    """
+    Tramo [start, stop) de una serie almacenada, sobre los arrays
+    memory-mapped de la serie completa: solo se copian a memoria las barras
+    que se piden con frame().
+    """
+    index: np.ndarray
+    columns: Dict[str, np.ndarray] = field(repr=False)
+    start: int
+    stop: int
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        """Índice temporal de la serie completa (sin copiar el mmap)"""
+        return pd.DatetimeIndex(np.asarray(self.index).view("datetime64[ns]"), name="Date", copy=False)
+
+    def frame(self, start: int, stop: int) -> pd.DataFrame:
+        """
+        DataFrame OHLCV de las posiciones absolutas [start, stop) de la serie
+        (pueden quedar antes del tramo, p. ej. para calentar indicadores).
+        """
+        return pd.DataFrame(
+            {column: np.array(values[start:stop]) for column, values in self.columns.items()},
+            index=pd.DatetimeIndex(np.array(self.index[start:stop]).view("datetime64[ns]"), name="Date")
+        )
+
+
+def open_window(store: PriceStore, symbol: str, timeframe: str, start: datetime, end: datetime) -> BarWindow:
+    """
+    Igual que get_bars() pero sin cargar la serie: completa la caché y
+    retorna el tramo [start, end) como BarWindow para leerlo por trozos.
+    """
+    tf = resolve_timeframe(timeframe)
+    store.ensure(symbol, tf.source, provider_start(tf, start, end), end)
+    if tf.rule is not None:
+        # La derivada se persiste en la caché y se lee igual que una serie base
+        store.derive(symbol, tf.source, tf.store_interval, lambda df: resample_ohlcv(df, tf.rule))
+
+    index, columns = store.arrays(symbol, tf.store_interval)
+    bounds = np.array([pd.Timestamp(start).value, pd.Timestamp(end).value], dtype=np.int64)
+    first, stop = np.searchsorted(index, bounds)
+    return BarWindow(index, columns, int(first), int(stop))
+
+
+def _window(df: pd.DataFrame, start: datetime, end: datetime) -> pd.DataFrame:
+    return df[(df.index >= pd.Timestamp(start)) & (df.index < pd.Timestamp(end))]
+
+
+def describe_timeframes(names: List[str]) -> List[Dict]:
+    return [
+        {
+            "timeframe": tf.name,
+            "source_interval": tf.source,
+            "resampled": tf.rule is not None,
+            "max_history_days": tf.max_days
+        }
+        for tf in map(resolve_timeframe, names)
+    ]
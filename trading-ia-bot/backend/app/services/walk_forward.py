@@ -0,0 +1,290 @@
+"""
+Análisis walk-forward
+Divide el histórico en ventanas in-sample / out-of-sample consecutivas,
+optimiza el grid de variantes en cada tramo in-sample, evalúa la mejor en
+el tramo out-of-sample siguiente y encadena las equity out-of-sample.
+Las ventanas se reparten en el pool de procesos del barrido y leen los
+precios y los indicadores desde la misma memoria compartida
+"""
+
+import asyncio
+from multiprocessing import shared_memory
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.config import settings
+from app.services.calendars import ReturnGrid
+from app.services.metrics import PERIODS_PER_YEAR, compute_metrics
+from app.services.simulation import SimulationState, simulate, trades_to_records
+from app.services.sweep import _strategy_positions, get_process_pool, rank_value, shared_series
+
+
+# (inicio in-sample, inicio out-of-sample, fin out-of-sample) en posiciones de barra
+Window = Tuple[int, int, int]
+
+
+def walk_forward_windows(
+    length: int,
+    in_sample_bars: int,
+    out_of_sample_bars: int,
+    anchored: bool = False
+) -> List[Window]:
+    """
+    Ventanas consecutivas: cada tramo out-of-sample empieza donde acaba el
+    anterior, así que juntos cubren la serie desde la barra in_sample_bars.
+
+    Args:
+        length: Barras de la serie
+        in_sample_bars: Barras de optimización de cada ventana
+        out_of_sample_bars: Barras de evaluación (el último tramo puede ser menor)
+        anchored: Si es true el in-sample empieza siempre en la barra 0 y crece
+    """
+    if in_sample_bars < 2 or out_of_sample_bars < 2:
+        raise ValueError("in_sample_bars y out_of_sample_bars deben ser al menos 2")
+    if in_sample_bars + out_of_sample_bars > length:
+        raise ValueError(
+            f"La serie tiene {length} barras: no caben {in_sample_bars} in-sample + {out_of_sample_bars} out-of-sample"
+        )
+
+    windows = []
+    for oos_start in range(in_sample_bars, length, out_of_sample_bars):
+        is_start = 0 if anchored else oos_start - in_sample_bars
+        windows.append((is_start, oos_start, min(oos_start + out_of_sample_bars, length)))
+
+    # Un resto de menos de 2 barras se suma a la ventana anterior
+    if len(windows) > 1 and windows[-1][2] - windows[-1][1] < 2:
+        last = windows.pop()
+        windows[-1] = (windows[-1][0], windows[-1][1], last[2])
+
+    if len(windows) > settings.walk_forward_max_windows:
+        raise ValueError(f"El walk-forward no puede exceder {settings.walk_forward_max_windows} ventanas")
+    return windows
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# WORKER (se ejecuta en procesos hijos)
+# ═════════════════════════════════════════════════════════════════════════════
+
+def run_window(
+    shm_name: str,
+    length: int,
+    window: Window,
+    variants: List[Dict],
+    rank_by: str,
+    names: Sequence[str] = ("Close",),
+    rules: Optional[Dict[str, str]] = None,
+    in_sample_grid: Optional[np.ndarray] = None,
+    out_of_sample_grid: Optional[np.ndarray] = None,
+    periods_per_year: float = PERIODS_PER_YEAR
+) -> Dict:
+    """
+    Optimiza las variantes en el tramo in-sample y simula la mejor en el
+    out-of-sample (cerrando la posición en su última barra). Las reglas solo
+    miran hacia atrás, así que se evalúan sobre la serie hasta el final del
+    out-of-sample.
+    """
+    is_start, oos_start, oos_stop = window
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        matrix = np.ndarray((len(names), length), dtype=np.float64, buffer=shm.buf)
+        series = {name: row[:oos_stop] for name, row in zip(names, matrix)}
+        close = series["Close"]
+        positions_cache: Dict[tuple, np.ndarray] = {}
+        rows = []
+
+        for variant in variants:
+            strategy_key = tuple(sorted(variant["strategy"].items()))
+            if strategy_key not in positions_cache:
+                positions_cache[strategy_key] = _strategy_positions(close, variant["strategy"], series, rules)
+
+            sim = simulate(
+                close[is_start:oos_start],
+                positions_cache[strategy_key][is_start:oos_start],
+                initial_capital=variant["initial_capital"],
+                commission=variant["commission"],
+                position_size=variant["position_size"]
+            )
+            rows.append({
+                **variant,
+                "final_capital": round(float(sim.equity[-1]), 2),
+                "total_trades": int(len(sim.trades["profit"])),
+                **compute_metrics(
+                    sim.trades, sim.equity, variant["initial_capital"], sim.exposure_bars, in_sample_grid, periods_per_year
+                )
+            })
+
+        # Primera variante con la mejor métrica (mismo orden que rank_results)
+        best = max(range(len(rows)), key=lambda i: rank_value(rows[i], rank_by))
+        variant = variants[best]
+        positions = positions_cache[tuple(sorted(variant["strategy"].items()))][oos_start:oos_stop].copy()
+        positions[-1] = False
+
+        sim = simulate(
+            close[oos_start:oos_stop],
+            positions,
+            commission=variant["commission"],
+            position_size=variant["position_size"],
+            state=SimulationState(cash=variant["initial_capital"], bars_processed=oos_start)
+        )
+        out_of_sample = {
+            "final_capital": round(float(sim.equity[-1]), 2),
+            "total_trades": int(len(sim.trades["profit"])),
+            **compute_metrics(
+                sim.trades, sim.equity, variant["initial_capital"], sim.exposure_bars, out_of_sample_grid, periods_per_year
+            )
+        }
+
+        del close, series, matrix, positions_cache
+        return {
+            "window": window,
+            "in_sample": rows[best],
+            "out_of_sample": out_of_sample,
+            "equity": sim.equity,
+            "trades": sim.trades,
+            "exposure_bars": sim.exposure_bars
+        }
+    finally:
+        shm.close()
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# ORQUESTACIÓN
+# ═════════════════════════════════════════════════════════════════════════════
+
+async def run_walk_forward(
+    close: np.ndarray,
+    index: pd.DatetimeIndex,
+    windows: List[Window],
+    variants: List[Dict],
+    grid: ReturnGrid,
+    rank_by: str = "sharpe_ratio",
+    series: Optional[Dict[str, np.ndarray]] = None,
+    rules: Optional[Dict[str, str]] = None
+) -> AsyncIterator[Dict]:
+    """
+    Ejecuta cada ventana como una tarea del pool de procesos.
+
+    Args:
+        close: Precios de cierre
+        index: Fechas de las barras (para la rejilla de retornos de cada tramo)
+        windows: Ventanas de walk_forward_windows
+        variants: Variantes de expand_grid (todas con el mismo capital inicial)
+        grid: Rejilla de retornos del símbolo y timeframe
+        rank_by: Métrica que elige la mejor variante in-sample
+        series: Arrays adicionales para las reglas (ver rule_series)
+        rules: Plantilla de reglas entry/exit con marcadores {parámetro}
+
+    Yields:
+        {"event": "progress", "completed": k, "total": n, "window": {...}} por ventana terminada
+    """
+    with shared_series(close, series) as (shm_name, names):
+        pool = get_process_pool()
+        loop = asyncio.get_running_loop()
+        futures = [
+            loop.run_in_executor(
+                pool,
+                run_window,
+                shm_name,
+                len(close),
+                window,
+                variants,
+                rank_by,
+                names,
+                rules,
+                grid.positions(index[window[0]:window[1]]),
+                grid.positions(index[window[1]:window[2]]),
+                grid.periods_per_year
+            )
+            for window in windows
+        ]
+
+        completed = 0
+        try:
+            for future in asyncio.as_completed(futures):
+                result = await future
+                completed += 1
+                yield {
+                    "event": "progress",
+                    "completed": completed,
+                    "total": len(windows),
+                    "window": result
+                }
+        finally:
+            for future in futures:
+                future.cancel()
+            # Esperar a que las ventanas en curso suelten la memoria compartida
+            await asyncio.gather(*futures, return_exceptions=True)
+
+
+def window_summary(result: Dict, index: pd.DatetimeIndex) -> Dict:
+    """
+    Resumen de una ventana para la API: fechas, parámetros elegidos y
+    métricas in-sample / out-of-sample.
+    """
+    is_start, oos_start, oos_stop = result["window"]
+    in_sample = dict(result["in_sample"])
+    parameters = {key: in_sample.pop(key) for key in ("commission", "position_size", "strategy")}
+    in_sample.pop("initial_capital")
+    out_of_sample = result["out_of_sample"]
+
+    # Eficiencia: retorno por barra out-of-sample / retorno por barra in-sample
+    is_rate = in_sample["total_return_pct"] / (oos_start - is_start)
+    oos_rate = out_of_sample["total_return_pct"] / (oos_stop - oos_start)
+    return {
+        "in_sample_start": index[is_start].isoformat(),
+        "in_sample_end": index[oos_start - 1].isoformat(),
+        "out_of_sample_start": index[oos_start].isoformat(),
+        "out_of_sample_end": index[oos_stop - 1].isoformat(),
+        "in_sample_bars": oos_start - is_start,
+        "out_of_sample_bars": oos_stop - oos_start,
+        "parameters": parameters,
+        "in_sample": in_sample,
+        "out_of_sample": out_of_sample,
+        "efficiency": round(oos_rate / is_rate, 2) if is_rate > 0 else None
+    }
+
+
+def stitch_walk_forward(
+    results: List[Dict],
+    index: pd.DatetimeIndex,
+    initial_capital: float,
+    grid: ReturnGrid
+) -> Dict:
+    """
+    Encadena los tramos out-of-sample en una sola equity: cada tramo arranca
+    con el capital final del anterior. La simulación es proporcional al
+    capital, así que basta con reescalar la equity y los trades de cada tramo.
+    """
+    results = sorted(results, key=lambda result: result["window"])
+    equity = []
+    trades = {column: [] for column in results[0]["trades"]}
+    exposure_bars = 0
+    capital = initial_capital
+
+    for result in results:
+        scale = capital / initial_capital
+        equity.append(result["equity"] * scale)
+        for column, values in result["trades"].items():
+            trades[column].append(values * scale if column in ("size", "profit") else values)
+        exposure_bars += result["exposure_bars"]
+        capital = float(equity[-1][-1])
+
+    equity = np.concatenate(equity)
+    trades = {column: np.concatenate(values) for column, values in trades.items()}
+    first, last = results[0]["window"][1], results[-1]["window"][2]
+    metrics = compute_metrics(
+        trades, equity, initial_capital, exposure_bars, grid.positions(index[first:last]), grid.periods_per_year
+    )
+
+    return {
+        "windows": [window_summary(result, index) for result in results],
+        "start_date": index[first].isoformat(),
+        "end_date": index[last - 1].isoformat(),
+        "final_capital": capital,
+        "total_trades": int(len(trades["profit"])),
+        "equity_curve": equity.tolist(),
+        "trades": trades_to_records(trades, index),
+        **metrics
+    }
@@ -0,0 +1,45 @@
+"""
+Configuración común de los tests: base de datos SQLite temporal (se fija
+antes de importar app.config) y helper para ejecutar los repositorios async
+"""
+
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+
+from app.database import Base, SessionLocal, engine, init_db  # noqa: E402
+
+
+def run(coroutine):
+    """
+    Ejecuta una corrutina en su propio event loop y cierra después las
+    conexiones del pool (no se pueden reutilizar desde otro loop).
+    """
+    async def scoped():
+        try:
+            return await coroutine
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(scoped())
+
+
+@pytest.fixture
+def db():
+    """
+    Esquema creado (retorna run) y todas las tablas vacías al terminar el test.
+    """
+    run(init_db())
+    yield run
+
+    async def clear():
+        async with SessionLocal() as session:
+            async with session.begin():
+                for table in reversed(Base.metadata.sorted_tables):
+                    await session.execute(table.delete())
+
+    run(clear())
@@ -0,0 +1,220 @@
+"""
+Backtest por tramos: el merge de MetricsAccumulator es exacto y el modo
+chunked de /run da el mismo resultado que el modo memory
+"""
+
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.services import price_store
+from app.services import metrics
+from app.services.metrics import MetricsAccumulator
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# MERGE DEL ACUMULADOR
+# ═════════════════════════════════════════════════════════════════════════════
+
+def _random_equity(rng: np.random.Generator, n: int) -> np.ndarray:
+    return 10000 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+
+
+def _split(rng: np.random.Generator, n: int) -> np.ndarray:
+    # Cortes aleatorios (tramos de al menos una barra)
+    cuts = rng.choice(np.arange(1, n), size=min(n - 1, int(rng.integers(1, 10))), replace=False)
+    return np.concatenate(([0], np.sort(cuts), [n]))
+
+
+def _accumulator(equity: np.ndarray) -> MetricsAccumulator:
+    accumulator = MetricsAccumulator(10000)
+    accumulator.update_equity(equity)
+    return accumulator
+
+
+def _assert_same_state(merged: MetricsAccumulator, single: MetricsAccumulator) -> None:
+    assert merged.bars == single.bars
+    assert merged.returns == single.returns
+    assert merged.peak == single.peak
+    assert merged.worst_ratio == pytest.approx(single.worst_ratio, rel=1e-12)
+    assert merged.mean == pytest.approx(single.mean, rel=1e-9, abs=1e-15)
+    assert merged.m2 == pytest.approx(single.m2, rel=1e-9)
+    assert merged.downside_sq == pytest.approx(single.downside_sq, rel=1e-9)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_sequential_merge_equals_single_pass(seed):
+    rng = np.random.default_rng(seed)
+    equity = _random_equity(rng, int(rng.integers(2, 3000)))
+    bounds = _split(rng, len(equity))
+
+    merged = MetricsAccumulator(10000)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        merged.merge(_accumulator(equity[start:stop]))
+
+    single = _accumulator(equity)
+    _assert_same_state(merged, single)
+    assert merged.result() == single.result()
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_tree_merge_equals_single_pass(seed):
+    # Tramos calculados por separado y combinados por parejas (como en paralelo)
+    rng = np.random.default_rng(1000 + seed)
+    equity = _random_equity(rng, int(rng.integers(2, 3000)))
+    bounds = _split(rng, len(equity))
+    parts = [_accumulator(equity[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    while len(parts) > 1:
+        parts = [
+            parts[i].merge(parts[i + 1]) if i + 1 < len(parts) else parts[i]
+            for i in range(0, len(parts), 2)
+        ]
+
+    _assert_same_state(parts[0], _accumulator(equity))
+
+
+def test_per_bar_updates_equal_single_pass():
+    rng = np.random.default_rng(7)
+    equity = _random_equity(rng, 500)
+
+    per_bar = MetricsAccumulator(10000)
+    for value in equity:
+        per_bar.add_bar(value)
+
+    _assert_same_state(per_bar, _accumulator(equity))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_blocks_equal_single_block(seed, monkeypatch):
+    rng = np.random.default_rng(2000 + seed)
+    equity = _random_equity(rng, int(rng.integers(2, 3000)))
+    single = _accumulator(equity)
+
+    monkeypatch.setattr(metrics, "BLOCK_BARS", int(rng.integers(1, 50)))
+    _assert_same_state(_accumulator(equity), single)
+
+
+def test_profit_factor_without_losses_is_none():
+    accumulator = MetricsAccumulator(10000)
+    accumulator.update_trades(np.array([120.0, 0.0, 35.5]))
+    assert accumulator.result()["profit_factor"] is None
+
+    accumulator.add_trade(-31.0)
+    assert accumulator.result()["profit_factor"] == 5.02
+
+
+# ═════════════════════════════════════════════════════════════════════════════
+# /run: CHUNKED == MEMORY
+# ═════════════════════════════════════════════════════════════════════════════
+
+METRICS = (
+    "final_capital", "total_trades", "total_return_pct", "sharpe_ratio",
+    "max_drawdown_pct", "win_rate_pct", "profit_factor"
+)
+
+
+@pytest.fixture
+def prices(monkeypatch):
+    """
+    Price store con un histórico sintético horario (sin descargas).
+    """
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    index = pd.date_range(end=now, periods=24 * 500, freq="h")
+    close = 100 * np.exp(np.cumsum(np.random.default_rng(0).normal(0, 0.003, len(index))))
+    hourly = pd.DataFrame(
+        {"Open": close, "High": close * 1.001, "Low": close * 0.999, "Close": close, "Volume": np.ones(len(index))},
+        index=index
+    )
+    daily = hourly.resample("1D").agg({"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"})
+
+    def fetcher(symbol, interval, start, end):
+        frame = hourly if interval == "1h" else daily
+        return frame[(frame.index >= start) & (frame.index < end)]
+
+    store = price_store.PriceStore(tempfile.mkdtemp(), fetcher=fetcher, refresh_seconds=10 ** 9)
+    monkeypatch.setattr(price_store, "_default_store", store)
+    # Tramos pequeños, y sin decimar la curva ni recortar los trades en chunked
+    monkeypatch.setattr(settings, "backtest_chunk_bars", 997)
+    monkeypatch.setattr(settings, "backtest_chunked_max_points", 10 ** 7)
+    monkeypatch.setattr(settings, "backtest_chunked_max_trades", 10 ** 6)
+    return index
+
+
+def _signals(index: pd.DatetimeIndex):
+    rng = np.random.default_rng(3)
+    dates = np.sort(rng.choice(index[100:-100], size=80, replace=False))
+    return [
+        {"date": pd.Timestamp(date).isoformat(), "type": "BUY" if i % 2 == 0 else "SELL"}
+        for i, date in enumerate(dates)
+    ]
+
+
+def _assert_same_trades(chunked, memory):
+    assert len(chunked) == len(memory)
+    for trade_chunked, trade_memory in zip(chunked, memory):
+        assert trade_chunked.keys() == trade_memory.keys()
+        for key, value in trade_memory.items():
+            if isinstance(value, float):
+                # La caja se encadena entre tramos: diferencias de redondeo
+                assert trade_chunked[key] == pytest.approx(value, rel=1e-9)
+            else:
+                assert trade_chunked[key] == value
+
+
+@pytest.mark.parametrize("timeframe", ["H1", "H4"])
+@pytest.mark.parametrize("strategy", [
+    None,
+    {"entry": "RSI(14) < 40", "exit": "RSI(14) > 60 or close > EMA(50)[2] * 1.01"},
+    {"entry": "MACD(12,26,9).macd > MACD(12,26,9).signal and ADX(14) > 20"},
+    # PSAR depende de todo el histórico: se calcula de una vez sobre la ventana
+    {"entry": "close > PSAR(0.02,0.2).value", "exit": "close < PSAR(0.02,0.2).value"}
+])
+def test_run_chunked_equals_memory(prices, timeframe, strategy):
+    client = TestClient(app)
+    request = {"symbol": "EURUSD", "timeframe": timeframe, "period_years": 1}
+    if strategy:
+        request["strategy"] = strategy
+    else:
+        request["strategy_signals"] = _signals(prices)
+
+    memory = client.post("/api/backtest/run", json={**request, "mode": "memory"})
+    chunked = client.post("/api/backtest/run", json={**request, "mode": "chunked"})
+    assert memory.status_code == 200, memory.text
+    assert chunked.status_code == 200, chunked.text
+    memory, chunked = memory.json(), chunked.json()
+
+    assert memory["total_trades"] > 0
+    for metric in METRICS:
+        assert chunked[metric] == pytest.approx(memory[metric], rel=1e-9, abs=1e-9), metric
+    assert chunked["equity_curve"] == pytest.approx(memory["equity_curve"], rel=1e-9)
+    _assert_same_trades(chunked["trades"], memory["trades"])
+
+
+@pytest.mark.parametrize("period_years, truncated", [(1, False), (2, True)])
+def test_run_reports_effective_period(prices, period_years, truncated):
+    # El histórico sintético cubre 500 días: 2 años no caben
+    client = TestClient(app)
+    request = {"symbol": "EURUSD", "timeframe": "H4", "period_years": period_years, "strategy_signals": _signals(prices)}
+
+    responses = [
+        client.post("/api/backtest/run", json={**request, "mode": mode}).json()
+        for mode in ("memory", "chunked")
+    ]
+    for response in responses:
+        assert response["period_truncated"] is truncated
+        assert response["end_date"] <= prices[-1].isoformat()
+        assert response["effective_period_years"] <= period_years
+        assert ("histórico disponible desde" in response["message"]) is truncated
+    memory, chunked = responses
+    for key in ("bars", "start_date", "end_date", "effective_period_years"):
+        assert chunked[key] == memory[key]
+    if truncated:
+        assert memory["start_date"][:10] == prices[0].isoformat()[:10]
+        assert memory["effective_period_years"] == pytest.approx(500 / 365, abs=0.01)
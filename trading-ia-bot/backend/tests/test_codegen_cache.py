@@ -0,0 +1,123 @@
+"""
+Caché de código generado: las peticiones concurrentes (streaming o no) con la
+misma clave comparten una única llamada al LLM
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.codegen_cache import CodegenCache
+
+
+class FakeLLM:
+    def __init__(self, fail: bool = False):
+        self.calls = 0
+        self.fail = fail
+        self.release = asyncio.Event()
+
+    async def stream(self):
+        self.calls += 1
+        yield "//+-- "
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("429 Too Many Requests")
+        yield "OnTick() {}"
+
+    async def generate(self):
+        return "".join([text async for text in self.stream()]).strip()
+
+
+async def _collect(chunks):
+    return [text async for text in chunks]
+
+
+def test_stream_coalesces_with_concurrent_requests():
+    async def scenario():
+        cache, llm = CodegenCache(), FakeLLM()
+        cached, chunks = cache.stream("k", llm.stream)
+        streamed = asyncio.ensure_future(_collect(chunks))
+        await asyncio.sleep(0)
+
+        plain = asyncio.ensure_future(cache.get_or_generate("k", llm.generate))
+        joined_cached, joined = cache.stream("k", llm.stream)
+        joined = asyncio.ensure_future(_collect(joined))
+        await asyncio.sleep(0)
+        llm.release.set()
+
+        results = await asyncio.gather(streamed, plain, joined)
+        again = cache.stream("k", llm.stream)
+        return cache, llm, cached, joined_cached, results, again[0], await _collect(again[1])
+
+    cache, llm, cached, joined_cached, results, cached_again, chunks_again = asyncio.run(scenario())
+    streamed, plain, joined = results
+    assert llm.calls == 1
+    assert not cached and not joined_cached
+    assert streamed == ["//+-- ", "OnTick() {}"]
+    assert plain == ("//+-- OnTick() {}", False)
+    assert joined == ["//+-- OnTick() {}"]
+    assert cached_again and chunks_again == ["//+-- OnTick() {}"]
+    assert cache.stats()["coalesced"] == 2 and cache.stats()["inflight"] == 0
+
+
+def test_stream_waits_for_inflight_generation():
+    async def scenario():
+        cache, llm = CodegenCache(), FakeLLM()
+        plain = asyncio.ensure_future(cache.get_or_generate("k", llm.generate))
+        await asyncio.sleep(0)
+        cached, chunks = cache.stream("k", llm.stream)
+        joined = asyncio.ensure_future(_collect(chunks))
+        llm.release.set()
+        return llm, cached, await plain, await joined
+
+    llm, cached, plain, joined = asyncio.run(scenario())
+    assert llm.calls == 1
+    assert not cached
+    assert joined == [plain[0]]
+
+
+def test_stream_errors_reach_every_waiter_and_are_not_cached():
+    async def scenario():
+        cache, llm = CodegenCache(), FakeLLM(fail=True)
+        _, chunks = cache.stream("k", llm.stream)
+        streamed = asyncio.ensure_future(_collect(chunks))
+        await asyncio.sleep(0)
+        plain = asyncio.ensure_future(cache.get_or_generate("k", llm.generate))
+        llm.release.set()
+        results = await asyncio.gather(streamed, plain, return_exceptions=True)
+        return cache, results
+
+    cache, results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.stats()["entries"] == 0 and cache.stats()["inflight"] == 0
+
+
+def test_stream_keeps_generating_after_client_disconnects():
+    async def scenario():
+        cache, llm = CodegenCache(), FakeLLM()
+        _, chunks = cache.stream("k", llm.stream)
+        assert await chunks.__anext__() == "//+-- "
+        await chunks.aclose()  # el cliente se desconecta
+        waiter = asyncio.ensure_future(cache.get_or_generate("k", llm.generate))
+        await asyncio.sleep(0)
+        llm.release.set()
+        return llm, await waiter
+
+    llm, (code, cached) = asyncio.run(scenario())
+    assert llm.calls == 1
+    assert code == "//+-- OnTick() {}" and not cached
+
+
+@pytest.mark.parametrize("force_refresh", [False, True])
+def test_stream_force_refresh(force_refresh):
+    async def scenario():
+        cache, llm = CodegenCache(), FakeLLM()
+        llm.release.set()
+        await _collect(cache.stream("k", llm.stream)[1])
+        cached, chunks = cache.stream("k", llm.stream, force_refresh=force_refresh)
+        return llm, cached, await _collect(chunks)
+
+    llm, cached, chunks = asyncio.run(scenario())
+    assert cached is not force_refresh
+    assert llm.calls == (2 if force_refresh else 1)
+    assert "".join(chunks) == "//+-- OnTick() {}"
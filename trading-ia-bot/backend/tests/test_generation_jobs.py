@@ -0,0 +1,88 @@
+"""
+Generación batch: los trabajos se guardan en la base de datos y los items
+a medias de un proceso anterior se reanudan al arrancar
+"""
+
+import asyncio
+
+import pytest
+
+from app.services import bots_repository, codegen_cache, generation_jobs
+from app.services import generation_jobs_repository as repository
+from app.services.generation_jobs import GenerationJobManager
+
+
+SPECS = [
+    {"indicators": ["RSI"], "symbol": "EURUSD", "timeframe": "H1", "strategy_type": "Reversión"},
+    {"indicators": ["ADX", "EMA"], "symbol": "XAUUSD", "timeframe": "H4", "strategy_type": "Tendencia"},
+    {"indicators": ["RSI"], "symbol": "EURUSD", "timeframe": "H1", "strategy_type": "Reversión"},
+]
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    """
+    Groq simulado: anota cada petición y devuelve un EA mínimo.
+    """
+    requests = []
+
+    async def fake_request(indicators, symbol, timeframe, strategy_type):
+        requests.append((symbol, timeframe))
+        if symbol == "FAIL":
+            raise RuntimeError("respuesta inválida")
+        return f"// {symbol} {timeframe}\nvoid OnTick()\n{{\n}}"
+
+    monkeypatch.setattr(generation_jobs, "request_mql5_code", fake_request)
+    monkeypatch.setattr(codegen_cache, "_default_cache", codegen_cache.CodegenCache(max_entries=16, ttl_seconds=60))
+    return requests
+
+
+def _manager() -> GenerationJobManager:
+    return GenerationJobManager(workers=2, requests_per_minute=6000, poll_seconds=0.05, lease_seconds=30)
+
+
+async def _follow_to_end(manager: GenerationJobManager, job_id: str):
+    await manager.start()
+    try:
+        return [event async for event in manager.follow(job_id)]
+    finally:
+        await manager.shutdown()
+
+
+def test_batch_is_persisted_and_streamed(db, generated):
+    async def scenario():
+        manager = _manager()
+        job = await manager.submit(SPECS + [{**SPECS[0], "symbol": "FAIL"}])
+        events = await asyncio.wait_for(_follow_to_end(manager, job["job_id"]), 10)
+        return events, await manager.get(job["job_id"]), await manager.list_jobs()
+
+    events, job, listed = db(scenario())
+    assert [event["event"] for event in events] == ["item"] * 4 + ["done"]
+    assert events[-1]["status"] == "completed_with_errors"
+    assert (job["completed"], job["failed"], job["pending"]) == (3, 1, 0)
+    assert job["items"][3]["error"] == "respuesta inválida"
+    assert all(item["bot_id"] for item in job["items"][:3])
+    assert listed[0]["job_id"] == job["job_id"] and "items" not in listed[0]
+    # La tercera especificación repite la primera: sale de la caché
+    assert len(generated) == 3
+
+
+def test_unfinished_items_resume_on_start(db, generated):
+    async def scenario():
+        job = await repository.create_job(SPECS[:2])
+        # Un proceso anterior reclamó el primer item y murió sin devolverlo
+        item = await repository.claim_next_item("muerto")
+        assert item["index"] == 0
+        manager = GenerationJobManager(workers=1, requests_per_minute=6000, poll_seconds=0.05, lease_seconds=0)
+        await asyncio.wait_for(_follow_to_end(manager, job["job_id"]), 10)
+        return await manager.get(job["job_id"]), await bots_repository.count_bots()
+
+    job, bots = db(scenario())
+    assert job["status"] == "completed"
+    assert [item["status"] for item in job["items"]] == ["completed", "completed"]
+    assert bots == 2
+
+
+def test_unknown_batch(db):
+    with pytest.raises(generation_jobs.JobNotFoundError):
+        db(_manager().get("no-existe"))
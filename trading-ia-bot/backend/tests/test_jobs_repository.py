@@ -0,0 +1,124 @@
+"""
+Cola de backtests: orden de reclamación, lease de los workers y cancelación
+"""
+
+import asyncio
+
+from app.services import jobs_repository as jobs
+
+
+async def _create(user: str, priority: int = 0) -> str:
+    job = await jobs.create_job(user, priority, {"symbol": "EURUSD", "timeframe": "H1"})
+    # created_at distinto para que el orden por antigüedad sea estable
+    await asyncio.sleep(0.002)
+    return job["job_id"]
+
+
+def test_claim_order_priority_then_fairness(db):
+    async def scenario():
+        a1, a2, a3 = await _create("ana"), await _create("ana"), await _create("ana")
+        b1 = await _create("bea")
+        urgent = await _create("bea", priority=5)
+
+        claimed = [await jobs.claim_next_job("w1") for _ in range(5)]
+        return [urgent, a1, b1, a2, a3], claimed
+
+    expected, claimed = db(scenario())
+    # Prioridad primero; después el usuario con menos trabajos corriendo
+    assert claimed == expected
+
+
+def test_claim_respects_max_per_user(db):
+    async def scenario():
+        first, _ = await _create("ana"), await _create("ana")
+        claimed = await jobs.claim_next_job("w1", max_per_user=1)
+        blocked = await jobs.claim_next_job("w1", max_per_user=1)
+        await jobs.finish_job(first, "w1", "completed")
+        return first, claimed, blocked, await jobs.claim_next_job("w1", max_per_user=1)
+
+    first, claimed, blocked, after_finish = db(scenario())
+    assert claimed == first
+    assert blocked is None
+    # Los trabajos terminados no cuentan
+    assert after_finish is not None
+
+
+def test_finished_history_does_not_affect_fairness(db):
+    async def scenario():
+        old = await _create("ana")
+        await jobs.claim_next_job("w1")
+        await jobs.finish_job(old, "w1", "completed")
+        bea, ana = await _create("bea"), await _create("ana")
+        return bea, ana, await jobs.claim_next_job("w1")
+
+    bea, _, claimed = db(scenario())
+    # Sin trabajos activos ningún usuario va por delante: gana el más antiguo
+    assert claimed == bea
+
+
+def test_lease_loss(db):
+    async def scenario():
+        job_id = await _create("ana")
+        assert await jobs.claim_next_job("w1") == job_id
+        assert await jobs.update_progress(job_id, "w1", 10.0) == (True, False)
+
+        # El lease de w1 caduca y w2 reclama el trabajo
+        assert await jobs.requeue_expired_jobs(lease_seconds=-1) == 1
+        assert await jobs.claim_next_job("w2") == job_id
+
+        lost = (
+            await jobs.update_progress(job_id, "w1", 50.0),
+            await jobs.finish_job(job_id, "w1", "completed"),
+            await jobs.requeue_job(job_id, "w1")
+        )
+        return lost, await jobs.get_job(job_id)
+
+    lost, job = db(scenario())
+    assert lost == ((False, False), False, False)
+    assert job["status"] == "running"
+    assert job["claimed_by"] == "w2"
+    assert job["progress_pct"] == 0.0
+
+
+def test_live_lease_is_not_requeued(db):
+    async def scenario():
+        job_id = await _create("ana")
+        await jobs.claim_next_job("w1")
+        await jobs.update_progress(job_id, "w1", 10.0)
+        return await jobs.requeue_expired_jobs(lease_seconds=60), await jobs.get_job(job_id)
+
+    requeued, job = db(scenario())
+    assert requeued == 0
+    assert job["status"] == "running" and job["claimed_by"] == "w1"
+
+
+def test_requeue_returns_the_job_to_the_queue(db):
+    async def scenario():
+        job_id = await _create("ana")
+        await jobs.claim_next_job("w1")
+        assert await jobs.requeue_job(job_id, "w1")
+        return job_id, await jobs.get_job(job_id), await jobs.claim_next_job("w2")
+
+    job_id, job, reclaimed = db(scenario())
+    assert job["status"] == "queued" and job["claimed_by"] is None
+    assert reclaimed == job_id
+
+
+def test_cancel(db):
+    async def scenario():
+        _, running = await _create("ana"), await _create("bea")
+        await jobs.claim_next_job("w1")  # el de ana, el más antiguo
+        await jobs.claim_next_job("w1")
+        cancelled_queued = await jobs.request_cancel(await _create("ana"))
+        cancelled_running = await jobs.request_cancel(running)
+        progress = await jobs.update_progress(running, "w1", 20.0)
+        await jobs.finish_job(running, "w1", "cancelled")
+        return cancelled_queued, cancelled_running, progress, await jobs.get_job(running)
+
+    cancelled_queued, cancelled_running, progress, job = db(scenario())
+    # En cola se cancela al momento; en ejecución lo detiene el worker
+    assert cancelled_queued["status"] == "cancelled"
+    assert cancelled_running["status"] == "running" and cancelled_running["cancel_requested"]
+    assert progress == (True, True)
+    assert job["status"] == "cancelled"
+    assert db(jobs.request_cancel("no-existe")) is None
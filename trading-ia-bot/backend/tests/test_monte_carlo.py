@@ -0,0 +1,59 @@
+"""
+Monte Carlo: la semilla hace reproducibles las simulaciones y el profit
+factor sin pérdidas no entra en la distribución
+"""
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.services.monte_carlo import run_monte_carlo
+
+
+def _trades(seed: int = 0, count: int = 40):
+    profits = np.random.default_rng(seed).normal(20, 100, count)
+    return [{"profit": float(profit)} for profit in profits]
+
+
+@pytest.mark.parametrize("method", ["bootstrap", "permutation"])
+def test_same_seed_same_result(method):
+    first = run_monte_carlo(_trades(), 10000, simulations=500, method=method, seed=42)
+    second = run_monte_carlo(_trades(), 10000, simulations=500, method=method, seed=42)
+    assert first == second
+    assert first["seed"] == 42
+
+
+def test_different_seed_different_result():
+    first = run_monte_carlo(_trades(), 10000, simulations=500, seed=1)
+    second = run_monte_carlo(_trades(), 10000, simulations=500, seed=2)
+    assert first["max_drawdown_pct"] != second["max_drawdown_pct"]
+
+
+def test_seed_does_not_depend_on_batch_size(monkeypatch):
+    # Los lotes consumen el generador en el mismo orden que una sola matriz
+    whole = run_monte_carlo(_trades(), 10000, simulations=300, method="permutation", seed=7)
+    monkeypatch.setattr(settings, "monte_carlo_batch_cells", 40 * 7)
+    batched = run_monte_carlo(_trades(), 10000, simulations=300, method="permutation", seed=7)
+    assert batched == whole
+
+
+def test_permutation_keeps_final_return():
+    result = run_monte_carlo(_trades(), 10000, simulations=200, method="permutation", seed=3)
+    distribution = result["total_return_pct"]
+    assert distribution["worst"] == pytest.approx(distribution["best"], abs=0.01)
+    assert distribution["worst"] == pytest.approx(result["original"]["total_return_pct"], abs=0.01)
+
+
+def test_profit_factor_without_losses():
+    trades = [{"profit": 10.0}, {"profit": 25.0}, {"profit": 5.0}]
+    result = run_monte_carlo(trades, 10000, simulations=100, seed=0)
+    assert result["original"]["profit_factor"] is None
+    assert result["no_loss_simulations"] == 100
+    assert result["profit_factor"] is None
+
+
+def test_invalid_parameters():
+    with pytest.raises(ValueError, match="method"):
+        run_monte_carlo(_trades(), 10000, method="jackknife")
+    with pytest.raises(ValueError, match="trades"):
+        run_monte_carlo([], 10000)
@@ -0,0 +1,85 @@
+"""
+Parches por regiones de MQL5: localización de errores, regiones por función
+y validación del parche aplicado
+"""
+
+import pytest
+
+from app.services.mql5_patch import (
+    PatchError,
+    apply_patch,
+    error_lines,
+    find_regions,
+    format_regions,
+    parse_patch,
+)
+
+
+CODE = """#property strict
+#include <Trade/Trade.mqh>
+
+input int Period = 14;
+
+int OnInit()
+{
+   return(INIT_SUCCEEDED);
+}
+
+void OnTick()
+{
+   double value = iRSI(_Symbol, PERIOD_CURRENT, Period, PRICE_CLOSE);
+   if(value < 30) { Print("buy // not a comment {"); }
+}"""
+
+
+def test_error_lines_from_compiler_locations():
+    assert error_lines("EA.mq5(13,19) : error 256: undeclared identifier", CODE) == [12]
+    assert error_lines("error\tEA.mq5\t8\t4\tsome error", CODE) == [7]
+    assert error_lines("line 500: out of range", CODE) == []
+
+
+def test_error_lines_from_identifiers():
+    assert error_lines("'value' - undeclared identifier", CODE) == [12, 13]
+
+
+def test_regions_cover_the_enclosing_function():
+    regions = find_regions(CODE, [12, 13])
+    assert len(regions) == 1
+    region = regions[0]
+    # Desde la firma hasta la llave de cierre (las llaves en literales no cuentan)
+    assert (region.start, region.end) == (10, 14)
+    assert region.text.startswith("void OnTick()")
+
+
+def test_regions_outside_functions_do_not_split_them():
+    # Error en el input: el contexto se amplía a OnInit entera
+    regions = find_regions(CODE, [3])
+    assert (regions[0].start, regions[0].end) == (0, 8)
+
+
+def test_patch_roundtrip():
+    regions = find_regions(CODE, [12])
+    prompt = format_regions(regions)
+    assert "<<<REGION 1 (líneas 11-15)" in prompt
+
+    replacement = "void OnTick()\n{\n   double value = iRSI(_Symbol, PERIOD_CURRENT, Period, PRICE_CLOSE);\n}"
+    response = f"<<<REGION 1\n{replacement}\n>>>\n<<<GLOBAL\nint handle;\n>>>"
+    replacements, global_block = parse_patch(response)
+    patched = apply_patch(CODE, regions, replacements, global_block)
+
+    lines = patched.split("\n")
+    assert lines[2] == "int handle;"
+    assert patched.endswith(replacement)
+    assert "Print(" not in patched
+
+
+def test_patch_validation():
+    regions = find_regions(CODE, [12])
+    with pytest.raises(PatchError, match=r"\[1\]"):
+        apply_patch(CODE, regions, {})
+    with pytest.raises(PatchError, match="vacía"):
+        apply_patch(CODE, regions, {1: "  "})
+    with pytest.raises(PatchError, match="sin cerrar"):
+        apply_patch(CODE, regions, {1: "void OnTick()\n{\n   if(true) {\n}"})
+    with pytest.raises(PatchError, match="sin abrir"):
+        apply_patch(CODE, regions, {1: "void OnTick()\n{\n}\n}"})
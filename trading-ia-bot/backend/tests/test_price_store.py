@@ -0,0 +1,87 @@
+"""
+Price store: solo se descarga la cola que falta y las barras añadidas se
+publican sobre la misma versión
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.price_store import LocalFileFetcher, PriceStore
+
+
+def _bars(start: str, periods: int, base: float = 100.0) -> pd.DataFrame:
+    index = pd.date_range(start, periods=periods, freq="h")
+    close = base + np.arange(periods, dtype=np.float64)
+    return pd.DataFrame(
+        {"Open": close, "High": close + 1, "Low": close - 1, "Close": close, "Volume": np.ones(periods)},
+        index=index
+    )
+
+
+@pytest.fixture
+def provider(tmp_path):
+    """
+    (store sobre LocalFileFetcher, CSV del proveedor, rangos pedidos)
+    """
+    source = tmp_path / "source"
+    source.mkdir()
+    fetcher = LocalFileFetcher(str(source))
+    ranges = []
+
+    def fetch(symbol, interval, start, end):
+        ranges.append((start, end))
+        return fetcher(symbol, interval, start, end)
+
+    store = PriceStore(str(tmp_path / "cache"), fetcher=fetch, refresh_seconds=0)
+    return store, source / "EURUSD_1h.csv", ranges
+
+
+def test_tail_fetch_downloads_only_new_bars(provider):
+    store, source, ranges = provider
+    _bars("2024-01-01", 48).to_csv(source)
+    first = store.get("EURUSD", "1h", datetime(2024, 1, 1), datetime(2024, 1, 3))
+    assert len(first) == 48
+    version = store._read_meta("EURUSD", "1h")["version"]
+
+    # El proveedor publica 24 barras más
+    _bars("2024-01-01", 72).to_csv(source)
+    second = store.get("EURUSD", "1h", datetime(2024, 1, 1), datetime(2024, 1, 4))
+
+    assert len(second) == 72
+    assert second["Close"].tolist() == _bars("2024-01-01", 72)["Close"].tolist()
+    # La cola empieza en la última barra almacenada (que se vuelve a pedir)
+    assert ranges[-1] == (datetime(2024, 1, 2, 23), datetime(2024, 1, 4))
+    # Solo se añadieron filas: misma versión, y el DataFrame anterior sigue intacto
+    assert store._read_meta("EURUSD", "1h")["version"] == version
+    assert len(first) == 48 and first["Close"].iloc[-1] == 147.0
+
+
+def test_rewritten_last_bar_publishes_new_version(provider):
+    store, source, _ = provider
+    _bars("2024-01-01", 48).to_csv(source)
+    first = store.get("EURUSD", "1h", datetime(2024, 1, 1), datetime(2024, 1, 3))
+    version = store._read_meta("EURUSD", "1h")["version"]
+
+    # La última barra estaba incompleta: el proveedor la corrige al crecer
+    updated = _bars("2024-01-01", 60)
+    updated.iloc[47, updated.columns.get_loc("Close")] = 999.0
+    updated.to_csv(source)
+    second = store.get("EURUSD", "1h", datetime(2024, 1, 1), datetime(2024, 1, 4))
+
+    assert len(second) == 60
+    assert second["Close"].iloc[47] == 999.0
+    assert store._read_meta("EURUSD", "1h")["version"] != version
+    assert first["Close"].iloc[-1] == 147.0
+
+
+def test_fresh_series_is_not_downloaded_again(tmp_path):
+    fetcher = LocalFileFetcher(str(tmp_path))
+    _bars("2024-01-01", 48).to_csv(tmp_path / "EURUSD_1h.csv")
+    store = PriceStore(str(tmp_path / "cache"), fetcher=fetcher, refresh_seconds=10 ** 9)
+
+    store.get("EURUSD", "1h", datetime(2024, 1, 1), datetime(2024, 1, 3))
+    store.get("EURUSD", "1h", datetime(2024, 1, 1, 12), datetime(2024, 1, 3))
+    assert fetcher.calls == 1
@@ -0,0 +1,150 @@
+"""
+Repositorio de resultados: paginación por cursor y agregados mantenidos en
+cada save/delete
+"""
+
+import pytest
+from sqlalchemy import select, text
+
+from app.database import SessionLocal, engine
+from app.models import RANKED_METRICS, Result
+from app.services import results_repository
+from app.services.results_repository import AGGREGATE_SCOPES, _ordering
+
+
+def _record(i: int, **overrides) -> dict:
+    return {
+        "bot_name": f"Bot {i}",
+        "symbol": ("EURUSD", "XAUUSD")[i % 2],
+        "timeframe": ("H1", "H4", "D1")[i % 3],
+        "strategy_type": ("rules", "signals", None)[i % 3],
+        "period_years": 1,
+        "initial_capital": 10000.0,
+        "final_capital": 10000.0 + i,
+        "total_return_pct": float(i % 7),
+        "sharpe_ratio": i / 10,
+        "max_drawdown_pct": -float(i % 5),
+        "win_rate_pct": float(i % 4) * 10,
+        "profit_factor": None if i % 6 == 0 else float(i % 3),
+        "total_trades": i,
+        "equity_curve": [10000.0, 10000.0 + i],
+        "trades": [],
+        **overrides
+    }
+
+
+async def _save(count: int):
+    return [await results_repository.save_result(_record(i)) for i in range(count)]
+
+
+async def _pages(**filters):
+    rows, cursor = [], None
+    while True:
+        page, cursor = await results_repository.list_results(
+            limit=4, cursor=cursor, include_blobs=False, **filters
+        )
+        rows += page
+        if cursor is None:
+            return rows
+
+
+@pytest.mark.parametrize("sort_by", ["id", "created_at", "total_return_pct", "max_drawdown_pct", "profit_factor"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_keyset_pages_match_full_listing(db, sort_by, order):
+    db(_save(23))
+    full, cursor = db(results_repository.list_results(limit=100, sort_by=sort_by, order=order, include_blobs=False))
+    assert cursor is None and len(full) == 23
+
+    paged = db(_pages(sort_by=sort_by, order=order))
+    assert [row["id"] for row in paged] == [row["id"] for row in full]
+
+    # Empates resueltos por id y profit_factor None (sin pérdidas) como el mayor
+    values = [row[sort_by] for row in full]
+    if sort_by == "profit_factor":
+        values = [float("inf") if value is None else value for value in values]
+    keys = list(zip(values, [row["id"] for row in full]))
+    assert keys == sorted(keys, reverse=order == "desc")
+
+
+def test_keyset_with_filters(db):
+    db(_save(23))
+    paged = db(_pages(symbol="EURUSD", timeframe="H1", sort_by="total_return_pct", order="desc"))
+    assert paged and all(row["symbol"] == "EURUSD" and row["timeframe"] == "H1" for row in paged)
+    assert len(paged) == len([i for i in range(23) if i % 2 == 0 and i % 3 == 0])
+
+
+def test_invalid_cursor(db):
+    with pytest.raises(ValueError, match="cursor"):
+        db(results_repository.list_results(cursor="no-es-un-cursor"))
+
+
+async def _aggregates_after_changes():
+    saved = await _save(12)
+    for result in saved[::3]:
+        await results_repository.delete_result(result["id"])
+    kept = [result for result in saved if result not in saved[::3]]
+    stats = await results_repository.summary_stats(group_by="strategy_type")
+    return kept, stats
+
+
+def test_aggregates_follow_saves_and_deletes(db):
+    kept, stats = db(_aggregates_after_changes())
+
+    assert stats["total_results"] == len(kept)
+    assert stats["avg_return"] == pytest.approx(sum(r["total_return_pct"] for r in kept) / len(kept))
+    # strategy_type NULL cuenta en el total pero no en el desglose
+    for strategy_type, group in stats["groups"].items():
+        rows = [r for r in kept if r["strategy_type"] == strategy_type]
+        assert group["total_results"] == len(rows)
+        assert group["avg_sharpe"] == pytest.approx(sum(r["sharpe_ratio"] for r in rows) / len(rows))
+        assert group["best_result"]["total_return_pct"] == max(r["total_return_pct"] for r in rows)
+    assert set(stats["groups"]) == {r["strategy_type"] for r in kept} - {None}
+
+
+def test_rebuild_matches_incremental_aggregates(db):
+    _, incremental = db(_aggregates_after_changes())
+    db(results_repository.rebuild_aggregates())
+    rebuilt = db(results_repository.summary_stats(group_by="strategy_type"))
+    assert rebuilt["total_results"] == incremental["total_results"]
+    for key, group in incremental["groups"].items():
+        assert rebuilt["groups"][key]["total_results"] == group["total_results"]
+        assert rebuilt["groups"][key]["avg_return"] == pytest.approx(group["avg_return"])
+
+
+def test_deleting_the_last_result_removes_its_groups(db):
+    async def save_and_delete():
+        result = await results_repository.save_result(_record(1))
+        await results_repository.delete_result(result["id"])
+        return await results_repository.summary_stats(group_by="symbol")
+
+    stats = db(save_and_delete())
+    assert stats["total_results"] == 0
+    assert stats["groups"] == {}
+
+
+async def _plan(query) -> str:
+    sql = str(query.compile(engine.sync_engine, compile_kwargs={"literal_binds": True}))
+    async with SessionLocal() as session:
+        rows = (await session.execute(text("EXPLAIN QUERY PLAN " + sql))).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize("metric", list(RANKED_METRICS))
+@pytest.mark.parametrize("scope", [None, *AGGREGATE_SCOPES])
+@pytest.mark.parametrize("descending", [True, False])
+def test_ranked_metrics_are_indexed(db, metric, scope, descending):
+    # Mejor/peor por grupo y /list filtrado: recorren un índice, sin ordenar
+    query = select(Result)
+    if scope is not None:
+        query = query.where(getattr(Result, scope) == "EURUSD")
+    query = query.order_by(*_ordering(getattr(Result, metric), descending)).limit(1)
+
+    plan = db(_plan(query))
+    assert "USING INDEX" in plan and "TEMP B-TREE" not in plan, plan
+
+
+def test_summary_metric_must_be_ranked(db):
+    with pytest.raises(ValueError, match="metric"):
+        db(results_repository.summary_stats(metric="created_at"))
+    stats = db(results_repository.summary_stats(metric="sharpe_ratio", group_by="timeframe"))
+    assert stats["total_results"] == 0
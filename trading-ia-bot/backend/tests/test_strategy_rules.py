@@ -0,0 +1,89 @@
+"""
+DSL de reglas: árbol del parser, precedencia, errores y evaluación por barra
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.strategy_rules import (
+    MAX_EXPRESSION_LENGTH,
+    MAX_NESTING_DEPTH,
+    evaluate_rule,
+    parse_rule,
+    rules_to_positions,
+    validate_strategy,
+)
+
+
+RSI_14 = ("indicator", "RSI", (("period", 14),), "value")
+
+
+def test_parse_tree():
+    assert parse_rule("RSI(14) < 30 and close > EMA(200)[2] * 1.01") == (
+        "and",
+        ("cmp", "<", RSI_14, ("num", 30.0)),
+        ("cmp", ">", ("price", "Close"), (
+            "math", "*", ("shift", ("indicator", "EMA", (("period", 200),), "value"), 2), ("num", 1.01)
+        ))
+    )
+
+
+def test_precedence():
+    # and liga más que or, y * más que +
+    assert parse_rule("close > 1 or close > 2 and close > 3")[0] == "or"
+    assert parse_rule("close > 1 + 2 * 3")[3] == ("math", "+", ("num", 1.0), ("math", "*", ("num", 2.0), ("num", 3.0)))
+    assert parse_rule("(close > 1 or close > 2) and close > 3")[0] == "and"
+
+
+def test_keywords_and_outputs_are_case_insensitive():
+    assert parse_rule("rsi(14) < 30 AND Close > 1") == parse_rule("RSI(14) < 30 and close > 1")
+    node = parse_rule("MACD(12,26,9).macd crosses_above MACD(12,26,9).signal")
+    assert node[1] == "crosses_above"
+    assert node[2][3] == "macd" and node[3][3] == "signal"
+
+
+@pytest.mark.parametrize("expression, message", [
+    ("", "vacía"),
+    ("close >", "incompleta"),
+    ("close > 1 $", "Carácter inesperado"),
+    ("RSI(x) < 30", "números"),
+    ("MACD(12,26,9).foo > 0", "salidas"),
+    ("(close > 1", "Se esperaba"),
+    ("close > 1" + " " * MAX_EXPRESSION_LENGTH + "+ 1", str(MAX_EXPRESSION_LENGTH)),
+])
+def test_invalid_rules(expression, message):
+    with pytest.raises(ValueError, match=message):
+        parse_rule(expression)
+
+
+def test_nesting_limit():
+    parse_rule("(" * (MAX_NESTING_DEPTH - 2) + "close > 1" + ")" * (MAX_NESTING_DEPTH - 2))
+    with pytest.raises(ValueError):
+        parse_rule("(" * 1000 + "close > 1" + ")" * 1000)
+    with pytest.raises(ValueError):
+        parse_rule("close > " + " + ".join(["1"] * 1000))
+
+
+def test_validate_strategy_requires_conditions():
+    validate_strategy({"entry": "RSI(14) < 30", "exit": "RSI(14) > 70"})
+    with pytest.raises(ValueError, match="entry"):
+        validate_strategy({"entry": "MACD(12,26,9).hist"})
+    with pytest.raises(ValueError, match="número"):
+        validate_strategy({"entry": "(close > 1) + 1 > 0"})
+
+
+def test_evaluate_rule():
+    close = np.array([1.0, 3.0, 2.0, 4.0, 5.0])
+    df = pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": close})
+
+    assert evaluate_rule(df, "close > close[1]").tolist() == [False, True, False, True, True]
+    assert evaluate_rule(df, "close crosses_above 2.5").tolist() == [False, True, False, True, False]
+    assert evaluate_rule(df, "not close >= 3 or -close < -4.5").tolist() == [True, False, True, False, True]
+
+
+def test_rules_to_positions():
+    entry = np.array([False, True, False, False, True, False])
+    exit = np.array([False, False, False, True, True, False])
+    assert rules_to_positions(entry, exit).tolist() == [False, True, True, False, False, False]
+    assert rules_to_positions(entry, exit, initial=True).tolist() == [True, True, True, False, False, False]
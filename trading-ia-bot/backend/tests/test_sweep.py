@@ -0,0 +1,76 @@
+"""
+Barrido de parámetros: los lotes leen cierre, series y rejilla de retornos del
+mismo bloque de memoria compartida
+"""
+
+import asyncio
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.calendars import ReturnGrid, market_calendar
+from app.services.metrics import compute_metrics
+from app.services.simulation import demo_positions, simulate
+from app.services.sweep import _series_views, expand_grid, run_sweep, shared_series, shutdown_process_pool
+
+
+@pytest.fixture
+def hourly():
+    index = pd.date_range("2024-01-01", periods=24 * 60, freq="h")
+    close = 100 * np.exp(np.cumsum(np.random.default_rng(5).normal(0, 0.003, len(index))))
+    return index, close
+
+
+def test_shared_series_layout(hourly):
+    index, close = hourly
+    grid_positions = ReturnGrid("H1", market_calendar("EURUSD")).positions(index)
+    extra = {"EMA_20": close * 1.01}
+
+    with shared_series(close, extra, grid_positions) as (shm_name, names):
+        shm = shared_memory.SharedMemory(name=shm_name)
+        try:
+            matrix, grid = _series_views(shm, len(close), len(names), len(grid_positions))
+            assert names == ["Close", "EMA_20"]
+            np.testing.assert_array_equal(matrix[0], close)
+            np.testing.assert_array_equal(matrix[1], extra["EMA_20"])
+            np.testing.assert_array_equal(grid, grid_positions)
+            assert _series_views(shm, len(close), len(names))[1] is None
+            del matrix, grid
+        finally:
+            shm.close()
+
+
+def test_sweep_metrics_use_the_shared_grid(hourly):
+    index, close = hourly
+    grid = ReturnGrid("D1", market_calendar("EURUSD"))
+    grid_positions = grid.positions(index)
+    variants = expand_grid({"commission": [0.0, 0.001]}, {"trades_count": [10, 30], "seed": [1]})
+
+    async def sweep():
+        rows = []
+        async for update in run_sweep(close, variants, grid_positions=grid_positions, periods_per_year=grid.periods_per_year):
+            rows += update["rows"]
+        return rows
+
+    try:
+        rows = asyncio.run(sweep())
+    finally:
+        shutdown_process_pool()
+
+    assert len(rows) == len(variants)
+    for row in rows:
+        strategy = row["strategy"]
+        sim = simulate(
+            close,
+            demo_positions(len(close), strategy["trades_count"], strategy["seed"]),
+            initial_capital=row["initial_capital"],
+            commission=row["commission"],
+            position_size=row["position_size"]
+        )
+        expected = compute_metrics(
+            sim.trades, sim.equity, row["initial_capital"], sim.exposure_bars, grid_positions, grid.periods_per_year
+        )
+        for metric, value in expected.items():
+            assert row[metric] == value, metric
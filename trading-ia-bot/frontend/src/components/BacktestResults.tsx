@@ -34,7 +34,7 @@ interface BacktestResult {
   sharpeRatio: number;
   maxDrawdownPct: number;
   winRatePct: number;
-  profitFactor: number;
+  profitFactor: number | null;
   totalTrades: number;
   equityCurve: number[];
   trades: Array<{
@@ -207,7 +207,7 @@ export const BacktestResults: React.FC<BacktestResultsProps> = ({ results, onSav
             <span className="text-lg">💰</span>
           </div>
           <div className="text-3xl font-bold text-blue-400">
-            {data.profitFactor.toFixed(2)}x
+            {data.profitFactor === null ? '∞' : `${data.profitFactor.toFixed(2)}x`}
           </div>
           <div className="text-xs text-gray-500 mt-2">Ganancias / Pérdidas</div>
         </div>
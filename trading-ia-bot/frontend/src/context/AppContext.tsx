@@ -9,7 +9,7 @@ export interface BacktestResult {
   sharpe_ratio: number;
   max_drawdown: number;
   win_rate: number;
-  profit_factor: number;
+  profit_factor: number | null;
   trades_count: number;
   trades: Array<{
     entry_date: string;
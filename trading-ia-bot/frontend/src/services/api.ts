@@ -40,13 +40,18 @@ export interface BacktestResponse {
   symbol: string;
   timeframe: string;
   period_years: number;
+  bars?: number | null;
+  start_date?: string | null;
+  end_date?: string | null;
+  effective_period_years?: number | null;
+  period_truncated?: boolean;
   initial_capital: number;
   final_capital: number;
   total_return_pct: number;
   sharpe_ratio: number;
   max_drawdown_pct: number;
   win_rate_pct: number;
-  profit_factor: number;
+  profit_factor: number | null;
   total_trades: number;
   equity_curve: number[];
   trades: Array<{
@@ -96,7 +101,7 @@ export interface ResultCreateRequest {
   sharpe_ratio: number;
   max_drawdown_pct: number;
   win_rate_pct: number;
-  profit_factor: number;
+  profit_factor: number | null;
   total_trades: number;
   equity_curve: number[];
   trades: any[];
@@ -116,7 +121,7 @@ export interface ResultResponse {
   sharpe_ratio: number;
   max_drawdown_pct: number;
   win_rate_pct: number;
-  profit_factor: number;
+  profit_factor: number | null;
   total_trades: number;
   equity_curve: number[];
   trades: any[];